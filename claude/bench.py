@@ -0,0 +1,200 @@
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from contextlib import redirect_stdout
+from dataclasses import asdict, dataclass
+from io import StringIO
+
+from diff_engine import diff_lines, unified_diff
+from fake_docs_server import FakeDocsServer
+from sync_state import SyncManager
+
+ORGANIZATION = "bench-org"
+PROJECT = "bench-project"
+
+
+@dataclass
+class BenchResult:
+    name: str
+    wall: float
+    requests: int
+    peak_rss_mb: float
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name:<24} {self.wall:>8.3f}s {self.requests:>8} requests "
+            f"{self.peak_rss_mb:>8.1f} MB peak RSS"
+        )
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def file_body(index: int, lines: int) -> str:
+    return "".join(f"value_{index}_{line} = {line}\n" for line in range(lines))
+
+
+def generate_tree(directory: str, files: int, lines: int) -> list[str]:
+    paths = []
+    for i in range(files):
+        local_path = f"pkg{i % 100}/mod{i}.py"
+        os.makedirs(os.path.join(directory, f"pkg{i % 100}"), exist_ok=True)
+        with open(os.path.join(directory, local_path), "w") as f:
+            f.write(file_body(i, lines))
+        paths.append(local_path)
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump({"files": [], "rules": [], "ignore": []}, f)
+    return paths
+
+
+def seed_remote(
+    server: FakeDocsServer, paths: list[str], docs: int, lines: int, modified: float
+) -> None:
+    rng = random.Random(0)
+    for i in range(docs):
+        if i < len(paths):
+            body = file_body(i, lines)
+            if rng.random() < modified:
+                body = body.replace(f"= {lines // 2}\n", "= 'changed'\n")
+            server.add_doc(ORGANIZATION, PROJECT, paths[i], body)
+        else:
+            server.add_doc(ORGANIZATION, PROJECT, f"remote_only/doc{i}.py", "x = 1\n")
+
+
+def measure(name: str, server: FakeDocsServer, run: Callable[[], None]) -> BenchResult:
+    requests_before = sum(server.requests.values())
+    start = time.perf_counter()
+    with redirect_stdout(StringIO()):
+        run()
+    return BenchResult(
+        name,
+        time.perf_counter() - start,
+        sum(server.requests.values()) - requests_before,
+        peak_rss_mb(),
+    )
+
+
+def run_benchmarks(
+    files: int = 20000,
+    docs: int = 5000,
+    lines: int = 20,
+    modified: float = 0.1,
+    diffs: int = 200,
+    latency: float = 0.0,
+) -> list[BenchResult]:
+    results = []
+    previous_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory, FakeDocsServer(
+        latency=latency
+    ) as server:
+        previous_environ = dict(os.environ)
+        os.environ.update(
+            DOMAIN=server.url,
+            ORGANIZATION=ORGANIZATION,
+            PROJECT=PROJECT,
+            SESSION_KEY="bench",
+        )
+        paths = generate_tree(directory, files, lines)
+        seed_remote(server, paths, docs, lines, modified)
+        os.chdir(directory)
+        try:
+            sync_manager = SyncManager()
+            results.append(
+                measure("fetch_and_compare", server, sync_manager.fetch_and_compare)
+            )
+            warm = SyncManager()
+            results.append(
+                measure("fetch_and_compare_warm", server, warm.fetch_and_compare)
+            )
+
+            plan = sync_manager.compute_plan()
+            modified_files = plan.replacements[:diffs]
+
+            def render_diffs() -> None:
+                for file in modified_files:
+                    remote = file.remote_contents.splitlines()
+                    local = file.local_contents.splitlines()
+                    diff = diff_lines(remote, local)
+                    list(unified_diff(remote, local, diff, "remote", "local"))
+
+            results.append(measure("diff_rendering", server, render_diffs))
+            results.append(
+                measure(
+                    "bulk_upload",
+                    server,
+                    lambda: sync_manager.push_files(plan.pushes),
+                )
+            )
+            sync_manager.close()
+        finally:
+            os.chdir(previous_directory)
+            os.environ.clear()
+            os.environ.update(previous_environ)
+    return results
+
+
+def find_regressions(
+    results: list[BenchResult], baseline: list[dict], tolerance: float
+) -> list[str]:
+    previous = {entry["name"]: entry for entry in baseline}
+    regressions = []
+    for result in results:
+        entry = previous.get(result.name)
+        if entry is None:
+            continue
+        if result.wall > entry["wall"] * tolerance:
+            regressions.append(
+                f"{result.name}: {result.wall:.3f}s vs {entry['wall']:.3f}s baseline"
+            )
+        if result.requests > entry["requests"]:
+            regressions.append(
+                f"{result.name}: {result.requests} requests vs "
+                f"{entry['requests']} baseline"
+            )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the syncer against a local fake docs API."
+    )
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--lines", type=int, default=20, help="lines per file")
+    parser.add_argument("--modified", type=float, default=0.1)
+    parser.add_argument("--diffs", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--baseline", help="JSON output of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        args.files, args.docs, args.lines, args.modified, args.diffs, args.latency
+    )
+    if args.json:
+        print(json.dumps([asdict(result) for result in results], indent=2))
+    else:
+        for result in results:
+            print(result)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
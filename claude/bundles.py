@@ -0,0 +1,135 @@
+import hashlib
+import json
+import posixpath
+import re
+from dataclasses import dataclass, field
+
+from content_store import content_digest
+
+BUNDLE_HEADER = "// syncer-bundle v1\n"
+BUNDLE_SUFFIX = ".bundle"
+DEFAULT_MAX_BYTES = 256 * 1024
+# Upper bound on the average number of members per bundle.
+TARGET_MEMBERS = 64
+PENDING_BUNDLE = "*" + BUNDLE_SUFFIX
+
+MEMBER_PATH = re.compile(r"^(?P<bundle>.+\.bundle)#(?P<path>.+)$")
+
+
+@dataclass
+class Bundle:
+    name: str
+    uuid: str | None = None
+    # Local path -> content digest of every member.
+    members: dict[str, str] = field(default_factory=dict)
+    size: int = 0
+
+
+def member_remote_path(bundle_name: str, local_path: str) -> str:
+    return f"{bundle_name}#{local_path}"
+
+
+def pending_remote_path(target: str, local_path: str) -> str:
+    # Files are only assigned to a named bundle when they are pushed.
+    return member_remote_path(
+        posixpath.join(target.strip("/"), PENDING_BUNDLE), local_path
+    )
+
+
+def split_member_path(remote_path: str) -> tuple[str, str] | None:
+    match = MEMBER_PATH.match(remote_path)
+    if match is None:
+        return None
+    return match["bundle"], match["path"]
+
+
+def bundle_target(bundle_name: str) -> str:
+    return posixpath.dirname(bundle_name)
+
+
+def bundle_name(target: str, first_path: str) -> str:
+    return posixpath.join(
+        target.strip("/"), content_digest(first_path)[:12] + BUNDLE_SUFFIX
+    )
+
+
+def is_bundle(file_name: str, content: str) -> bool:
+    return file_name.endswith(BUNDLE_SUFFIX) and content.startswith(BUNDLE_HEADER)
+
+
+def encode_bundle(members: list[tuple[str, str]]) -> str:
+    index = []
+    offset = 0
+    for path, content in members:
+        index.append(
+            {
+                "path": path,
+                "digest": content_digest(content),
+                "offset": offset,
+                "length": len(content),
+            }
+        )
+        offset += len(content)
+    header = json.dumps({"files": index}, separators=(",", ":"))
+    return BUNDLE_HEADER + header + "\n" + "".join(c for _, c in members)
+
+
+def decode_bundle(content: str) -> list[tuple[str, str]]:
+    if not content.startswith(BUNDLE_HEADER):
+        raise ValueError("Missing bundle header")
+    index_end = content.find("\n", len(BUNDLE_HEADER))
+    if index_end == -1:
+        raise ValueError("Missing bundle index")
+    try:
+        index = json.loads(content[len(BUNDLE_HEADER) : index_end])["files"]
+        spans = [(e["path"], int(e["offset"]), int(e["length"])) for e in index]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Malformed bundle index: {e}")
+
+    body = content[index_end + 1 :]
+    members = []
+    for path, offset, length in spans:
+        if offset < 0 or length < 0 or offset + length > len(body):
+            raise ValueError(f"Bundle member {path} is out of range")
+        members.append((path, body[offset : offset + length]))
+    return members
+
+
+def _is_boundary(path: str, spacing: int) -> bool:
+    digest = hashlib.blake2b(path.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % spacing == 0
+
+
+def _boundary_spacing(members: dict[str, tuple[str, int]], max_bytes: int) -> int:
+    # Aim for bundles about a quarter full so the size cap rarely forces a cut
+    # (a forced cut shifts every later bundle up to the next natural one);
+    # rounding down to a power of two keeps the spacing stable across edits.
+    average = sum(size for _, size in members.values()) / max(len(members), 1)
+    fits = max_bytes / max(average, 1) / 4
+    spacing = 1
+    while spacing * 2 <= min(fits, TARGET_MEMBERS):
+        spacing *= 2
+    return spacing
+
+
+def partition(
+    members: dict[str, tuple[str, int]],
+    target: str,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> list[Bundle]:
+    # Bundles break at paths chosen by their hash rather than by position, so
+    # adding or editing one file reshapes only the bundle it falls in.
+    spacing = _boundary_spacing(members, max_bytes)
+    bundles: list[Bundle] = []
+    current: Bundle | None = None
+    for path in sorted(members):
+        digest, size = members[path]
+        if current is None or (
+            current.members
+            and (_is_boundary(path, spacing) or current.size + size > max_bytes)
+        ):
+            current = Bundle(bundle_name(target, path))
+            bundles.append(current)
+        current.members[path] = digest
+        current.size += size
+    return bundles
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager, redirect_stdout
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from multi_sync import MultiProjectSync
+    from sync_state import FileResult, SyncManager
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="syncer", description="Synchronise local files with a Claude project."
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print a per-phase breakdown with cProfile and tracemalloc data",
+    )
+    parser.add_argument(
+        "--profile-output",
+        metavar="PATH",
+        help="also write the collected profile data to PATH as JSON",
+    )
+    parser.add_argument(
+        "--projects",
+        metavar="PATH",
+        help="run the command for every project listed in PATH concurrently",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    def add_command(name: str, help: str) -> argparse.ArgumentParser:
+        command = subparsers.add_parser(name, help=help)
+        command.add_argument(
+            "--json", action="store_true", help="print machine-readable JSON"
+        )
+        return command
+
+    add_command("status", "count synced, modified, local-only and remote-only files")
+    add_command(
+        "plan", "list the uploads, replacements and deletions push/prune would run"
+    )
+    for name, help in (
+        ("push", "upload local-only files and replace modified remote files"),
+        ("prune", "delete remote files that have no local copy"),
+    ):
+        command = add_command(name, help)
+        command.add_argument(
+            "--max-in-flight",
+            type=int,
+            default=None,
+            help="maximum concurrent requests",
+        )
+        if name == "prune":
+            command.add_argument(
+                "--yes",
+                action="store_true",
+                help="delete the files; without it prune only lists them",
+            )
+    watch = subparsers.add_parser(
+        "watch", help="push local edits as they happen until interrupted"
+    )
+    watch.add_argument(
+        "--debounce",
+        type=float,
+        default=0.2,
+        help="seconds of quiet before a burst of edits is pushed",
+    )
+    return parser
+
+
+class Timings:
+    def __init__(self) -> None:
+        self.phases: dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.monotonic() - start
+
+
+def _timing_summary(phases: dict[str, float]) -> str:
+    parts = [f"{name} {seconds:.2f}s" for name, seconds in phases.items()]
+    return f"Timing: {', '.join(parts)} (total {sum(phases.values()):.2f}s)"
+
+
+def _results_to_dict(results: list[FileResult]) -> list[dict]:
+    return [
+        {
+            "local_path": result.file.local_path,
+            "remote_path": result.file.remote_path,
+            "ok": result.ok,
+            "skipped": result.skipped,
+            "error": None if result.ok else str(result.error),
+        }
+        for result in results
+    ]
+
+
+def _execute(args: argparse.Namespace, sync_manager: SyncManager) -> dict:
+    timings = Timings()
+    output: dict = {}
+    with timings.phase("fetch"):
+        sync_manager.fetch_and_compare()
+    with timings.phase("plan"):
+        plan = sync_manager.compute_plan()
+
+    if args.command == "status":
+        output["counts"] = {
+            "synced": plan.synced,
+            "modified": len(plan.replacements),
+            "local_only": len(plan.uploads),
+            "remote_only": len(plan.deletions) + len(plan.kept),
+            "too_large": plan.too_large,
+        }
+    elif args.command == "plan":
+        output["plan"] = plan.to_dict()
+    elif args.command == "push":
+        with timings.phase("push"):
+            report = sync_manager.push_files(plan.pushes, args.max_in_flight)
+        output["results"] = _results_to_dict(report.results)
+    elif args.command == "prune" and not args.yes:
+        output["would_delete"] = [file.remote_path for file in plan.deletions]
+    elif args.command == "prune":
+        with timings.phase("prune"):
+            results = sync_manager.delete_files(plan.deletions, args.max_in_flight)
+        output["results"] = _results_to_dict(results)
+    output["timings"] = timings.phases
+    return output
+
+
+def _has_failures(output: dict) -> bool:
+    return any(not result["ok"] for result in output.get("results", []))
+
+
+def run_command(args: argparse.Namespace, sync_manager: SyncManager) -> int:
+    if args.command == "watch":
+        return _run_watch(args, sync_manager)
+
+    output: dict = {"command": args.command}
+    # Progress messages go to stderr so stdout stays parseable with --json.
+    with redirect_stdout(sys.stderr if args.json else sys.stdout):
+        output.update(_execute(args, sync_manager))
+    output["transport"] = sync_manager.session.stats.to_dict()
+
+    if args.json:
+        print(json.dumps(output, indent=2))
+    else:
+        _print_human(output)
+        print(_timing_summary(output["timings"]))
+        print(sync_manager.session.stats)
+    return 1 if _has_failures(output) else 0
+
+
+def run_multi_command(args: argparse.Namespace, multi: MultiProjectSync) -> int:
+    start = time.monotonic()
+    with redirect_stdout(sys.stderr if args.json else sys.stdout):
+        runs = multi.run(lambda sync_manager: _execute(args, sync_manager))
+    projects = [
+        {
+            "name": run.project.name,
+            "project": run.project.project,
+            "error": None if run.ok else str(run.error),
+            "elapsed": run.elapsed,
+            **(run.value or {}),
+        }
+        for run in runs
+    ]
+    output = {
+        "command": args.command,
+        "projects": projects,
+        "elapsed": time.monotonic() - start,
+        "transport": multi.session.stats.to_dict(),
+    }
+    failed = [p for p in projects if p["error"] is not None or _has_failures(p)]
+
+    if args.json:
+        print(json.dumps(output, indent=2))
+    else:
+        for project in projects:
+            print(f"== {project['name']} ({project['elapsed']:.2f}s)")
+            if project["error"] is not None:
+                print(f"Error: {project['error']}")
+            else:
+                _print_human(project)
+        print(
+            f"{len(projects) - len(failed)}/{len(projects)} projects succeeded "
+            f"in {output['elapsed']:.2f}s"
+        )
+        print(multi.session.stats)
+    return 1 if failed else 0
+
+
+def _run_watch(args: argparse.Namespace, sync_manager: SyncManager) -> int:
+    sync_manager.fetch_and_compare()
+    try:
+        sync_manager.watch(debounce=args.debounce)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+    return 0
+
+
+def _print_human(output: dict) -> None:
+    if "counts" in output:
+        for name, count in output["counts"].items():
+            print(f"{name.replace('_', '-'):<12} {count}")
+    if "plan" in output:
+        plan = output["plan"]
+        for action in ("upload", "replace", "delete", "keep"):
+            for path in plan[action]:
+                print(f"{action:<8} {path}")
+        print(
+            f"{len(plan['upload'])} to upload, {len(plan['replace'])} to replace, "
+            f"{len(plan['delete'])} to delete, {len(plan['keep'])} kept, "
+            f"{plan['synced']} in sync"
+        )
+    if "would_delete" in output:
+        for path in output["would_delete"]:
+            print(f"{'delete':<8} {path}")
+        print(
+            f"Dry run: {len(output['would_delete'])} remote files would be deleted, "
+            "pass --yes to delete them"
+        )
+    if "results" in output:
+        failed = [result for result in output["results"] if not result["ok"]]
+        print(f"{len(output['results']) - len(failed)} succeeded, {len(failed)} failed")
@@ -0,0 +1,54 @@
+import hashlib
+import mmap
+import os
+import tempfile
+
+CACHE_DIR = ".syncer-cache"
+
+
+def content_hasher() -> "hashlib._Hash":
+    return hashlib.blake2b(digest_size=16)
+
+
+def content_digest(content: str | bytes | mmap.mmap) -> str:
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    hasher = content_hasher()
+    hasher.update(content)
+    return hasher.hexdigest()
+
+
+class ContentStore:
+    def __init__(self, directory: str = os.path.join(CACHE_DIR, "blobs")) -> None:
+        self.directory = directory
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def put(self, content: str) -> str:
+        data = content.encode("utf-8")
+        digest = content_digest(data)
+        path = self._blob_path(digest)
+        if os.path.exists(path):
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return digest
+
+    def get(self, digest: str) -> str:
+        with open(self._blob_path(digest), "r", encoding="utf-8", newline="") as f:
+            return f.read()
+
+    def __contains__(self, digest: str) -> bool:
+        return os.path.exists(self._blob_path(digest))
+
+    def size(self, digest: str) -> int:
+        return os.path.getsize(self._blob_path(digest))
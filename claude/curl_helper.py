@@ -1,23 +1,469 @@
+from __future__ import annotations
+
+import functools
+import heapq
+import importlib
 import json
 import os
+import random
+import threading
+import time
 from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from io import BytesIO
+from typing import Any
+
+from json_stream import JsonArrayStream
+from profiling import profiler
+
+
+class _LazyModule:
+    # Importing pycurl initialises libcurl, which the first menu screen and
+    # --help never need; the real module replaces this on first use.
+    def __init__(self, name: str) -> None:
+        self._name = name
+
+    def __getattr__(self, attr: str) -> Any:
+        module = importlib.import_module(self._name)
+        globals()[self._name] = module
+        return getattr(module, attr)
+
+
+pycurl: Any = _LazyModule("pycurl")
+
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+
+_env_loaded = False
+
+
+def load_env() -> None:
+    global _env_loaded
+    if _env_loaded:
+        return
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    _env_loaded = True
+
+
+@functools.cache
+def retryable_curl_errors(idempotent: bool) -> frozenset[int]:
+    # Failures before the request reached the server, safe for any method.
+    errors = {
+        pycurl.E_COULDNT_RESOLVE_HOST,
+        pycurl.E_COULDNT_CONNECT,
+        pycurl.E_SSL_CONNECT_ERROR,
+    }
+    if idempotent:
+        errors |= {
+            pycurl.E_OPERATION_TIMEDOUT,
+            pycurl.E_PARTIAL_FILE,
+            pycurl.E_GOT_NOTHING,
+            pycurl.E_SEND_ERROR,
+            pycurl.E_RECV_ERROR,
+        }
+    return frozenset(errors)
+
+
+class HttpError(Exception):
+    def __init__(
+        self, status_code: int, body: str, retry_after: float | None = None
+    ) -> None:
+        super().__init__(f"HTTP Error {status_code}: {body}")
+        self.status_code = status_code
+        self.body = body
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+
+    def should_retry(self, request: CurlHelper, error: Exception, attempt: int) -> bool:
+        if attempt >= self.max_attempts or not request.can_retry():
+            return False
+        if isinstance(error, HttpError):
+            if error.retry_after is not None and error.retry_after > self.max_delay:
+                return False
+            statuses = RETRYABLE_STATUSES if request.idempotent else THROTTLE_STATUSES
+            return error.status_code in statuses
+        if isinstance(error, pycurl.error):
+            return error.args[0] in retryable_curl_errors(request.idempotent)
+        return False
+
+    def delay(self, attempt: int, error: Exception) -> float:
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            return retry_after
+        # Full jitter keeps a burst of failed requests from retrying in lockstep.
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        limit: int = 8,
+        minimum: int = 1,
+        maximum: int = 64,
+        cooldown: float = 1.0,
+    ) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.cooldown = cooldown
+        self._limit = float(limit)
+        self._decreased_at = float("-inf")
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return max(self.minimum, int(self._limit))
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._limit = min(self.maximum, self._limit + 1 / self._limit)
+
+    def on_throttle(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            # Requests already in flight report the same overload; only the
+            # first of them shrinks the window.
+            if now - self._decreased_at < self.cooldown:
+                return
+            self._decreased_at = now
+            self._limit = max(self.minimum, self._limit / 2)
+
+
+@dataclass
+class TransportStats:
+    requests: int = 0
+    retries: int = 0
+    throttled: int = 0
+    failures: int = 0
+    latencies: deque = field(default_factory=lambda: deque(maxlen=1000))
+
+    def latency(self, percentile: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+
+    def to_dict(self) -> dict[str, float]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "failures": self.failures,
+            "latency_p50": self.latency(0.5),
+            "latency_p95": self.latency(0.95),
+        }
+
+    def __str__(self) -> str:
+        return (
+            f"Transport: {self.requests} requests, {self.retries} retries, "
+            f"{self.throttled} throttled, {self.failures} failed, "
+            f"latency p50 {self.latency(0.5):.3f}s p95 {self.latency(0.95):.3f}s"
+        )
+
+
+class CurlSession:
+    def __init__(
+        self,
+        pool_size: int = 8,
+        idle_timeout: float = 60.0,
+        connect_timeout: float = 10.0,
+        timeout: float = 120.0,
+        retry: RetryPolicy | None = None,
+    ) -> None:
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self.limiter = AdaptiveLimiter()
+        self.stats = TransportStats()
+        self._idle: list[tuple[pycurl.Curl, float]] = []
+        self._lock = threading.Lock()
+        self._share_handle: pycurl.CurlShare | None = None
+
+    @property
+    def _share(self) -> pycurl.CurlShare:
+        # Handles in the pool share DNS, TLS sessions and the connection cache,
+        # so a connection opened by one request is reused by the next.
+        with self._lock:
+            if self._share_handle is None:
+                share = pycurl.CurlShare()
+                share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+                share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+                share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_CONNECT)
+                self._share_handle = share
+            return self._share_handle
+
+    @classmethod
+    def from_env(cls) -> CurlSession:
+        load_env()
+        return cls(
+            pool_size=int(os.getenv("CURL_POOL_SIZE", "8")),
+            idle_timeout=float(os.getenv("CURL_IDLE_TIMEOUT", "60")),
+            connect_timeout=float(os.getenv("CURL_CONNECT_TIMEOUT", "10")),
+            timeout=float(os.getenv("CURL_TIMEOUT", "120")),
+            retry=RetryPolicy(max_attempts=1 + int(os.getenv("CURL_MAX_RETRIES", "3"))),
+        )
+
+    def acquire(self) -> pycurl.Curl:
+        now = time.monotonic()
+        handle = None
+        with self._lock:
+            while self._idle:
+                candidate, released_at = self._idle.pop()
+                if now - released_at <= self.idle_timeout:
+                    handle = candidate
+                    break
+                candidate.close()
+        if handle is None:
+            handle = pycurl.Curl()
+            # The share survives reset(), so it is only attached once.
+            handle.setopt(pycurl.SHARE, self._share)
+        self._configure(handle)
+        return handle
+
+    def release(self, handle: pycurl.Curl) -> None:
+        # reset() clears per-request options but keeps live connections.
+        handle.reset()
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append((handle, time.monotonic()))
+                return
+        handle.close()
+
+    @contextmanager
+    def handle(self) -> Iterator[pycurl.Curl]:
+        c = self.acquire()
+        try:
+            yield c
+        finally:
+            self.release(c)
+
+    def execute(
+        self,
+        request: CurlHelper,
+        perform: Callable[[pycurl.Curl], str] | None = None,
+    ) -> str:
+        def perform_buffered(c: pycurl.Curl) -> str:
+            buffer = BytesIO()
+            c.setopt(pycurl.WRITEDATA, buffer)
+            c.perform()
+            return request.read_response(c.getinfo(pycurl.HTTP_CODE), buffer)
+
+        perform = perform or perform_buffered
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.monotonic()
+            try:
+                with profiler.span(
+                    f"http {type(request).__name__}"
+                ), self.handle() as c:
+                    request.prepare(c)
+                    response = perform(c)
+                    self._count_transfer(c)
+            except (HttpError, pycurl.error) as e:
+                self._record_attempt(time.monotonic() - started, e)
+                if not self.retry.should_retry(request, e, attempt):
+                    self._record_failure()
+                    raise
+                self._record_retry()
+                time.sleep(self.retry.delay(attempt, e))
+                continue
+            self._record_attempt(time.monotonic() - started, None)
+            return response
+
+    def perform_many(
+        self, requests: list[CurlHelper], max_in_flight: int = 8
+    ) -> list[CurlResult]:
+        results: list[CurlResult] = [CurlResult(request) for request in requests]
+        pending = deque(range(len(requests)))
+        delayed: list[tuple[float, int]] = []
+        active: dict[pycurl.Curl, tuple[int, BytesIO, float]] = {}
+        multi = pycurl.CurlMulti()
+        multi.setopt(pycurl.M_PIPELINING, pycurl.PIPE_MULTIPLEX)
+        multi.setopt(pycurl.M_MAX_HOST_CONNECTIONS, max_in_flight)
+
+        def finish(c: pycurl.Curl, error: Exception | None) -> None:
+            index, buffer, started = active.pop(c)
+            result = results[index]
+            elapsed = time.monotonic() - started
+            result.elapsed += elapsed
+            if error is None:
+                try:
+                    status_code = c.getinfo(pycurl.HTTP_CODE)
+                    result.response = result.request.read_response(status_code, buffer)
+                except Exception as e:
+                    error = e
+            self._count_transfer(c)
+            multi.remove_handle(c)
+            self.release(c)
+
+            self._record_attempt(elapsed, error)
+            if error is not None and self.retry.should_retry(
+                result.request, error, result.attempts
+            ):
+                self._record_retry()
+                ready_at = time.monotonic() + self.retry.delay(result.attempts, error)
+                heapq.heappush(delayed, (ready_at, index))
+                return
+            if error is not None:
+                self._record_failure()
+            result.error = error
+
+        with profiler.span("http batch"):
+            try:
+                while pending or active or delayed:
+                    now = time.monotonic()
+                    while delayed and delayed[0][0] <= now:
+                        pending.append(heapq.heappop(delayed)[1])
+
+                    limit = min(max_in_flight, self.limiter.limit)
+                    while pending and len(active) < limit:
+                        index = pending.popleft()
+                        result = results[index]
+                        result.attempts += 1
+                        c = self.acquire()
+                        buffer = BytesIO()
+                        result.request.prepare(c)
+                        c.setopt(pycurl.WRITEDATA, buffer)
+                        active[c] = (index, buffer, time.monotonic())
+                        multi.add_handle(c)
+
+                    while True:
+                        ret, _ = multi.perform()
+                        if ret != pycurl.E_CALL_MULTI_PERFORM:
+                            break
 
-import pycurl
-from dotenv import load_dotenv
+                    while True:
+                        queued, succeeded, failed = multi.info_read()
+                        for c in succeeded:
+                            finish(c, None)
+                        for c, errno, message in failed:
+                            finish(c, pycurl.error(errno, message))
+                        if queued == 0:
+                            break
 
-load_dotenv()
+                    wait = 1.0
+                    if delayed:
+                        wait = min(wait, max(0.0, delayed[0][0] - time.monotonic()))
+                    if active:
+                        multi.select(wait)
+                    elif delayed and not pending:
+                        time.sleep(wait)
+            finally:
+                for c in list(active):
+                    finish(c, Exception("Request aborted"))
+                for index in list(pending) + [index for _, index in delayed]:
+                    results[index].error = Exception("Request aborted")
+                multi.close()
+
+        return results
+
+    def _count_transfer(self, c: pycurl.Curl) -> None:
+        if profiler.enabled:
+            profiler.count("http_requests")
+            profiler.count("http_bytes_sent", int(c.getinfo(pycurl.SIZE_UPLOAD_T)))
+            profiler.count(
+                "http_bytes_received", int(c.getinfo(pycurl.SIZE_DOWNLOAD_T))
+            )
+
+    def _record_attempt(self, elapsed: float, error: Exception | None) -> None:
+        throttled = (
+            isinstance(error, HttpError) and error.status_code in THROTTLE_STATUSES
+        )
+        with self._lock:
+            self.stats.requests += 1
+            self.stats.latencies.append(elapsed)
+            if throttled:
+                self.stats.throttled += 1
+        if throttled:
+            self.limiter.on_throttle()
+        elif error is None:
+            self.limiter.on_success()
+
+    def _record_retry(self) -> None:
+        with self._lock:
+            self.stats.retries += 1
+
+    def _record_failure(self) -> None:
+        with self._lock:
+            self.stats.failures += 1
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for handle, _ in idle:
+            handle.close()
+
+    def _configure(self, c: pycurl.Curl) -> None:
+        idle_seconds = max(1, int(self.idle_timeout))
+        c.setopt(pycurl.MAXCONNECTS, self.pool_size)
+        c.setopt(pycurl.MAXAGE_CONN, idle_seconds)
+        c.setopt(pycurl.TCP_KEEPALIVE, 1)
+        c.setopt(pycurl.TCP_KEEPIDLE, idle_seconds)
+        c.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_2TLS)
+        c.setopt(pycurl.PIPEWAIT, 1)
+        c.setopt(pycurl.CONNECTTIMEOUT_MS, int(self.connect_timeout * 1000))
+
+
+_shared_session: CurlSession | None = None
+_shared_session_lock = threading.Lock()
+
+
+def get_shared_session() -> CurlSession:
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = CurlSession.from_env()
+        return _shared_session
 
 
 class CurlHelper(ABC):
-    def __init__(self):
+    def __init__(
+        self,
+        session: CurlSession | None = None,
+        organization: str | None = None,
+        project: str | None = None,
+    ):
+        load_env()
+        self.session = session or get_shared_session()
         self.domain: str = os.getenv("DOMAIN", "")
-        self.organization: str = os.getenv("ORGANIZATION", "")
-        self.project: str = os.getenv("PROJECT", "")
+        self.organization: str = organization or os.getenv("ORGANIZATION", "")
+        self.project: str = project or os.getenv("PROJECT", "")
         self.session_key: str = os.getenv("SESSION_KEY", "")
         self.user_agent: str = (
             "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36"
         )
+        self.idempotent = True
+        self.timeout: float | None = None
+        self.status_code = 0
+        self.response_headers: dict[str, str] = {}
 
     def _get_base_url(self) -> str:
         return f"{self.domain}/api/organizations/{self.organization}/projects/{self.project}/docs"
@@ -28,40 +474,145 @@ class CurlHelper(ABC):
             f"user-agent: {self.user_agent}",
         ]
 
-    @abstractmethod
+    def prepare(self, c: pycurl.Curl) -> None:
+        self.status_code = 0
+        self.response_headers = {}
+        self.configure(c)
+        c.setopt(c.HEADERFUNCTION, self._read_header)
+        c.setopt(c.TIMEOUT_MS, int((self.timeout or self.session.timeout) * 1000))
+
+    def _read_header(self, line: bytes) -> None:
+        header = line.decode("iso-8859-1")
+        if header.startswith("HTTP/"):
+            self.status_code = int(header.split()[1])
+            self.response_headers = {}
+            return
+        if ":" not in header:
+            return
+        name, value = header.split(":", 1)
+        self.response_headers[name.strip().lower()] = value.strip()
+
+    def can_retry(self) -> bool:
+        return True
+
     def perform_request(self) -> str:
+        return self.session.execute(self)
+
+    def read_response(self, status_code: int, buffer: BytesIO) -> str:
+        self.status_code = status_code
+        response = buffer.getvalue().decode("utf-8")
+
+        if status_code >= 400:
+            raise HttpError(
+                status_code,
+                response,
+                parse_retry_after(self.response_headers.get("retry-after")),
+            )
+
+        return response
+
+    @abstractmethod
+    def configure(self, c: pycurl.Curl) -> None:
         pass
 
 
+@dataclass
+class CurlResult:
+    request: CurlHelper
+    response: str = ""
+    error: Exception | None = None
+    elapsed: float = 0.0
+    attempts: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
 class CurlGet(CurlHelper):
-    def perform_request(self) -> str:
-        buffer = BytesIO()
-        c = pycurl.Curl()
+    def __init__(
+        self,
+        session: CurlSession | None = None,
+        organization: str | None = None,
+        project: str | None = None,
+    ):
+        super().__init__(session, organization, project)
+        self.etag: str | None = None
+        self.last_modified: str | None = None
+        self._delivered = False
+
+    def configure(self, c: pycurl.Curl) -> None:
+        headers = self._get_base_headers()
+        if self.etag:
+            headers.append(f"if-none-match: {self.etag}")
+        if self.last_modified:
+            headers.append(f"if-modified-since: {self.last_modified}")
         c.setopt(c.URL, self._get_base_url())
-        c.setopt(c.HTTPHEADER, self._get_base_headers())
-        c.setopt(c.WRITEDATA, buffer)
-        c.perform()
+        c.setopt(c.HTTPHEADER, headers)
 
-        status_code = c.getinfo(pycurl.HTTP_CODE)
-        c.close()
+    def can_retry(self) -> bool:
+        # Once items have reached the caller a retry would hand them over twice.
+        return not self._delivered
 
-        response = buffer.getvalue().decode("utf-8")
+    def stream_request(self, on_item: Callable[[Any], None]) -> None:
+        self._delivered = False
 
-        if status_code >= 400:
-            raise Exception(f"HTTP Error {status_code}: {response}")
+        def perform(c: pycurl.Curl) -> str:
+            parser = JsonArrayStream()
+            error_body = BytesIO()
+            callback_errors: list[Exception] = []
 
-        return response
+            def write(chunk: bytes) -> int | None:
+                # Error and 304 bodies are not a docs listing; keep them for
+                # read_response instead of parsing them.
+                if self.status_code >= 300:
+                    error_body.write(chunk)
+                    return None
+                try:
+                    with profiler.span("json_decode"):
+                        items = list(parser.feed(chunk))
+                    for item in items:
+                        self._delivered = True
+                        on_item(item)
+                except Exception as e:
+                    callback_errors.append(e)
+                    return 0
+                return None
+
+            c.setopt(c.WRITEFUNCTION, write)
+            try:
+                c.perform()
+            except pycurl.error:
+                if callback_errors:
+                    raise callback_errors[0]
+                raise
+            status_code = c.getinfo(pycurl.HTTP_CODE)
+
+            self.read_response(status_code, error_body)
+            if status_code != 304:
+                parser.close()
+            return ""
+
+        self.session.execute(self, perform)
 
 
 class CurlPost(CurlHelper):
-    def __init__(self, file_name: str, content: str):
-        super().__init__()
+    def __init__(
+        self,
+        file_name: str,
+        content: str,
+        session: CurlSession | None = None,
+        organization: str | None = None,
+        project: str | None = None,
+    ):
+        super().__init__(session, organization, project)
         self.file_name = file_name
         self.content = content
+        # A retried POST may create the doc twice, so only failures that
+        # prove the server did not act on it are retried.
+        self.idempotent = False
 
-    def perform_request(self) -> str:
-        buffer = BytesIO()
-        c = pycurl.Curl()
+    def configure(self, c: pycurl.Curl) -> None:
         c.setopt(c.URL, self._get_base_url())
         c.setopt(c.POST, 1)
         c.setopt(
@@ -69,28 +620,20 @@ class CurlPost(CurlHelper):
         )
         data = json.dumps({"file_name": self.file_name, "content": self.content})
         c.setopt(c.POSTFIELDS, data)
-        c.setopt(c.WRITEDATA, buffer)
-        c.perform()
-
-        status_code = c.getinfo(pycurl.HTTP_CODE)
-        c.close()
-
-        response = buffer.getvalue().decode("utf-8")
-
-        if status_code >= 400:
-            raise Exception(f"HTTP Error {status_code}: {response}")
-
-        return response
 
 
 class CurlDelete(CurlHelper):
-    def __init__(self, doc_uuid: str):
-        super().__init__()
+    def __init__(
+        self,
+        doc_uuid: str,
+        session: CurlSession | None = None,
+        organization: str | None = None,
+        project: str | None = None,
+    ):
+        super().__init__(session, organization, project)
         self.doc_uuid = doc_uuid
 
-    def perform_request(self) -> str:
-        buffer = BytesIO()
-        c = pycurl.Curl()
+    def configure(self, c: pycurl.Curl) -> None:
         c.setopt(c.URL, f"{self._get_base_url()}/{self.doc_uuid}")
         c.setopt(c.CUSTOMREQUEST, "DELETE")
         c.setopt(
@@ -98,15 +641,3 @@ class CurlDelete(CurlHelper):
         )
         data = json.dumps({"docUuid": self.doc_uuid})
         c.setopt(c.POSTFIELDS, data)
-        c.setopt(c.WRITEDATA, buffer)
-        c.perform()
-
-        status_code = c.getinfo(pycurl.HTTP_CODE)
-        c.close()
-
-        response = buffer.getvalue().decode("utf-8")
-
-        if status_code >= 400:
-            raise Exception(f"HTTP Error {status_code}: {response}")
-
-        return response
@@ -1,17 +1,47 @@
-from menu import Menu, MenuAction, MenuOption
-from sync_state import File, SyncManager
+from menu import CachedMenu, MenuAction, MenuOption
+from sync_state import File, FileStatus, SyncManager
 
 
-class DeleteMenu(Menu):
+class DeleteMenu(CachedMenu):
     def __init__(self, sync_manager: SyncManager) -> None:
         super().__init__("Delete Remote File")
         self.sync_manager = sync_manager
 
-    def update_options(self) -> None:
-        self.options.clear()
-        for file in self.sync_manager.state.files.values():
-            if file.remote_present:
-                self.add_option(DeleteFileOption(self.sync_manager, file))
+    def cache_key(self) -> object:
+        return self.sync_manager.state.version
+
+    def build_options(self) -> None:
+        files = self.sync_manager.state.files
+        remote_files = files.in_status(
+            FileStatus.SYNCED, FileStatus.MODIFIED, FileStatus.REMOTE_ONLY
+        )
+        remote_only_files = files.in_status(FileStatus.REMOTE_ONLY)
+        for file in remote_files:
+            self.add_option(DeleteFileOption(self.sync_manager, file))
+        if remote_only_files:
+            self.add_option(
+                DeleteRemoteOnlyFilesOption(self.sync_manager, remote_only_files)
+            )
+
+
+class DeleteRemoteOnlyFilesOption(MenuOption):
+    def __init__(self, sync_manager: SyncManager, files: list[File]) -> None:
+        super().__init__(f"Delete all {len(files)} remote-only files")
+        self.sync_manager = sync_manager
+        self.files = files
+
+    def run(self) -> MenuAction:
+        confirm = input(
+            f"Are you sure you want to delete {len(self.files)} remote files? (y/n): "
+        )
+        if confirm.lower() == "y":
+            results = self.sync_manager.delete_files(self.files)
+            failed = [result for result in results if not result.ok]
+            print(f"Deleted {len(results) - len(failed)}/{len(results)} files.")
+        else:
+            print("Deletion cancelled.")
+
+        return MenuAction.TASK_COMPLETE
 
 
 class DeleteFileOption(MenuOption):
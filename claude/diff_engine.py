@@ -0,0 +1,244 @@
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+
+from profiling import profiler
+
+Opcode = tuple[str, int, int, int, int]
+
+
+@dataclass
+class Diff:
+    opcodes: list[Opcode]
+    # False when the edit or time budget ran out and the changed region was
+    # reported as one coarse replacement instead of a minimal edit script.
+    complete: bool = True
+
+    @property
+    def added(self) -> int:
+        return sum(j2 - j1 for tag, _, _, j1, j2 in self.opcodes if tag != "equal")
+
+    @property
+    def removed(self) -> int:
+        return sum(i2 - i1 for tag, i1, i2, _, _ in self.opcodes if tag != "equal")
+
+
+def _myers(
+    a: list[int], b: list[int], max_edits: int, deadline: float
+) -> list[str] | None:
+    n, m = len(a), len(b)
+    max_d = min(n + m, max_edits)
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    trace: list[list[int]] = []
+
+    for d in range(max_d + 1):
+        if d % 32 == 0 and time.monotonic() > deadline:
+            return None
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                trace.append(v[offset - d : offset + d + 1])
+                return _backtrack(trace, n, m)
+        trace.append(v[offset - d : offset + d + 1])
+    return None
+
+
+def _backtrack(trace: list[list[int]], n: int, m: int) -> list[str]:
+    # Walks the recorded frontiers backwards, emitting one step per line.
+    steps: list[str] = []
+    x, y = n, m
+    for d in range(len(trace) - 1, 0, -1):
+        previous = trace[d - 1]
+        k = x - y
+        if k == -d or (k != d and previous[k - 1 + d - 1] < previous[k + 1 + d - 1]):
+            previous_k = k + 1
+        else:
+            previous_k = k - 1
+        previous_x = previous[previous_k + d - 1]
+        previous_y = previous_x - previous_k
+        if previous_k == k + 1:
+            step, mid_x, mid_y = "insert", previous_x, previous_y + 1
+        else:
+            step, mid_x, mid_y = "delete", previous_x + 1, previous_y
+        while x > mid_x and y > mid_y:
+            steps.append("equal")
+            x -= 1
+            y -= 1
+        steps.append(step)
+        x, y = previous_x, previous_y
+    steps.extend("equal" for _ in range(x))
+    steps.reverse()
+    return steps
+
+
+def _to_opcodes(steps: list[str], i: int, j: int) -> list[Opcode]:
+    opcodes: list[Opcode] = []
+    for step in steps:
+        di = 1 if step != "insert" else 0
+        dj = 1 if step != "delete" else 0
+        tag = step
+        if opcodes and opcodes[-1][0] in ("delete", "insert", "replace"):
+            if step != "equal":
+                previous_tag, i1, i2, j1, j2 = opcodes[-1]
+                if previous_tag != step:
+                    tag = "replace"
+                opcodes[-1] = (tag, i1, i2 + di, j1, j2 + dj)
+                i += di
+                j += dj
+                continue
+        if opcodes and opcodes[-1][0] == step == "equal":
+            _, i1, i2, j1, j2 = opcodes[-1]
+            opcodes[-1] = ("equal", i1, i2 + 1, j1, j2 + 1)
+        else:
+            opcodes.append((tag, i, i + di, j, j + dj))
+        i += di
+        j += dj
+    return opcodes
+
+
+@profiler.timed("diff_lines")
+def diff_lines(
+    a: list[str], b: list[str], max_edits: int = 1000, timeout: float = 0.5
+) -> Diff:
+    # Lines are interned to ints once so every comparison is an int compare.
+    ids: dict[str, int] = {}
+    a_ids = [ids.setdefault(line, len(ids)) for line in a]
+    b_ids = [ids.setdefault(line, len(ids)) for line in b]
+
+    prefix = 0
+    limit = min(len(a_ids), len(b_ids))
+    while prefix < limit and a_ids[prefix] == b_ids[prefix]:
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < limit - prefix
+        and a_ids[len(a_ids) - 1 - suffix] == b_ids[len(b_ids) - 1 - suffix]
+    ):
+        suffix += 1
+
+    a_middle = a_ids[prefix : len(a_ids) - suffix]
+    b_middle = b_ids[prefix : len(b_ids) - suffix]
+
+    opcodes: list[Opcode] = []
+    if prefix:
+        opcodes.append(("equal", 0, prefix, 0, prefix))
+
+    complete = True
+    if a_middle or b_middle:
+        steps = _myers(a_middle, b_middle, max_edits, time.monotonic() + timeout)
+        if steps is None:
+            complete = False
+            tag = (
+                "replace"
+                if a_middle and b_middle
+                else "delete" if a_middle else "insert"
+            )
+            opcodes.append(
+                (tag, prefix, prefix + len(a_middle), prefix, prefix + len(b_middle))
+            )
+        else:
+            opcodes.extend(_to_opcodes(steps, prefix, prefix))
+
+    if suffix:
+        opcodes.append(("equal", len(a) - suffix, len(a), len(b) - suffix, len(b)))
+    return Diff(opcodes, complete)
+
+
+def _grouped_opcodes(opcodes: list[Opcode], n: int) -> Iterator[list[Opcode]]:
+    codes = list(opcodes) or [("equal", 0, 1, 0, 1)]
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+
+    group: list[Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > 2 * n:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def _format_range(start: int, stop: int) -> str:
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f"{beginning}"
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def unified_diff(
+    a: list[str],
+    b: list[str],
+    diff: Diff,
+    fromfile: str,
+    tofile: str,
+    context: int = 3,
+) -> Iterator[str]:
+    yield f"--- {fromfile}"
+    yield f"+++ {tofile}"
+    for group in _grouped_opcodes(diff.opcodes, context):
+        i1, i2 = group[0][1], group[-1][2]
+        j1, j2 = group[0][3], group[-1][4]
+        yield f"@@ -{_format_range(i1, i2)} +{_format_range(j1, j2)} @@"
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for line in a[i1:i2]:
+                    yield f" {line}"
+                continue
+            for line in a[i1:i2]:
+                yield f"-{line}"
+            for line in b[j1:j2]:
+                yield f"+{line}"
+
+
+class DiffStatsCache:
+    def __init__(self, max_entries: int = 4096) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, str], tuple[int, int]] = OrderedDict()
+
+    def get(
+        self,
+        remote_digest: str,
+        local_digest: str,
+        load: Callable[[], tuple[str, str]],
+    ) -> tuple[int, int]:
+        key = (remote_digest, local_digest)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        remote_contents, local_contents = load()
+        diff = diff_lines(remote_contents.splitlines(), local_contents.splitlines())
+        return self.record(remote_digest, local_digest, diff)
+
+    def record(
+        self, remote_digest: str, local_digest: str, diff: Diff
+    ) -> tuple[int, int]:
+        stats = (diff.added, diff.removed)
+        self._entries[(remote_digest, local_digest)] = stats
+        self._entries.move_to_end((remote_digest, local_digest))
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return stats
+
+
+diff_stats_cache = DiffStatsCache()
@@ -0,0 +1,187 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DOCS_PATH = re.compile(
+    r"^/api/organizations/(?P<org>[^/]+)/projects/(?P<project>[^/]+)/docs"
+    r"(?:/(?P<uuid>[^/?]+))?/?$"
+)
+
+
+class FakeDocsServer:
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        seed: int | None = None,
+    ) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests: Counter[str] = Counter()
+        self._docs: dict[tuple[str, str], dict[str, dict[str, str]]] = {}
+        self._failures: list[int] = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self) -> "FakeDocsServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeDocsServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def docs(self, org: str, project: str) -> dict[str, dict[str, str]]:
+        with self._lock:
+            return self._docs.setdefault((org, project), {})
+
+    def add_doc(self, org: str, project: str, file_name: str, content: str) -> str:
+        doc_uuid = str(uuid.uuid4())
+        doc = {"uuid": doc_uuid, "file_name": file_name, "content": content}
+        with self._lock:
+            self._docs.setdefault((org, project), {})[doc_uuid] = doc
+        return doc_uuid
+
+    def fail_next(self, status: int, count: int = 1) -> None:
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def _injected_failure(self) -> int | None:
+        with self._lock:
+            if self._failures:
+                return self._failures.pop(0)
+            if self.error_rate and self._random.random() < self.error_rate:
+                return self.error_status
+        return None
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                self._handle("GET")
+
+            def do_POST(self) -> None:
+                self._handle("POST")
+
+            def do_DELETE(self) -> None:
+                self._handle("DELETE")
+
+            def _handle(self, method: str) -> None:
+                body = self.rfile.read(int(self.headers.get("content-length", 0)))
+                with server._lock:
+                    server.requests[method] += 1
+                if server.latency:
+                    time.sleep(server.latency)
+
+                match = DOCS_PATH.match(self.path)
+                if match is None:
+                    return self._send(404, {"error": "not found"})
+                status = server._injected_failure()
+                if status is not None:
+                    headers = {"retry-after": "0"} if status == 429 else {}
+                    return self._send(status, {"error": "injected"}, headers)
+
+                docs = server.docs(match["org"], match["project"])
+                if method == "GET" and match["uuid"] is None:
+                    self._list(docs)
+                elif method == "POST" and match["uuid"] is None:
+                    data = json.loads(body)
+                    doc_uuid = server.add_doc(
+                        match["org"],
+                        match["project"],
+                        data["file_name"],
+                        data["content"],
+                    )
+                    self._send(201, {"uuid": doc_uuid, "file_name": data["file_name"]})
+                elif method == "DELETE" and match["uuid"] is not None:
+                    with server._lock:
+                        deleted = docs.pop(match["uuid"], None)
+                    self._send(404 if deleted is None else 204, None)
+                else:
+                    self._send(405, {"error": "method not allowed"})
+
+            def _list(self, docs: dict[str, dict[str, str]]) -> None:
+                with server._lock:
+                    listing = list(docs.values())
+                payload = json.dumps(listing).encode("utf-8")
+                etag = f'"{hashlib.blake2b(payload, digest_size=8).hexdigest()}"'
+                if self.headers.get("if-none-match") == etag:
+                    return self._send(304, None, {"etag": etag})
+                self._send(200, payload, {"etag": etag})
+
+            def _send(
+                self,
+                status: int,
+                payload: object,
+                headers: dict[str, str] | None = None,
+            ) -> None:
+                if payload is not None and not isinstance(payload, bytes):
+                    payload = json.dumps(payload).encode("utf-8")
+                payload = payload or b""
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                if status not in (204, 304):
+                    self.send_header("content-type", "application/json")
+                    self.send_header("content-length", str(len(payload)))
+                self.end_headers()
+                if status not in (204, 304):
+                    self.wfile.write(payload)
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a local fake of the docs API.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--docs", type=int, default=0, help="synthetic docs to seed")
+    parser.add_argument("--organization", default="org")
+    parser.add_argument("--project", default="project")
+    args = parser.parse_args()
+
+    server = FakeDocsServer(args.port, args.latency, args.error_rate, args.error_status)
+    for i in range(args.docs):
+        server.add_doc(args.organization, args.project, f"doc{i}.py", f"x = {i}\n")
+    print(f"Serving docs API on {server.url} (Ctrl+C to stop)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
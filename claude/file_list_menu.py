@@ -1,7 +1,8 @@
 from dataclasses import dataclass
 
-from menu import Menu, MenuAction
-from sync_state import SyncManager
+from diff_engine import diff_stats_cache
+from menu import Menu, MenuAction, filter_items
+from sync_state import File, FileStatus, SyncManager
 from upload_file_menu import UploadFileMenu
 from view_file_diff_menu import ViewFileDiffMenu
 
@@ -14,44 +15,99 @@ class FileListConfig:
 
 
 class FileListMenu(Menu):
+    # The options here are fixed; paging and filtering apply to the file table.
+    page_options = False
+
     def __init__(self, sync_manager: SyncManager) -> None:
         super().__init__("List All Files")
         self.sync_manager = sync_manager
         self.config = FileListConfig()
+        self.upload_file_menu = UploadFileMenu(sync_manager)
+        self.view_file_diff_menu = ViewFileDiffMenu(sync_manager)
+        self._rows: list[tuple[File, str]] = []
+        self._rows_for: object = None
 
     def update_options(self) -> None:
         self.options.clear()
         self.add_option(ToggleSyncedFiles(self.config))
         self.add_option(ToggleLocalOnlyFiles(self.config))
         self.add_option(ToggleRemoteOnlyFiles(self.config))
-        self.add_option(UploadFileMenu(self.sync_manager))
-        self.add_option(ViewFileDiffMenu(self.sync_manager))
+        self.add_option(self.upload_file_menu)
+        self.add_option(self.view_file_diff_menu)
 
-    def display(self) -> None:
+    def rows(self) -> list[tuple[File, str]]:
         state = self.sync_manager.state
-        print(f"{'Remote Path':<50} | {'UUID':<40} | Local Match | Full Path")
-        print("-" * 10)
-
-        for file in sorted(state.files.values(), key=lambda f: f.local_path):
+        key = (
+            state.version,
+            self.config.show_synced,
+            self.config.show_local_only,
+            self.config.show_remote_only,
+        )
+        if key == self._rows_for:
+            return self._rows
+
+        # Determine visibility of lines based on toggle settings.
+        visible_statuses = {FileStatus.MODIFIED, FileStatus.TOO_LARGE}
+        if self.config.show_synced:
+            visible_statuses.add(FileStatus.SYNCED)
+        if self.config.show_local_only:
+            visible_statuses.add(FileStatus.LOCAL_ONLY)
+        if self.config.show_remote_only:
+            visible_statuses.add(FileStatus.REMOTE_ONLY)
+
+        self._rows = []
+        for file in state.files.sorted_files():
             local_status = "✅" if file.local_present else "❌"
             remote_uuid = file.remote_uuid if file.remote_present else ""
 
-            # Determine visibility of line based on toggle settings.
-            visibility = True
-            if file.is_fully_synced:
-                visibility = self.config.show_synced
-            elif file.local_present and not file.remote_present:
-                visibility = self.config.show_local_only
-            elif not file.local_present and file.remote_present:
-                visibility = self.config.show_remote_only
-
-            if visibility:
-                print(
-                    f"{file.remote_path:<50} | {remote_uuid:<40} | {local_status:<11} | {file.local_path}"
+            if file.status in visible_statuses:
+                self._rows.append(
+                    (
+                        file,
+                        f"{file.remote_path:<50} | {remote_uuid:<40} | {local_status:<11}",
+                    )
                 )
+        self._rows_for = key
+        return self._rows
+
+    def display(self) -> None:
+        state = self.sync_manager.state
+        counts = state.files.counts()
+        print(
+            f"Synced: {counts[FileStatus.SYNCED]} | "
+            f"Modified: {counts[FileStatus.MODIFIED]} | "
+            f"Local-only: {counts[FileStatus.LOCAL_ONLY]} | "
+            f"Remote-only: {counts[FileStatus.REMOTE_ONLY]} | "
+            f"Too large: {counts[FileStatus.TOO_LARGE]}{state.marker}"
+        )
+        print(
+            f"{'Remote Path':<50} | {'UUID':<40} | Local Match | {'Changes':<13} | Full Path"
+        )
+        print("-" * 10)
+
+        rows = filter_items(
+            self.rows(),
+            self.filter_text,
+            key=lambda row: f"{row[1]} {row[0].local_path}",
+        )
+        start, end = self.page_bounds(len(rows))
+        # Diff stats are only computed for the rows on screen.
+        for file, prefix in rows[start:end]:
+            print(f"{prefix} | {self.change_summary(file):<13} | {file.local_path}")
+        self.display_navigation(len(rows))
 
         super().display()
 
+    def change_summary(self, file: File) -> str:
+        if file.status != FileStatus.MODIFIED:
+            return ""
+        added, removed = diff_stats_cache.get(
+            file.remote_digest,
+            file.local_digest,
+            lambda: (file.remote_contents, file.local_contents),
+        )
+        return f"+{added}/-{removed}"
+
 
 class ToggleSyncedFiles(Menu):
     def __init__(self, config: FileListConfig) -> None:
@@ -0,0 +1,85 @@
+import os
+import re
+from collections.abc import Iterable
+
+DEFAULT_IGNORE_PATTERNS = [".git/", ".syncer-cache/", "node_modules/", "build/"]
+
+
+def _translate(pattern: str) -> str:
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    # Like git, a slash anywhere but the end anchors the pattern to the root.
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            regex += "/.*"
+            i += 3
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 1 :]:
+            end = pattern.index("]", i + 1)
+            body = pattern[i + 1 : end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            regex += f"[{body}]"
+            i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+
+    prefix = "" if anchored else "(?:.*/)?"
+    suffix = "/" if dir_only else "/?"
+    return prefix + regex + suffix
+
+
+def _compile(patterns: list[str]) -> re.Pattern[str] | None:
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{_translate(p)})" for p in patterns))
+
+
+class IgnoreMatcher:
+    def __init__(self, patterns: list[str]) -> None:
+        ignored: list[str] = []
+        negated: list[str] = []
+        for line in patterns:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("!"):
+                negated.append(line[1:])
+            else:
+                ignored.append(line)
+        self._ignored = _compile(ignored)
+        self._negated = _compile(negated)
+
+    @classmethod
+    def for_directory(
+        cls, directory: str, extra_patterns: Iterable[str] | None = None
+    ) -> "IgnoreMatcher":
+        patterns = list(DEFAULT_IGNORE_PATTERNS)
+        gitignore = os.path.join(directory, ".gitignore")
+        if os.path.exists(gitignore):
+            with open(gitignore, "r") as f:
+                patterns.extend(f.read().splitlines())
+        patterns.extend(extra_patterns or [])
+        return cls(patterns)
+
+    def is_ignored(self, path: str, is_dir: bool = False) -> bool:
+        if self._ignored is None:
+            return False
+        candidate = path + "/" if is_dir else path
+        if not self._ignored.fullmatch(candidate):
+            return False
+        return self._negated is None or not self._negated.fullmatch(candidate)
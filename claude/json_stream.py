@@ -0,0 +1,73 @@
+import json
+import re
+from collections.abc import Iterator
+from typing import Any
+
+_STRUCTURAL = re.compile(rb'["\[\]{},]')
+_STRING_SPECIAL = re.compile(rb'["\\]')
+
+
+class JsonArrayStream:
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._element_start: int | None = None
+        self.finished = False
+
+    def feed(self, chunk: bytes) -> Iterator[Any]:
+        self._buffer.extend(chunk)
+        buffer = self._buffer
+        while not self.finished:
+            if self._in_string:
+                match = _STRING_SPECIAL.search(buffer, self._position)
+                if match is None:
+                    self._position = len(buffer)
+                    break
+                if match.group() == b"\\":
+                    if match.end() >= len(buffer):
+                        self._position = match.start()
+                        break
+                    self._position = match.end() + 1
+                    continue
+                self._in_string = False
+                self._position = match.end()
+                continue
+
+            match = _STRUCTURAL.search(buffer, self._position)
+            if match is None:
+                self._position = len(buffer)
+                break
+            token = match.group()
+            index = match.start()
+            self._position = match.end()
+
+            if self._depth == 0:
+                if token != b"[":
+                    raise ValueError("Expected a JSON array")
+                self._depth = 1
+                self._element_start = self._position
+            elif token == b'"':
+                self._in_string = True
+            elif token in (b"[", b"{"):
+                self._depth += 1
+            elif self._depth > 1 and token in (b"]", b"}"):
+                self._depth -= 1
+            elif self._depth == 1 and token in (b",", b"]"):
+                element = bytes(buffer[self._element_start : index]).strip()
+                if element:
+                    yield json.loads(element)
+                elif token == b",":
+                    raise ValueError("Empty element in JSON array")
+                if token == b"]":
+                    self.finished = True
+                # Drop everything already parsed so the buffer only ever holds
+                # the element currently being received.
+                del buffer[: self._position]
+                self._position = 0
+                self._element_start = 0
+
+    def close(self) -> None:
+        if not self.finished:
+            raise ValueError("Unexpected end of JSON array")
@@ -0,0 +1,13 @@
+LINE_ENDING_POLICIES = ("exact", "lf", "lf-final-newline")
+
+
+def normalize_line_endings(content: str, policy: str) -> str:
+    if policy == "exact":
+        return content
+    if policy not in LINE_ENDING_POLICIES:
+        raise ValueError(f"Unknown line ending policy: {policy}")
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+    if policy == "lf-final-newline" and content:
+        content = content.rstrip("\n") + "\n"
+    return content
@@ -0,0 +1,165 @@
+import mmap
+import os
+import time
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from content_store import content_digest, content_hasher
+from ignore_matcher import IgnoreMatcher
+from scan_cache import ScanCache
+
+
+def scan_tree(
+    directory: str, matcher: IgnoreMatcher
+) -> Iterator[tuple[str, os.DirEntry]]:
+    stack = [(directory, "")]
+    while stack:
+        current, prefix = stack.pop()
+        with os.scandir(current) as entries:
+            for entry in entries:
+                local_path = prefix + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    # Pruning here means ignored subtrees are never listed.
+                    if not matcher.is_ignored(local_path, is_dir=True):
+                        stack.append((entry.path, local_path + "/"))
+                elif entry.is_file() and not matcher.is_ignored(local_path):
+                    yield local_path, entry
+
+
+# Files at least this large are hashed through a memory map, so their bytes
+# are never copied into the Python heap.
+MMAP_THRESHOLD = 1024 * 1024
+# Files containing "\r" are normalised and hashed this many bytes at a time.
+HASH_CHUNK = 1024 * 1024
+
+
+def hash_file(path: str) -> tuple[str, int]:
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return _text_digest(data), size
+        return _text_digest(f.read()), size
+
+
+def _text_digest(data: bytes | mmap.mmap) -> str:
+    # Digests must match the text-mode reads used for uploads, which turn
+    # "\r\n" and "\r" into "\n". Both are ASCII, so the bytes are normalised
+    # directly, without decoding and a bounded chunk at a time.
+    if data.find(b"\r") == -1:
+        return content_digest(data)
+    hasher = content_hasher()
+    after_cr = False
+    for start in range(0, len(data), HASH_CHUNK):
+        chunk = data[start : start + HASH_CHUNK]
+        if after_cr and chunk.startswith(b"\n"):
+            # The "\r" ending the previous chunk already became this "\n".
+            chunk = chunk[1:]
+        after_cr = chunk.endswith(b"\r")
+        hasher.update(chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n"))
+    return hasher.hexdigest()
+
+
+@dataclass
+class ScanStats:
+    files: int = 0
+    hashed: int = 0
+    bytes_read: int = 0
+    elapsed: float = 0.0
+    too_large: list[str] = field(default_factory=list)
+    unreadable: list[str] = field(default_factory=list)
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def megabytes_per_second(self) -> float:
+        return self.bytes_read / 1e6 / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"Scanned {self.files} files ({self.hashed} hashed, "
+            f"{self.bytes_read / 1e6:.1f} MB) in {self.elapsed:.2f}s: "
+            f"{self.files_per_second:.0f} files/s, "
+            f"{self.megabytes_per_second:.1f} MB/s"
+        )
+
+
+class LocalScanner:
+    def __init__(
+        self,
+        directory: str,
+        matcher: IgnoreMatcher,
+        cache: ScanCache,
+        extensions: tuple[str, ...],
+        file_names: tuple[str, ...] = (),
+        workers: int = 8,
+        max_file_bytes: int | None = None,
+    ) -> None:
+        self.directory = directory
+        self.matcher = matcher
+        self.cache = cache
+        self.extensions = extensions
+        self.file_names = file_names
+        self.workers = max(1, workers)
+        self.max_file_bytes = max_file_bytes
+        self.stats = ScanStats()
+
+    def _wanted(self, name: str) -> bool:
+        return name.endswith(self.extensions) or name in self.file_names
+
+    def scan(self) -> Iterator[tuple[str, str]]:
+        start = time.monotonic()
+        self.cache.load()
+        seen: set[str] = set()
+        pending: dict[Future, tuple[str, os.stat_result]] = {}
+
+        def drain(return_when: str) -> Iterator[tuple[str, str]]:
+            done, _ = wait(pending, return_when=return_when)
+            for future in done:
+                local_path, stat_result = pending.pop(future)
+                try:
+                    digest, size = future.result()
+                except (OSError, UnicodeDecodeError):
+                    self.stats.unreadable.append(local_path)
+                    continue
+                self.stats.hashed += 1
+                self.stats.bytes_read += size
+                self.cache.record(local_path, stat_result, digest)
+                yield local_path, digest
+
+        # The walk runs on the calling thread and feeds a bounded pool of
+        # readers; results are handed back here so callers merge them without
+        # any locking.
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for local_path, entry in scan_tree(self.directory, self.matcher):
+                if not self._wanted(entry.name):
+                    continue
+                stat_result = entry.stat()
+                if (
+                    self.max_file_bytes is not None
+                    and stat_result.st_size > self.max_file_bytes
+                ):
+                    self.stats.too_large.append(local_path)
+                    continue
+                self.stats.files += 1
+                seen.add(local_path)
+                digest = self.cache.lookup(local_path, stat_result)
+                if digest is not None:
+                    yield local_path, digest
+                    continue
+
+                pending[executor.submit(hash_file, entry.path)] = (
+                    local_path,
+                    stat_result,
+                )
+                if len(pending) >= self.workers * 4:
+                    yield from drain(FIRST_COMPLETED)
+
+            while pending:
+                yield from drain(FIRST_COMPLETED)
+
+        self.cache.save(seen)
+        self.stats.elapsed = time.monotonic() - start
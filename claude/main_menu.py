@@ -1,22 +1,50 @@
-from delete_menu import DeleteMenu
-from file_list_menu import FileListMenu
-from manifest_menu import ManifestMenu
-from menu import Menu, MenuAction, MenuOption
+from menu import LazyOption, Menu, MenuAction, MenuOption
 from sync_state import SyncManager
 
 
+def _file_list_menu(sync_manager: SyncManager) -> MenuOption:
+    from file_list_menu import FileListMenu
+
+    return FileListMenu(sync_manager)
+
+
+def _delete_menu(sync_manager: SyncManager) -> MenuOption:
+    from delete_menu import DeleteMenu
+
+    return DeleteMenu(sync_manager)
+
+
+def _manifest_menu(sync_manager: SyncManager) -> MenuOption:
+    from manifest_menu import ManifestMenu
+
+    return ManifestMenu(sync_manager)
+
+
 class MainMenu(Menu):
     def __init__(self, sync_manager: SyncManager) -> None:
         super().__init__("File Synchronization Menu")
         self.sync_manager = sync_manager
+        # Submenus are kept across iterations so their cached options survive,
+        # and are only imported and built once they are first opened.
+        self.file_list_menu = LazyOption(
+            "List All Files", lambda: _file_list_menu(sync_manager)
+        )
+        self.delete_menu = LazyOption(
+            "Delete Remote File", lambda: _delete_menu(sync_manager)
+        )
+        self.manifest_menu = LazyOption(
+            "Manifest Settings", lambda: _manifest_menu(sync_manager)
+        )
 
     def update_options(self) -> None:
+        self.label = "File Synchronization Menu" + self.sync_manager.state.marker
         self.options.clear()
         if self.sync_manager.state.fetched:
-            self.add_option(FileListMenu(self.sync_manager))
-            self.add_option(DeleteMenu(self.sync_manager))
-            self.add_option(ManifestMenu(self.sync_manager))
+            self.add_option(self.file_list_menu)
+            self.add_option(self.delete_menu)
+            self.add_option(self.manifest_menu)
             self.add_option(FetchRemoteOption(self.sync_manager, "Refresh remotes"))
+            self.add_option(WatchOption(self.sync_manager))
         else:
             self.add_option(FetchRemoteOption(self.sync_manager, "Fetch remote files"))
 
@@ -31,3 +59,16 @@ class FetchRemoteOption(MenuOption):
         self.sync_manager.fetch_and_compare()
         print("Remote files fetched successfully.")
         return MenuAction.CONTINUE
+
+
+class WatchOption(MenuOption):
+    def __init__(self, sync_manager: SyncManager) -> None:
+        super().__init__("Watch and sync local edits")
+        self.sync_manager = sync_manager
+
+    def run(self) -> MenuAction:
+        try:
+            self.sync_manager.watch()
+        except KeyboardInterrupt:
+            print("\nStopped watching.")
+        return MenuAction.CONTINUE
@@ -1,38 +1,278 @@
 import json
-from dataclasses import dataclass
+import os
+import stat
+import tempfile
+from collections.abc import Callable, Iterable, Mapping
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+from bundles import DEFAULT_MAX_BYTES, pending_remote_path
+from content_store import content_digest
+from path_trie import PathTrie
+
+DEFAULT_EXTENSIONS = (".js", ".ts", ".tsx", ".py", ".yml")
+
+
+def _rule_key(rule: dict) -> tuple[str, str, str]:
+    return rule["type"], rule["source"], rule.get("target", "")
+
+
+def _file_mode(filename: str) -> int:
+    # mkstemp creates files as 0600; a replaced file keeps its mode and a new
+    # one gets what open() would have given it.
+    try:
+        return stat.S_IMODE(os.stat(filename).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
 
 
 @dataclass
 class Manifest:
-    files: list[dict[str, str]]
+    # files, ignore and extensions are read-only once created; they change
+    # through the methods below, which keep the dirty flag and caches right.
+    # Keyed by path; a list of entries is accepted and indexed on creation.
+    files: Mapping[str, dict[str, str]]
     rules: list[dict[str, str]]
+    ignore: tuple[str, ...] = ()
+    # None syncs DEFAULT_EXTENSIONS.
+    extensions: tuple[str, ...] | None = None
+    _source_trie: PathTrie | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _target_trie: PathTrie | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _bundle_trie: PathTrie | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _rules_by_type: dict[str, list[dict]] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _rule_keys: set[tuple[str, str, str]] = field(
+        default_factory=set, init=False, repr=False, compare=False
+    )
+    _files: dict[str, dict[str, str]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    _sorted_files: list[dict[str, str]] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    # (filename, digest) of the last load or save, and whether anything
+    # changed since through the methods below.
+    _persisted: tuple[str, str] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _dirty: bool = field(default=True, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if isinstance(self.files, list):
+            self._files = {entry["path"]: entry for entry in self.files}
+        else:
+            self._files = dict(self.files)
+        self.files = MappingProxyType(self._files)
+        self.ignore = tuple(self.ignore)
+        if self.extensions is not None:
+            self.extensions = tuple(self.extensions)
 
     @classmethod
     def load_from_file(cls, filename="manifest.json") -> "Manifest":
         with open(filename, "r") as f:
             data = json.load(f)
-            files = data.get("files", [])
-            rules = data.get("rules", [])
-        return Manifest(files, rules)
+        manifest = cls.from_dict(data)
+        manifest._persisted = (filename, manifest.digest())
+        manifest._dirty = False
+        return manifest
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Manifest":
+        return Manifest(
+            data.get("files", []),
+            data.get("rules", []),
+            data.get("ignore", []),
+            data.get("extensions"),
+        )
+
+    def to_dict(self) -> dict:
+        data = {
+            "files": self.sorted_files(),
+            "rules": self.rules,
+            "ignore": list(self.ignore),
+        }
+        if self.extensions is not None:
+            data["extensions"] = list(self.extensions)
+        return data
+
+    def serialize(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def digest(self) -> str:
+        # Formatting is irrelevant: a hand-formatted file with the same data
+        # has the same digest.
+        canonical = json.dumps(self.to_dict(), sort_keys=True, separators=(",", ":"))
+        return content_digest(canonical)
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    @property
+    def local_extensions(self) -> tuple[str, ...]:
+        if self.extensions is None:
+            return DEFAULT_EXTENSIONS
+        return self.extensions
+
+    def save_to_file(self, filename="manifest.json") -> bool:
+        if self._persisted is not None and self._persisted[0] == filename:
+            # Changes that were undone again leave nothing to write.
+            unchanged = not self._dirty or self.digest() == self._persisted[1]
+            if unchanged and os.path.exists(filename):
+                self._dirty = False
+                return False
+
+        directory = os.path.dirname(filename) or "."
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(self.serialize())
+            os.chmod(temp_path, _file_mode(filename))
+            os.replace(temp_path, filename)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self._persisted = (filename, self.digest())
+        self._dirty = False
+        return True
+
+    def sorted_files(self) -> list[dict[str, str]]:
+        if self._sorted_files is None:
+            self._sorted_files = [self._files[path] for path in sorted(self._files)]
+        return self._sorted_files
 
-    def save_to_file(self, filename="manifest.json") -> None:
-        with open(filename, "w") as f:
-            json.dump(self.__dict__, f, indent=2)
+    def set_file(self, path: str, status: str) -> None:
+        if self._files.get(path, {}).get("status") == status:
+            return
+        self._files[path] = {"path": path, "status": status}
+        self._sorted_files = None
+        self._dirty = True
+
+    def remove_file(self, path: str) -> None:
+        if self._files.pop(path, None) is not None:
+            self._sorted_files = None
+            self._dirty = True
+
+    def add_ignore_pattern(self, pattern: str) -> None:
+        if pattern not in self.ignore:
+            self.ignore = (*self.ignore, pattern)
+            self._dirty = True
+
+    def remove_ignore_pattern(self, pattern: str) -> None:
+        if pattern in self.ignore:
+            self.ignore = tuple(p for p in self.ignore if p != pattern)
+            self._dirty = True
+
+    def set_extensions(self, extensions: Iterable[str] | None) -> None:
+        if extensions is not None:
+            extensions = tuple(extensions)
+        if extensions != self.extensions:
+            self.extensions = extensions
+            self._dirty = True
+
+    def _add_rule(self, rule: dict) -> None:
+        if self._rules_by_type is None:
+            self._build_index()
+        if _rule_key(rule) in self._rule_keys:
+            return
+        self.rules.append(rule)
+        self._invalidate_index()
+
+    def _remove_rules(self, matches: Callable[[dict], bool]) -> None:
+        if not any(matches(rule) for rule in self.rules):
+            return
+        self.rules = [rule for rule in self.rules if not matches(rule)]
+        self._invalidate_index()
+
+    def _rules(self, rule_type: str) -> list[dict]:
+        if self._rules_by_type is None:
+            self._build_index()
+        return self._rules_by_type.get(rule_type, [])
 
     def add_directory_match_rule(self, source: str, target: str) -> None:
         new_rule = {"type": "directory_match", "source": source, "target": target}
-        self.rules.append(new_rule)
+        self._add_rule(new_rule)
 
     def remove_directory_match_rule(self, source: str, target: str) -> None:
-        self.rules = [
-            rule
-            for rule in self.state.manifest.rules
-            if not (
-                rule["type"] == "directory_match"
-                and rule["source"] == source
-                and rule["target"] == target
-            )
-        ]
+        key = ("directory_match", source, target)
+        self._remove_rules(lambda rule: _rule_key(rule) == key)
 
     def get_directory_match_rules(self) -> list[dict[str, str]]:
-        return [rule for rule in self.rules if rule["type"] == "directory_match"]
+        return list(self._rules("directory_match"))
+
+    def add_bundle_rule(
+        self, source: str, target: str, max_bytes: int = DEFAULT_MAX_BYTES
+    ) -> None:
+        new_rule = {
+            "type": "bundle",
+            "source": source,
+            "target": target,
+            "max_bytes": max_bytes,
+        }
+        self._add_rule(new_rule)
+
+    def remove_bundle_rule(self, source: str) -> None:
+        self._remove_rules(
+            lambda rule: rule["type"] == "bundle" and rule["source"] == source
+        )
+
+    def get_bundle_rules(self) -> list[dict]:
+        return list(self._rules("bundle"))
+
+    def bundle_rule_for(self, local_path: str) -> dict | None:
+        if self._bundle_trie is None:
+            self._build_index()
+        match = self._bundle_trie.match(local_path)
+        if match is None:
+            return None
+        return self._rules("bundle")[int(match[1])]
+
+    def bundle_rule_for_target(self, target: str) -> dict | None:
+        for rule in self._rules("bundle"):
+            if rule["target"].strip("/") == target.strip("/"):
+                return rule
+        return None
+
+    def _invalidate_index(self) -> None:
+        self._source_trie = None
+        self._target_trie = None
+        self._bundle_trie = None
+        self._rules_by_type = None
+        self._dirty = True
+
+    def _build_index(self) -> None:
+        self._rules_by_type = {}
+        self._rule_keys = {_rule_key(rule) for rule in self.rules}
+        for rule in self.rules:
+            self._rules_by_type.setdefault(rule["type"], []).append(rule)
+        self._source_trie = PathTrie()
+        self._target_trie = PathTrie()
+        self._bundle_trie = PathTrie()
+        for rule in self._rules("directory_match"):
+            self._source_trie.insert(rule["source"], rule["target"])
+            self._target_trie.insert(rule["target"], rule["source"])
+        for i, rule in enumerate(self._rules("bundle")):
+            # Sources are directories, so "src" must not match "src2/a.py".
+            self._bundle_trie.insert(rule["source"].rstrip("/") + "/", str(i))
+
+    def infer_remote_path(self, local_path: str) -> str:
+        if self._source_trie is None:
+            self._build_index()
+        rule = self.bundle_rule_for(local_path)
+        if rule is not None:
+            return pending_remote_path(rule["target"], local_path)
+        return self._source_trie.rewrite(local_path)
+
+    def infer_local_path(self, remote_path: str) -> str:
+        if self._target_trie is None:
+            self._build_index()
+        return self._target_trie.rewrite(remote_path)
@@ -1,3 +1,4 @@
+from bundles import DEFAULT_MAX_BYTES
 from menu import Menu, MenuAction, MenuOption
 from sync_state import SyncManager
 
@@ -15,6 +16,8 @@ class ManifestMenu(Menu):
         self.add_option(IgnoreMissingRemotesMenu(self.sync_manager))
         self.add_option(AddDirectoryMatchRuleOption(self.sync_manager))
         self.add_option(RemoveDirectoryMatchRuleOption(self.sync_manager))
+        self.add_option(AddBundleRuleOption(self.sync_manager))
+        self.add_option(RemoveBundleRuleOption(self.sync_manager))
 
 
 class ShowManifestOption(MenuOption):
@@ -25,10 +28,11 @@ class ShowManifestOption(MenuOption):
     def run(self) -> MenuAction:
         manifest = self.sync_manager.state.manifest
         print("\nManifest:")
-        for file in sorted(manifest.files, key=lambda f: f["path"]):
+        for file in manifest.sorted_files():
             print(f"{file['status']}: {file['path']}")
         for rule in manifest.rules:
             print(f"Rule: {rule}")
+        print(f"Extensions: {', '.join(manifest.local_extensions)}")
         return MenuAction.CONTINUE
 
 
@@ -44,7 +48,8 @@ class UploadManifestOption(MenuOption):
 
 class SaveManifestOption(MenuOption):
     def __init__(self, sync_manager: SyncManager) -> None:
-        super().__init__("Save manifest")
+        unsaved = " (unsaved changes)" if sync_manager.state.manifest.dirty else ""
+        super().__init__(f"Save manifest{unsaved}")
         self.sync_manager = sync_manager
 
     def run(self) -> MenuAction:
@@ -149,3 +154,52 @@ class RemoveDirectoryMatchRuleOption(MenuOption):
             print("Invalid input. No rule removed.")
 
         return MenuAction.CONTINUE
+
+
+class AddBundleRuleOption(MenuOption):
+    def __init__(self, sync_manager: SyncManager) -> None:
+        super().__init__("Add bundle rule")
+        self.sync_manager = sync_manager
+
+    def run(self) -> MenuAction:
+        source = input("Enter source directory: ")
+        target = input("Enter target directory for the bundles: ")
+        max_kib = input(f"Enter max bundle size in KiB [{DEFAULT_MAX_BYTES // 1024}]: ")
+        try:
+            max_bytes = int(max_kib) * 1024 if max_kib else DEFAULT_MAX_BYTES
+        except ValueError:
+            print("Invalid size. No rule added.")
+            return MenuAction.CONTINUE
+        self.sync_manager.add_bundle_rule(source, target, max_bytes)
+        print(f"Added bundle rule: {source} -> {target} ({max_bytes // 1024} KiB)")
+        return MenuAction.CONTINUE
+
+
+class RemoveBundleRuleOption(MenuOption):
+    def __init__(self, sync_manager: SyncManager) -> None:
+        super().__init__("Remove bundle rule")
+        self.sync_manager = sync_manager
+
+    def run(self) -> MenuAction:
+        rules = self.sync_manager.get_bundle_rules()
+        if not rules:
+            print("No bundle rules to remove.")
+            return MenuAction.CONTINUE
+
+        print("Current bundle rules:")
+        for i, rule in enumerate(rules):
+            print(f"{i + 1}. {rule['source']} -> {rule['target']}")
+
+        choice = input("Enter the number of the rule to remove (or 0 to cancel): ")
+        try:
+            choice = int(choice)
+            if 1 <= choice <= len(rules):
+                removed_rule = rules[choice - 1]
+                self.sync_manager.remove_bundle_rule(removed_rule["source"])
+                print(f"Removed bundle rule: {removed_rule['source']}")
+            elif choice != 0:
+                print("Invalid choice. No rule removed.")
+        except ValueError:
+            print("Invalid input. No rule removed.")
+
+        return MenuAction.CONTINUE
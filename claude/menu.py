@@ -1,5 +1,10 @@
 from abc import abstractmethod
+from collections.abc import Callable
 from enum import Enum, auto
+from math import ceil
+from typing import TypeVar
+
+T = TypeVar("T")
 
 
 class MenuAction(Enum):
@@ -9,6 +14,26 @@ class MenuAction(Enum):
     EXIT = auto()
 
 
+def _is_subsequence(needle: str, haystack: str) -> bool:
+    remaining = iter(haystack)
+    return all(char in remaining for char in needle)
+
+
+def filter_items(items: list[T], text: str, key: Callable[[T], str]) -> list[T]:
+    if not text:
+        return items
+    text = text.lower()
+    exact: list[T] = []
+    fuzzy: list[T] = []
+    for item in items:
+        label = key(item).lower()
+        if text in label:
+            exact.append(item)
+        elif _is_subsequence(text, label):
+            fuzzy.append(item)
+    return exact + fuzzy
+
+
 class MenuOption:
     def __init__(self, label: str) -> None:
         self.label = label
@@ -18,63 +43,152 @@ class MenuOption:
         pass
 
 
+class LazyOption(MenuOption):
+    # Defers importing and building a submenu until it is first opened.
+    def __init__(self, label: str, factory: Callable[[], MenuOption]) -> None:
+        super().__init__(label)
+        self.factory = factory
+        self.option: MenuOption | None = None
+
+    def run(self) -> MenuAction:
+        if self.option is None:
+            self.option = self.factory()
+        return self.option.run()
+
+
 class Menu(MenuOption):
+    page_size = 20
+    # Menus that page something other than their options turn this off.
+    page_options = True
+
     def __init__(self, label: str) -> None:
         super().__init__(label)
         self.options: list[MenuOption] = []
+        self.page = 0
+        self.filter_text = ""
 
     def add_option(self, option: MenuOption) -> None:
         self.options.append(option)
 
+    def visible_options(self) -> list[MenuOption]:
+        if not self.page_options:
+            return self.options
+        return filter_items(self.options, self.filter_text, key=lambda o: o.label)
+
+    def page_bounds(self, count: int) -> tuple[int, int]:
+        pages = max(1, ceil(count / self.page_size))
+        self.page = min(self.page, pages - 1)
+        start = self.page * self.page_size
+        return start, min(count, start + self.page_size)
+
+    def display_navigation(self, count: int) -> None:
+        if count <= self.page_size and not self.filter_text:
+            return
+        pages = max(1, ceil(count / self.page_size))
+        status = f"Page {self.page + 1}/{pages}"
+        if self.filter_text:
+            status += f", filter '{self.filter_text}'"
+        print(f"{status} ('n' next, 'p' previous, '/text' filter, '/' clear)")
+
     def display(self) -> None:
         print(f"\n{self.label}")
-        for index, option in enumerate(self.options, 1):
-            print(f"{index}. {option.label}")
+        visible = self.visible_options()
+        if self.page_options:
+            start, end = self.page_bounds(len(visible))
+        else:
+            start, end = 0, len(visible)
+        for index in range(start, end):
+            print(f"{index + 1}. {visible[index].label}")
+        if self.page_options:
+            self.display_navigation(len(visible))
         print("0. Back")
 
+    def handle_navigation(self, choice: str) -> bool:
+        if choice == "n":
+            self.page += 1
+        elif choice == "p":
+            self.page = max(0, self.page - 1)
+        elif choice.startswith("/"):
+            self.filter_text = choice[1:].strip()
+            self.page = 0
+        else:
+            return False
+        return True
+
+    def read_choice(self) -> MenuOption | MenuAction | None:
+        choice = input("Enter your choice: ")
+        if choice == "0":
+            return MenuAction.BACK
+        if self.handle_navigation(choice):
+            return None
+        try:
+            index = int(choice) - 1
+        except ValueError:
+            print("Invalid input. Please enter a number.")
+            return None
+        visible = self.visible_options()
+        if 0 <= index < len(visible):
+            return visible[index]
+        print("Invalid choice. Please try again.")
+        return None
+
     def run(self) -> MenuAction:
         while True:
             self.update_options()
             self.display()
-            choice = input("Enter your choice: ")
-            if choice == "0":
+            option = self.read_choice()
+            if option == MenuAction.BACK:
                 return MenuAction.BACK
-            try:
-                choice = int(choice) - 1
-                if 0 <= choice < len(self.options):
-                    result = self.options[choice].run()
-                    if result != MenuAction.CONTINUE:
-                        return result
-                else:
-                    print("Invalid choice. Please try again.")
-            except ValueError:
-                print("Invalid input. Please enter a number.")
+            if option is None:
+                continue
+            result = option.run()
+            if result != MenuAction.CONTINUE:
+                return result
 
     @abstractmethod
     def update_options(self) -> None:
         pass
 
 
+class CachedMenu(Menu):
+    def __init__(self, label: str) -> None:
+        super().__init__(label)
+        self._built_for: object = None
+        self._built = False
+
+    def update_options(self) -> None:
+        key = self.cache_key()
+        if self._built and key == self._built_for:
+            return
+        self.options.clear()
+        self.build_options()
+        self._built_for = key
+        self._built = True
+
+    @abstractmethod
+    def cache_key(self) -> object:
+        pass
+
+    @abstractmethod
+    def build_options(self) -> None:
+        pass
+
+
 class TaskMenu(Menu):
     def run(self) -> MenuAction:
         while True:
             self.update_options()
             self.display()
-            choice = input("Enter your choice: ")
-            if choice == "0":
+            option = self.read_choice()
+            if option == MenuAction.BACK:
+                return MenuAction.BACK
+            if option is None:
+                continue
+            result = option.run()
+            if result == MenuAction.TASK_COMPLETE:
+                print("Task completed. Returning to previous menu.")
+                return MenuAction.BACK
+            elif result == MenuAction.BACK:
                 return MenuAction.BACK
-            try:
-                choice = int(choice) - 1
-                if 0 <= choice < len(self.options):
-                    result = self.options[choice].run()
-                    if result == MenuAction.TASK_COMPLETE:
-                        print("Task completed. Returning to previous menu.")
-                        return MenuAction.BACK
-                    elif result == MenuAction.BACK:
-                        return MenuAction.BACK
-                    elif result == MenuAction.EXIT:
-                        return MenuAction.EXIT
-                else:
-                    print("Invalid choice. Please try again.")
-            except ValueError:
-                print("Invalid input. Please enter a number.")
+            elif result == MenuAction.EXIT:
+                return MenuAction.EXIT
@@ -0,0 +1,63 @@
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+
+from curl_helper import CurlSession
+from projects import ProjectConfig
+from sync_state import SyncManager
+
+
+@dataclass
+class ProjectRun:
+    project: ProjectConfig
+    value: Any = None
+    error: Exception | None = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class MultiProjectSync:
+    def __init__(
+        self, projects: list[ProjectConfig], workers: int | None = None
+    ) -> None:
+        if not projects:
+            raise ValueError("No projects configured")
+        # Every manager picks up the shared session, so all projects draw on
+        # one connection pool and one adaptive concurrency limit.
+        self.managers = [SyncManager(project) for project in projects]
+        for manager in self.managers:
+            manager.quiet = True
+        self.workers = workers or len(self.managers)
+
+    @property
+    def session(self) -> CurlSession:
+        return self.managers[0].session
+
+    def run(self, action: Callable[[SyncManager], Any]) -> list[ProjectRun]:
+        def run_project(manager: SyncManager) -> ProjectRun:
+            run = ProjectRun(manager.project)
+            start = time.monotonic()
+            try:
+                run.value = action(manager)
+            except Exception as e:
+                run.error = e
+            run.elapsed = time.monotonic() - start
+            return run
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(run_project, self.managers))
+
+    def fetch_and_compare(self) -> list[ProjectRun]:
+        return self.run(lambda manager: manager.fetch_and_compare())
+
+    def save_snapshots(self) -> None:
+        for manager in self.managers:
+            manager.save_snapshot()
+
+    def close(self) -> None:
+        self.session.close()
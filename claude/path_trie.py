@@ -0,0 +1,41 @@
+class _Node:
+    __slots__ = ("children", "replacement")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _Node] = {}
+        self.replacement: str | None = None
+
+
+class PathTrie:
+    def __init__(self) -> None:
+        self._root = _Node()
+
+    def insert(self, prefix: str, replacement: str) -> None:
+        node = self._root
+        for char in prefix:
+            node = node.children.setdefault(char, _Node())
+        # The first rule registered for a prefix wins, as it did before.
+        if node.replacement is None:
+            node.replacement = replacement
+
+    def match(self, path: str) -> tuple[int, str] | None:
+        node = self._root
+        match_length = 0 if node.replacement is not None else -1
+        replacement = node.replacement
+        for index, char in enumerate(path, 1):
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.replacement is not None:
+                match_length = index
+                replacement = node.replacement
+        if replacement is None:
+            return None
+        return match_length, replacement
+
+    def rewrite(self, path: str) -> str:
+        match = self.match(path)
+        if match is None:
+            return path
+        match_length, replacement = match
+        return replacement + path[match_length:]
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import cProfile
+
+_NO_SPAN = nullcontext()
+
+
+class Profiler:
+    def __init__(self) -> None:
+        self.enabled = False
+        self.capture = False
+        self.operations: list[dict] = []
+        # Spans and counters belong to the operation running on each thread, so
+        # a background refresh or a concurrent project never touches another's.
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def enable(self, capture: bool = True) -> None:
+        self.enabled = True
+        self.capture = capture
+
+    def _stack(self) -> list[str]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _reset(self) -> None:
+        self._local.spans = {}
+        self._local.counters = Counter()
+
+    def _spans(self) -> dict[str, list[float]]:
+        if not hasattr(self._local, "spans"):
+            self._reset()
+        return self._local.spans
+
+    def _counters(self) -> Counter[str]:
+        if not hasattr(self._local, "counters"):
+            self._reset()
+        return self._local.counters
+
+    def span(self, name: str) -> AbstractContextManager:
+        # Disabled spans cost one attribute check, so hot paths can keep them.
+        if not self.enabled:
+            return _NO_SPAN
+        return self._span(name)
+
+    def timed(self, name: str) -> Callable[[Callable], Callable]:
+        def decorate(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self._span(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorate
+
+    @contextmanager
+    def _span(self, name: str) -> Iterator[None]:
+        stack = self._stack()
+        stack.append(name)
+        path = "/".join(stack)
+        # Registered on entry so parents are listed before their children.
+        entry = self._spans().setdefault(path, [0, 0.0])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def count(self, name: str, amount: int = 1) -> None:
+        if self.enabled:
+            self._counters()[name] += amount
+
+    @contextmanager
+    def operation(self, name: str) -> Iterator[None]:
+        # Nested operations (push_files inside _sync_paths, say) are plain
+        # spans of the outermost one.
+        if not self.enabled or self._stack():
+            with self.span(name):
+                yield
+            return
+
+        self._reset()
+        # The capture modules are only imported when --profile asks for them.
+        if self.capture:
+            import cProfile
+            import tracemalloc
+
+        profile = cProfile.Profile() if self.capture else None
+        trace_memory = self.capture and not tracemalloc.is_tracing()
+        if trace_memory:
+            tracemalloc.start()
+        if profile is not None:
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler (a debugger or coverage tool) is active.
+                profile = None
+        try:
+            with self._span(name):
+                yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            record = self._record(name, profile, trace_memory)
+            with self._lock:
+                self.operations.append(record)
+            print(format_operation(record))
+
+    def _record(
+        self, name: str, profile: cProfile.Profile | None, trace_memory: bool
+    ) -> dict:
+        record: dict = {
+            "operation": name,
+            "spans": [
+                {"path": path, "count": int(count), "seconds": seconds}
+                for path, (count, seconds) in self._spans().items()
+            ],
+            "counters": dict(self._counters()),
+        }
+        if profile is not None:
+            record["functions"] = _top_functions(profile)
+        if trace_memory:
+            import tracemalloc
+
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            record["memory"] = {
+                "peak_bytes": peak,
+                "top": [
+                    {"location": str(stat.traceback), "bytes": stat.size}
+                    for stat in snapshot.statistics("lineno")[:5]
+                ],
+            }
+        return record
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump({"operations": self.operations}, f, indent=2)
+
+
+def _top_functions(profile: cProfile.Profile, limit: int = 15) -> list[dict]:
+    import pstats
+
+    stats = pstats.Stats(profile).stats
+    # The span wrappers themselves would otherwise top every listing.
+    rows = sorted(
+        (item for item in stats.items() if item[0][0] not in (__file__, "~")),
+        key=lambda item: item[1][3],
+        reverse=True,
+    )
+    return [
+        {
+            "function": f"{os.path.basename(file)}:{line}({function})",
+            "calls": calls,
+            "own_seconds": own,
+            "cumulative_seconds": cumulative,
+        }
+        for (file, line, function), (_, calls, own, cumulative, _) in rows[:limit]
+    ]
+
+
+def format_operation(record: dict) -> str:
+    spans = record["spans"]
+    total = spans[0]["seconds"] if spans else 0.0
+    lines = [f"\nProfile: {record['operation']} {total:.3f}s"]
+    for span in spans:
+        depth = span["path"].count("/")
+        name = "  " * depth + span["path"].rsplit("/", 1)[-1]
+        share = span["seconds"] / total * 100 if total else 0.0
+        lines.append(
+            f"  {name:<40} {span['seconds']:>8.3f}s {share:>5.1f}% {span['count']:>7}x"
+        )
+    if record["counters"]:
+        counters = ", ".join(f"{k} {v}" for k, v in sorted(record["counters"].items()))
+        lines.append(f"  Counters: {counters}")
+    if "memory" in record:
+        lines.append(
+            f"  Peak traced memory: {record['memory']['peak_bytes'] / 1e6:.1f} MB"
+        )
+    for function in record.get("functions", [])[:5]:
+        lines.append(
+            f"  {function['cumulative_seconds']:>8.3f}s cumulative "
+            f"{function['calls']:>7} calls  {function['function']}"
+        )
+    return "\n".join(lines)
+
+
+profiler = Profiler()
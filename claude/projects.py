@@ -0,0 +1,36 @@
+import json
+import os
+from dataclasses import dataclass
+
+from content_store import CACHE_DIR
+
+
+@dataclass(frozen=True)
+class ProjectConfig:
+    name: str
+    project: str
+    # Empty falls back to ORGANIZATION from the environment.
+    organization: str = ""
+    manifest: str = "manifest.json"
+
+    @property
+    def cache_dir(self) -> str:
+        return os.path.join(CACHE_DIR, "projects", self.name)
+
+
+def load_projects(path: str = "projects.json") -> list[ProjectConfig]:
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (IOError, json.JSONDecodeError) as e:
+        raise ValueError(f"Error reading projects from {path}: {e}")
+    try:
+        projects = [ProjectConfig(**entry) for entry in data["projects"]]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Invalid project entry in {path}: {e}")
+
+    names = [project.name for project in projects]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate project names in {path}: {', '.join(duplicates)}")
+    return projects
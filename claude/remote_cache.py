@@ -0,0 +1,59 @@
+import json
+import os
+import tempfile
+
+from content_store import CACHE_DIR
+
+
+class RemoteListingCache:
+    def __init__(self, path: str = os.path.join(CACHE_DIR, "remote.json")) -> None:
+        self.path = path
+        self.url = ""
+        self.etag: str | None = None
+        self.last_modified: str | None = None
+        self.docs: list[dict[str, str]] = []
+
+    def load(self, url: str) -> None:
+        self.url = url
+        self.etag = None
+        self.last_modified = None
+        self.docs = []
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (IOError, json.JSONDecodeError):
+            return
+        # A listing cached for another project must never answer a 304.
+        if data.get("url") != url:
+            return
+        self.etag = data.get("etag")
+        self.last_modified = data.get("last_modified")
+        self.docs = data.get("docs", [])
+
+    def update(
+        self,
+        docs: list[dict[str, str]],
+        etag: str | None,
+        last_modified: str | None,
+    ) -> None:
+        self.docs = docs
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        data = {
+            "url": self.url,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "docs": self.docs,
+        }
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import time
+
+from content_store import CACHE_DIR
+
+# Files modified this recently may still change within the same mtime tick,
+# so their digests are not trusted on the next scan.
+RACY_WINDOW_NS = 2_000_000_000
+
+
+class ScanCache:
+    def __init__(self, path: str = os.path.join(CACHE_DIR, "scan.db")) -> None:
+        self.path = path
+        self.entries: dict[str, tuple[int, int, int, str]] = {}
+        self._dirty: dict[str, tuple[int, int, int, str]] = {}
+        # (local digest, remote digest, line-ending policy) -> whether the two
+        # contents are equal under the policy.
+        self.matches: dict[tuple[str, str, str], bool] = {}
+        self._loaded = False
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        connection = sqlite3.connect(self.path)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS scan ("
+            "path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, "
+            "inode INTEGER, digest TEXT)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS line_endings ("
+            "local_digest TEXT, remote_digest TEXT, policy TEXT, matched INTEGER, "
+            "PRIMARY KEY (local_digest, remote_digest, policy))"
+        )
+        return connection
+
+    def load(self) -> None:
+        if self._loaded:
+            return
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT path, mtime_ns, size, inode, digest FROM scan"
+            )
+            self.entries = {row[0]: tuple(row[1:]) for row in rows}
+            rows = connection.execute(
+                "SELECT local_digest, remote_digest, policy, matched FROM line_endings"
+            )
+            self.matches = {tuple(row[:3]): bool(row[3]) for row in rows}
+        self._loaded = True
+
+    def lookup(self, path: str, stat_result: os.stat_result) -> str | None:
+        entry = self.entries.get(path)
+        if entry is None:
+            return None
+        mtime_ns, size, inode, digest = entry
+        if (mtime_ns, size, inode) != (
+            stat_result.st_mtime_ns,
+            stat_result.st_size,
+            stat_result.st_ino,
+        ):
+            return None
+        return digest
+
+    def record(self, path: str, stat_result: os.stat_result, digest: str) -> None:
+        if time.time_ns() - stat_result.st_mtime_ns < RACY_WINDOW_NS:
+            self.entries.pop(path, None)
+            return
+        entry = (
+            stat_result.st_mtime_ns,
+            stat_result.st_size,
+            stat_result.st_ino,
+            digest,
+        )
+        self.entries[path] = entry
+        self._dirty[path] = entry
+
+    def save(self, seen: set[str]) -> None:
+        removed = [path for path in self.entries if path not in seen]
+        for path in removed:
+            del self.entries[path]
+        if not self._dirty and not removed:
+            return
+
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO scan VALUES (?, ?, ?, ?, ?)",
+                [(path, *entry) for path, entry in self._dirty.items()],
+            )
+            connection.executemany(
+                "DELETE FROM scan WHERE path = ?", [(path,) for path in removed]
+            )
+        self._dirty.clear()
+
+    def lookup_match(
+        self, local_digest: str, remote_digest: str, policy: str
+    ) -> bool | None:
+        return self.matches.get((local_digest, remote_digest, policy))
+
+    def record_matches(self, matches: dict[tuple[str, str, str], bool]) -> None:
+        # Digests name contents, so a result never goes stale and is only added.
+        self.matches.update(matches)
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO line_endings VALUES (?, ?, ?, ?)",
+                [(*key, int(matched)) for key, matched in matches.items()],
+            )
@@ -0,0 +1,40 @@
+import json
+import os
+import tempfile
+
+from content_store import CACHE_DIR
+
+SNAPSHOT_FORMAT = 2
+
+# local_path, local_digest, remote_path, remote_digest, remote_uuid,
+# matched_digest, too_large
+SnapshotRow = tuple[str, str | None, str, str | None, str | None, str | None, bool]
+
+
+class StateSnapshot:
+    def __init__(self, path: str = os.path.join(CACHE_DIR, "state.json")) -> None:
+        self.path = path
+
+    def load(self, url: str) -> list[SnapshotRow] | None:
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (IOError, json.JSONDecodeError):
+            return None
+        # A snapshot of another project, or from an older layout, is ignored.
+        if data.get("format") != SNAPSHOT_FORMAT or data.get("url") != url:
+            return None
+        return [tuple(row) for row in data.get("files", [])]
+
+    def save(self, url: str, rows: list[SnapshotRow]) -> None:
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        data = {"format": SNAPSHOT_FORMAT, "url": url, "files": rows}
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
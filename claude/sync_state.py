@@ -1,23 +1,64 @@
+import copy
 import json
 import os
+import threading
+import time
 from abc import ABC
+from bisect import bisect_left, insort
 from dataclasses import dataclass, field
+from enum import Enum
 
-from curl_helper import CurlDelete, CurlGet, CurlPost
+from bundles import (
+    DEFAULT_MAX_BYTES,
+    Bundle,
+    bundle_target,
+    decode_bundle,
+    encode_bundle,
+    is_bundle,
+    member_remote_path,
+    partition,
+    split_member_path,
+)
+from content_store import CACHE_DIR, ContentStore, content_digest
+from curl_helper import CurlDelete, CurlGet, CurlPost, get_shared_session, load_env
+from ignore_matcher import IgnoreMatcher
+from line_endings import LINE_ENDING_POLICIES, normalize_line_endings
+from local_scan import LocalScanner, ScanStats, hash_file
 from manifest import Manifest
+from profiling import profiler
+from projects import ProjectConfig
+from remote_cache import RemoteListingCache
+from scan_cache import ScanCache
+from state_snapshot import StateSnapshot
+
+LOCAL_FILE_NAMES = ("manifest.json",)
+
+
+class FileStatus(Enum):
+    SYNCED = "synced"
+    MODIFIED = "modified"
+    LOCAL_ONLY = "local_only"
+    REMOTE_ONLY = "remote_only"
+    # Present locally but over SYNC_MAX_FILE_BYTES, so never read or pushed.
+    TOO_LARGE = "too_large"
 
 
 @dataclass
 class File(ABC):
     local_path: str
-    local_contents: str
+    local_digest: str | None
     remote_path: str
-    remote_contents: str
+    remote_digest: str | None
     remote_uuid: str | None
+    store: ContentStore | None = field(default=None, repr=False, compare=False)
+    too_large: bool = False
+    # A local digest whose body, once line endings are normalised, matches the
+    # remote; reset whenever either side changes.
+    matched_digest: str | None = field(default=None, repr=False)
 
     @property
     def local_present(self) -> bool:
-        return self.local_contents != ""
+        return self.local_digest is not None
 
     @property
     def remote_present(self) -> bool:
@@ -27,135 +68,1292 @@ class File(ABC):
     def is_fully_synced(self) -> bool:
         if not self.local_present:
             return False
-        return self.local_contents == self.remote_contents
+        return self.local_digest in (self.remote_digest, self.matched_digest)
+
+    @property
+    def status(self) -> FileStatus:
+        if self.too_large:
+            return FileStatus.TOO_LARGE
+        if self.is_fully_synced:
+            return FileStatus.SYNCED
+        if self.local_present and self.remote_present:
+            return FileStatus.MODIFIED
+        if self.local_present:
+            return FileStatus.LOCAL_ONLY
+        return FileStatus.REMOTE_ONLY
+
+    @property
+    def local_contents(self) -> str:
+        if not self.local_present:
+            return ""
+        with open(self.local_path, "r") as f:
+            return f.read()
+
+    @property
+    def remote_contents(self) -> str:
+        if self.remote_digest is None or self.store is None:
+            return ""
+        return self.store.get(self.remote_digest)
+
+
+@dataclass
+class FileResult:
+    file: File
+    error: Exception | None = None
+    deleted: bool = False
+    uploaded: bool = False
+    # Set by the pre-flight check when the push would change nothing.
+    skipped: bool = False
+    attempts: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class UploadReport:
+    results: list[FileResult] = field(default_factory=list)
+    bytes_sent: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def succeeded(self) -> list[FileResult]:
+        return [result for result in self.results if result.ok]
+
+    @property
+    def failed(self) -> list[FileResult]:
+        return [result for result in self.results if not result.ok]
+
+    @property
+    def skipped(self) -> list[FileResult]:
+        return [result for result in self.results if result.skipped]
+
+    @property
+    def throughput(self) -> float:
+        return self.bytes_sent / self.elapsed if self.elapsed > 0 else 0.0
+
+
+@dataclass
+class SyncPlan:
+    uploads: list[File] = field(default_factory=list)
+    replacements: list[File] = field(default_factory=list)
+    deletions: list[File] = field(default_factory=list)
+    # Remote-only docs whose local file exists or is excluded from syncing.
+    kept: list[File] = field(default_factory=list)
+    synced: int = 0
+    too_large: int = 0
+
+    @property
+    def pushes(self) -> list[File]:
+        return self.uploads + self.replacements
+
+    def to_dict(self) -> dict:
+        return {
+            "upload": [file.local_path for file in self.uploads],
+            "replace": [file.local_path for file in self.replacements],
+            "delete": [file.remote_path for file in self.deletions],
+            "keep": [file.remote_path for file in self.kept],
+            "synced": self.synced,
+            "too_large": self.too_large,
+        }
+
+
+class FileIndex(dict[str, File]):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__()
+        # Bumped on every mutation so views can cache what they derive from it.
+        self.version = 0
+        self._buckets: dict[FileStatus, dict[str, File]] = {
+            status: {} for status in FileStatus
+        }
+        self._statuses: dict[str, FileStatus] = {}
+        self._sorted_paths: list[str] = []
+        self.update(*args, **kwargs)
+
+    def _index(self, key: str, value: File) -> None:
+        previous = self._statuses.get(key)
+        if previous is None:
+            insort(self._sorted_paths, key)
+        else:
+            del self._buckets[previous][key]
+        status = value.status
+        self._buckets[status][key] = value
+        self._statuses[key] = status
+
+    def _unindex(self, key: str) -> None:
+        del self._buckets[self._statuses.pop(key)][key]
+        del self._sorted_paths[bisect_left(self._sorted_paths, key)]
+
+    def __setitem__(self, key: str, value: File) -> None:
+        super().__setitem__(key, value)
+        self._index(key, value)
+        self.version += 1
+
+    def __delitem__(self, key: str) -> None:
+        super().__delitem__(key)
+        self._unindex(key)
+        self.version += 1
+
+    def pop(self, key: str, *default):
+        if key not in self:
+            return super().pop(key, *default)
+        self._unindex(key)
+        self.version += 1
+        return super().pop(key)
+
+    def popitem(self) -> tuple[str, File]:
+        key, value = super().popitem()
+        self._unindex(key)
+        self.version += 1
+        return key, value
+
+    def setdefault(self, key: str, default: File) -> File:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs) -> None:
+        # update(path, field=value, ...) changes an indexed File in place; any
+        # other call merges a mapping like dict.update.
+        if args and isinstance(args[0], str):
+            self._change(*args, **kwargs)
+            return
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def _change(self, key: str, **changes) -> None:
+        file = super().__getitem__(key)
+        for name, value in changes.items():
+            if not hasattr(file, name):
+                raise AttributeError(f"File has no field {name!r}")
+            setattr(file, name, value)
+        self._index(key, file)
+        self.version += 1
+
+    def clear(self) -> None:
+        super().clear()
+        for bucket in self._buckets.values():
+            bucket.clear()
+        self._statuses.clear()
+        self._sorted_paths.clear()
+        self.version += 1
+
+    def in_status(self, *statuses: FileStatus) -> list[File]:
+        return [file for status in statuses for file in self._buckets[status].values()]
+
+    def unsynced(self) -> list[File]:
+        return self.in_status(
+            FileStatus.MODIFIED, FileStatus.LOCAL_ONLY, FileStatus.REMOTE_ONLY
+        )
+
+    def counts(self) -> dict[FileStatus, int]:
+        return {status: len(bucket) for status, bucket in self._buckets.items()}
+
+    def sorted_files(self) -> list[File]:
+        return [super(FileIndex, self).__getitem__(key) for key in self._sorted_paths]
 
 
 @dataclass
 class SyncState:
-    files: dict[str, File] = field(default_factory=dict)
+    files: FileIndex = field(default_factory=FileIndex)
     fetched: bool = False
-    manifest: Manifest = field(default_factory=lambda: Manifest.load_from_file())
+    manifest_path: str = "manifest.json"
+    # Read from manifest_path on first use rather than at construction.
+    loaded_manifest: Manifest | None = field(default=None, repr=False)
+    # Set while the files come from the last session's snapshot.
+    stale: bool = False
+    refreshing: bool = False
+    refresh_error: Exception | None = None
+
+    @property
+    def version(self) -> int:
+        return self.files.version
+
+    @property
+    def manifest(self) -> Manifest:
+        if self.loaded_manifest is None:
+            self.loaded_manifest = Manifest.load_from_file(self.manifest_path)
+        return self.loaded_manifest
+
+    @manifest.setter
+    def manifest(self, manifest: Manifest) -> None:
+        self.loaded_manifest = manifest
+
+    @property
+    def marker(self) -> str:
+        if self.refreshing:
+            return " [stale, refreshing...]"
+        if self.refresh_error is not None:
+            return f" [stale, refresh failed: {self.refresh_error}]"
+        if self.stale:
+            return " [stale]"
+        return ""
 
 
 class SyncManager:
-    def __init__(self):
-        self.state = SyncState()
-        self.curl_get = CurlGet()
+    def __init__(self, project: ProjectConfig | None = None):
+        load_env()
+        self.project = project
+        # Blobs are content-addressed and shared; everything keyed by path or
+        # by listing is kept apart per project.
+        cache_dir = project.cache_dir if project is not None else CACHE_DIR
+        self.state = SyncState(
+            manifest_path=project.manifest if project is not None else "manifest.json"
+        )
+        self.store = ContentStore()
+        self.scan_cache = ScanCache(os.path.join(cache_dir, "scan.db"))
+        self.remote_cache = RemoteListingCache(os.path.join(cache_dir, "remote.json"))
+        self.session = get_shared_session()
+        self.curl_get = CurlGet(self.session, *self._target())
+        self.max_in_flight = int(os.getenv("SYNC_MAX_IN_FLIGHT", "8"))
+        self.scan_workers = int(os.getenv("SYNC_SCAN_WORKERS", "8"))
+        self.line_endings = os.getenv("SYNC_LINE_ENDINGS", "lf")
+        if self.line_endings not in LINE_ENDING_POLICIES:
+            raise ValueError(
+                f"SYNC_LINE_ENDINGS must be one of {', '.join(LINE_ENDING_POLICIES)}"
+            )
+        self.max_file_bytes = int(
+            os.getenv("SYNC_MAX_FILE_BYTES", str(4 * 1024 * 1024))
+        )
+        self.last_scan_stats: ScanStats | None = None
+        self.snapshot = StateSnapshot(os.path.join(cache_dir, "state.json"))
+        self.quiet = False
+        self._refresh_thread: threading.Thread | None = None
+
+    def _target(self) -> tuple[str | None, str | None]:
+        if self.project is None:
+            return None, None
+        return self.project.organization, self.project.project
 
+    def _log(self, message: str) -> None:
+        if not self.quiet:
+            print(message)
+
+    @profiler.operation("fetch_and_compare")
     def fetch_and_compare(self) -> None:
-        remote_files = self.fetch_remote_files()
-        self.process_remote_files(remote_files)
+        self.wait_for_refresh()
+        if self.state.stale:
+            # Nothing from the snapshot is kept once a real fetch runs; views
+            # cache on the version, so it must not repeat.
+            files = FileIndex()
+            files.version = self.state.files.version + 1
+            self.state.files = files
+        self.fetch_remote_files()
         self.get_local_files()
+        self.match_line_endings()
+        self.state.fetched = True
+        self.state.stale = False
+        self.state.refresh_error = None
+
+    @profiler.timed("load_snapshot")
+    def load_snapshot(self) -> bool:
+        rows = self.snapshot.load(self.curl_get._get_base_url())
+        if rows is None:
+            return False
+        for row in rows:
+            self.add_file(*row)
         self.state.fetched = True
+        self.state.stale = True
+        return True
+
+    def save_snapshot(self) -> None:
+        if not self.state.fetched:
+            return
+        rows = [
+            (
+                f.local_path,
+                f.local_digest,
+                f.remote_path,
+                f.remote_digest,
+                f.remote_uuid,
+                f.matched_digest,
+                f.too_large,
+            )
+            for f in self.state.files.values()
+        ]
+        self.snapshot.save(self.curl_get._get_base_url(), rows)
+
+    def refresh_in_background(self) -> threading.Thread:
+        self.state.refreshing = True
+        self.state.refresh_error = None
+        self._refresh_thread = threading.Thread(target=self._refresh, daemon=True)
+        self._refresh_thread.start()
+        return self._refresh_thread
+
+    def _refresh(self) -> None:
+        # The refresh builds a separate index and swaps it in when complete,
+        # so the menu keeps reading a consistent (if stale) state meanwhile.
+        worker = copy.copy(self)
+        worker.state = SyncState(
+            manifest_path=self.state.manifest_path,
+            loaded_manifest=self.state.manifest,
+        )
+        worker.curl_get = CurlGet(self.session, *self._target())
+        # The caches hold per-instance state, so the worker gets its own and
+        # they replace ours with the index; the content store is only ever
+        # written atomically by digest and is safe to share.
+        worker.scan_cache = ScanCache(self.scan_cache.path)
+        worker.remote_cache = RemoteListingCache(self.remote_cache.path)
+        worker.quiet = True
+        worker._refresh_thread = None
+        try:
+            with profiler.operation("background_refresh"):
+                worker.fetch_remote_files()
+                worker.get_local_files()
+                worker.match_line_endings()
+        except Exception as e:
+            self.state.refresh_error = e
+        else:
+            files = worker.state.files
+            # Views cache on the version, so it must never repeat across swaps.
+            files.version += self.state.files.version + 1
+            self.state.files = files
+            self.scan_cache = worker.scan_cache
+            self.remote_cache = worker.remote_cache
+            self.last_scan_stats = worker.last_scan_stats
+            self.state.stale = False
+            self.state.fetched = True
+        finally:
+            self.state.refreshing = False
+
+    def wait_for_refresh(self) -> bool:
+        thread = self._refresh_thread
+        if thread is None or thread is threading.current_thread():
+            return False
+        if thread.is_alive():
+            print("Waiting for the background refresh to finish...")
+        thread.join()
+        self._refresh_thread = None
+        return True
+
+    def _ensure_fresh(self) -> bool:
+        # Returns whether the index was replaced. A failed background refresh
+        # leaves the snapshot in place, and its uuids and digests must never
+        # be used to change the remote.
+        refreshed = self.wait_for_refresh()
+        if self.state.stale:
+            print("State is stale, fetching before changing the remote...")
+            self.fetch_and_compare()
+            return True
+        return refreshed
+
+    def _current(self, files: list[File]) -> list[File]:
+        # Files picked from the stale view are re-resolved against the
+        # refreshed index before anything is sent to the remote.
+        if not self._ensure_fresh():
+            return files
+        current = [self.state.files.get(file.local_path) for file in files]
+        return [file for file in current if file is not None]
+
+    @profiler.timed("compute_plan")
+    def compute_plan(self) -> SyncPlan:
+        files = self.state.files
+
+        def by_path(status: FileStatus) -> list[File]:
+            return sorted(files.in_status(status), key=lambda f: f.local_path)
+
+        matcher = IgnoreMatcher.for_directory(".", self.state.manifest.ignore)
+        plan = SyncPlan(
+            uploads=by_path(FileStatus.LOCAL_ONLY),
+            replacements=by_path(FileStatus.MODIFIED),
+            synced=files.counts()[FileStatus.SYNCED],
+            too_large=files.counts()[FileStatus.TOO_LARGE],
+        )
+        for file in by_path(FileStatus.REMOTE_ONLY):
+            if self._prunable(file, matcher):
+                plan.deletions.append(file)
+            else:
+                plan.kept.append(file)
+        return plan
+
+    def _prunable(self, file: File, matcher: IgnoreMatcher) -> bool:
+        # Only docs whose local file is really gone are pruned; one that was
+        # filtered out of the scan is not managed here, not missing.
+        local_path = file.local_path
+        if self._excluded(local_path, matcher):
+            return False
+        return not os.path.lexists(local_path)
+
+    def _excluded(self, local_path: str, matcher: IgnoreMatcher) -> bool:
+        name = os.path.basename(local_path)
+        if not (
+            name.endswith(self.state.manifest.local_extensions)
+            or name in LOCAL_FILE_NAMES
+        ):
+            return True
+        parts = local_path.split("/")
+        for i in range(1, len(parts)):
+            if matcher.is_ignored("/".join(parts[:i]), is_dir=True):
+                return True
+        return matcher.is_ignored(local_path)
 
     def add_file(
         self,
         local_path: str,
-        local_contents: str,
+        local_digest: str | None,
         remote_path: str,
-        remote_contents: str,
+        remote_digest: str | None,
         remote_uuid: str | None,
+        matched_digest: str | None = None,
+        too_large: bool = False,
     ) -> None:
         self.state.files[local_path] = File(
             local_path=local_path,
-            local_contents=local_contents,
+            local_digest=local_digest,
             remote_path=remote_path,
-            remote_contents=remote_contents,
+            remote_digest=remote_digest,
             remote_uuid=remote_uuid,
+            store=self.store,
+            too_large=too_large,
+            matched_digest=matched_digest,
         )
 
     def process_remote_files(self, remote_files: list[dict[str, str]]) -> None:
-        for remote_file in remote_files:
-            remote_path = remote_file["file_name"]
-            local_path = self.infer_local_path(remote_path)
-            self.add_file(
-                local_path, "", remote_path, remote_file["content"], remote_file["uuid"]
-            )
+        changed = sum(self._apply_remote_file(f) for f in remote_files)
+        removed = self._forget_missing_remotes({f["uuid"] for f in remote_files})
+        self._report_remote_changes(changed, removed)
+
+    def _apply_remote_file(self, remote_file: dict[str, str]) -> bool:
+        remote_path = remote_file["file_name"]
+        member = split_member_path(remote_path)
+        local_path = member[1] if member else self.infer_local_path(remote_path)
+        existing = self.state.files.get(local_path)
+        if (
+            existing is not None
+            and existing.remote_uuid == remote_file["uuid"]
+            and existing.remote_digest == remote_file["digest"]
+        ):
+            return False
+        self.add_file(
+            local_path,
+            existing.local_digest if existing is not None else None,
+            remote_path,
+            remote_file["digest"],
+            remote_file["uuid"],
+        )
+        return True
+
+    def _forget_missing_remotes(self, remote_uuids: set[str]) -> int:
+        removed = [
+            file
+            for file in self.state.files.values()
+            if file.remote_present and file.remote_uuid not in remote_uuids
+        ]
+        for file in removed:
+            self._forget_remote(file)
+        return len(removed)
 
-    def get_local_files(self) -> dict[str, str]:
+    def _report_remote_changes(self, changed: int, removed: int) -> None:
+        if changed or removed:
+            self._log(f"Remote changes: {changed} added or updated, {removed} removed")
+
+    @profiler.timed("get_local_files")
+    def get_local_files(self) -> None:
         directory = "."
-        for root, _, files in os.walk(directory):
-            if "node_modules" in root or "build" in root:
+        scanner = LocalScanner(
+            directory,
+            IgnoreMatcher.for_directory(directory, self.state.manifest.ignore),
+            self.scan_cache,
+            extensions=self.state.manifest.local_extensions,
+            file_names=LOCAL_FILE_NAMES,
+            workers=self.scan_workers,
+            max_file_bytes=self.max_file_bytes,
+        )
+        for local_path, digest in scanner.scan():
+            existing = self.state.files.get(local_path)
+            if existing is not None:
+                if existing.local_digest != digest or existing.too_large:
+                    self.state.files.update(
+                        local_path, local_digest=digest, too_large=False
+                    )
                 continue
-            for file in files:
-                if (
-                    not file.endswith((".js", ".ts", ".tsx", ".py", ".yml"))
-                    and file != "manifest.json"
+
+            remote_path = self.infer_remote_path(local_path)
+            self.add_file(local_path, digest, remote_path, None, None)
+        for local_path in scanner.stats.too_large:
+            self._mark_too_large(local_path)
+        for local_path in scanner.stats.unreadable:
+            self._log(f"Warning: skipping {local_path}, it could not be read")
+
+        self.last_scan_stats = scanner.stats
+        profiler.count("local_files", scanner.stats.files)
+        profiler.count("local_files_hashed", scanner.stats.hashed)
+        profiler.count("local_bytes_hashed", scanner.stats.bytes_read)
+        self._log(str(scanner.stats))
+
+    def _mark_too_large(self, local_path: str) -> None:
+        # The file stays in the index, so its remote doc is never taken for
+        # one whose local copy is gone.
+        self._log(
+            f"Warning: skipping {local_path}, it is larger than "
+            f"{self.max_file_bytes / 1024 / 1024:.1f} MiB (SYNC_MAX_FILE_BYTES)"
+        )
+        existing = self.state.files.get(local_path)
+        if existing is None:
+            remote_path = self.infer_remote_path(local_path)
+            self.add_file(local_path, None, remote_path, None, None)
+        elif existing.too_large:
+            return
+        self.state.files.update(local_path, local_digest=None, too_large=True)
+
+    def watch(
+        self,
+        debounce: float = 0.2,
+        max_latency: float = 1.0,
+        stop: threading.Event | None = None,
+    ) -> None:
+        # Imported here so ctypes and inotify setup stay off the startup path.
+        from watcher import PollingWatcher, create_watcher
+
+        directory = "."
+        matcher = IgnoreMatcher.for_directory(directory, self.state.manifest.ignore)
+        watcher = create_watcher(directory, matcher)
+        stop = stop or threading.Event()
+        pending: set[str] = set()
+        first_change = last_change = 0.0
+        print(f"Watching for changes ({type(watcher).__name__}), Ctrl+C to stop.")
+        try:
+            while not stop.is_set():
+                try:
+                    changed = watcher.poll(debounce)
+                except OSError as e:
+                    # A new directory could not be watched; poll from now on.
+                    print(f"Watching with inotify failed ({e}), polling instead.")
+                    watcher.close()
+                    watcher = PollingWatcher(directory, matcher)
+                    changed = None
+                now = time.monotonic()
+                if changed is None:
+                    # The kernel queue overflowed; fall back to a full rescan.
+                    changed = self._rescan_changed_paths()
+                if changed:
+                    if not pending:
+                        first_change = now
+                    pending |= changed
+                    last_change = now
+                if pending and (
+                    now - last_change >= debounce or now - first_change >= max_latency
                 ):
-                    continue
-                local_path = os.path.relpath(os.path.join(root, file), directory)
-                with open(os.path.join(root, file), "r") as f:
-                    contents = f.read()
+                    self._sync_paths(pending)
+                    pending = set()
+        finally:
+            watcher.close()
+
+    def _rescan_changed_paths(self) -> set[str]:
+        before = {path: file.local_digest for path, file in self.state.files.items()}
+        self.get_local_files()
+        return {
+            path
+            for path, file in self.state.files.items()
+            if before.get(path) != file.local_digest
+        }
+
+    @profiler.operation("sync_paths")
+    def _sync_paths(self, paths: set[str]) -> UploadReport | None:
+        self.wait_for_refresh()
+        changed = []
+        extensions = self.state.manifest.local_extensions
+        for local_path in sorted(paths):
+            name = os.path.basename(local_path)
+            if not (name.endswith(extensions) or name in LOCAL_FILE_NAMES):
+                continue
 
-                if local_path in self.state.files:
-                    self.state.files[local_path].local_contents = contents
+            existing = self.state.files.get(local_path)
+            try:
+                if os.path.getsize(local_path) > self.max_file_bytes:
+                    self._mark_too_large(local_path)
                     continue
+                digest, _ = hash_file(local_path)
+            except FileNotFoundError:
+                # Deletions are never propagated remotely from watch mode.
+                if existing is not None and (
+                    existing.local_present or existing.too_large
+                ):
+                    if existing.remote_present:
+                        self.state.files.update(
+                            local_path, local_digest=None, too_large=False
+                        )
+                    else:
+                        del self.state.files[local_path]
+                continue
+            except (IOError, UnicodeDecodeError) as e:
+                print(f"Skipping {local_path}: {e}")
+                continue
 
+            if existing is None:
                 remote_path = self.infer_remote_path(local_path)
-                self.add_file(local_path, contents, remote_path, "", None)
+                self.add_file(local_path, digest, remote_path, None, None)
+                existing = self.state.files[local_path]
+            elif existing.local_digest != digest or existing.too_large:
+                self.state.files.update(
+                    local_path, local_digest=digest, too_large=False
+                )
+            if not existing.is_fully_synced:
+                changed.append(existing)
 
+        if not changed:
+            return None
+        print(f"Pushing {len(changed)} changed file(s)...")
+        return self.push_files(changed)
+
+    @profiler.timed("infer_remote_path")
     def infer_remote_path(self, local_path: str) -> str:
-        for rule in self.state.manifest.rules:
-            if rule["type"] == "directory_match" and local_path.startswith(
-                rule["source"]
-            ):
-                return local_path.replace(rule["source"], rule["target"], 1)
-        return local_path
+        return self.state.manifest.infer_remote_path(local_path)
 
+    @profiler.timed("infer_local_path")
     def infer_local_path(self, remote_path: str) -> str:
-        for rule in self.state.manifest.rules:
-            if rule["type"] == "directory_match" and remote_path.startswith(
-                rule["target"]
-            ):
-                return remote_path.replace(rule["target"], rule["source"], 1)
-        return remote_path
+        return self.state.manifest.infer_local_path(remote_path)
+
+    def add_directory_match_rule(self, source: str, target: str) -> None:
+        self.state.manifest.add_directory_match_rule(source, target)
+
+    def remove_directory_match_rule(self, source: str, target: str) -> None:
+        self.state.manifest.remove_directory_match_rule(source, target)
+
+    def get_directory_match_rules(self) -> list[dict[str, str]]:
+        return self.state.manifest.get_directory_match_rules()
+
+    def add_bundle_rule(self, source: str, target: str, max_bytes: int) -> None:
+        self.state.manifest.add_bundle_rule(source, target, max_bytes)
+        self._reinfer_local_only()
+
+    def remove_bundle_rule(self, source: str) -> None:
+        self.state.manifest.remove_bundle_rule(source)
+        self._reinfer_local_only()
+
+    def get_bundle_rules(self) -> list[dict]:
+        return self.state.manifest.get_bundle_rules()
+
+    def _reinfer_local_only(self) -> None:
+        # Files with no remote doc yet follow the rule change on their next push.
+        for file in self.state.files.in_status(FileStatus.LOCAL_ONLY):
+            remote_path = self.infer_remote_path(file.local_path)
+            self.state.files.update(file.local_path, remote_path=remote_path)
 
     def save_manifest(self) -> None:
-        self.state.manifest.save_to_file()
-        print("Manifest saved to manifest.json")
+        if self.state.manifest.save_to_file(self.state.manifest_path):
+            print(f"Manifest saved to {self.state.manifest_path}")
+        else:
+            print(f"Manifest unchanged, {self.state.manifest_path} not rewritten")
 
+    @profiler.timed("fetch_remote_files")
     def fetch_remote_files(self) -> list[dict[str, str]]:
+        cache = self.remote_cache
+        cache.load(self.curl_get._get_base_url())
+        # Only ask for a 304 when every cached body is still in the store.
+        if all(doc["digest"] in self.store for doc in cache.docs):
+            self.curl_get.etag = cache.etag
+            self.curl_get.last_modified = cache.last_modified
+        else:
+            self.curl_get.etag = None
+            self.curl_get.last_modified = None
+
+        remote_files: list[dict[str, str]] = []
+        changed = 0
+
+        # Each doc is applied to the state as soon as it is parsed and its body
+        # goes straight to the store, so only one doc is in memory at a time.
+        def on_doc(doc: dict[str, str]) -> None:
+            nonlocal changed
+            with profiler.span("apply_remote_doc"):
+                for remote_file in self._remote_entries(doc):
+                    remote_files.append(remote_file)
+                    changed += self._apply_remote_file(remote_file)
+            profiler.count("remote_docs")
+
         try:
-            result = self.curl_get.perform_request()
-            return list(json.loads(result))
+            self.curl_get.stream_request(on_doc)
         except json.JSONDecodeError as e:
             raise ValueError(f"Error decoding JSON response: {e}")
         except KeyError as e:
             raise ValueError(f"Unexpected response format: {e}")
 
+        if self.curl_get.status_code == 304:
+            self._log("Remote files unchanged since last fetch.")
+            remote_files = list(cache.docs)
+            self.process_remote_files(remote_files)
+            return remote_files
+
+        removed = self._forget_missing_remotes({f["uuid"] for f in remote_files})
+        self._report_remote_changes(changed, removed)
+        headers = self.curl_get.response_headers
+        cache.update(remote_files, headers.get("etag"), headers.get("last-modified"))
+        cache.save()
+        return remote_files
+
+    def _remote_entries(self, doc: dict[str, str]) -> list[dict[str, str]]:
+        # A bundle doc stands for one entry per member, all sharing its uuid.
+        if is_bundle(doc["file_name"], doc["content"]):
+            try:
+                members = decode_bundle(doc["content"])
+            except ValueError as e:
+                print(f"Treating {doc['file_name']} as a plain doc: {e}")
+            else:
+                return [
+                    {
+                        "file_name": member_remote_path(doc["file_name"], path),
+                        "uuid": doc["uuid"],
+                        "digest": self.store.put(content),
+                    }
+                    for path, content in members
+                ]
+        return [
+            {
+                "file_name": doc["file_name"],
+                "uuid": doc["uuid"],
+                "digest": self.store.put(doc["content"]),
+            }
+        ]
+
     def upload_content(self, filename: str, content: str) -> None:
         try:
-            curl_post = CurlPost(filename, content)
+            curl_post = CurlPost(filename, content, self.session, *self._target())
             result = curl_post.perform_request()
             print(f"Successfully uploaded {filename}")
             print(f"Response: {result}")
         except Exception as e:
             raise Exception(f"Error uploading {filename}: {e}")
 
-    def upload_file(self, file: File) -> None:
+    @profiler.timed("read_local")
+    def read_local_contents(self, file: File) -> str:
         try:
             with open(file.local_path, "r") as f:
-                content = f.read()
-            self.upload_content(file.remote_path, content)
-        except IOError as e:
+                return f.read()
+        except (IOError, UnicodeDecodeError) as e:
+            # Undecodable text is as unusable as a file that cannot be opened.
             raise IOError(f"Error reading file {file.local_path}: {e}")
 
-    def upload_manifest(self) -> None:
-        manifest_content = json.dumps(self.state.manifest.__dict__, indent=2)
-        self.upload_content("manifest.json", manifest_content)
+    def upload_file(self, file: File) -> None:
+        [file] = self._current([file]) or [file]
+        if split_member_path(file.remote_path):
+            report = self.upload_files([file])
+            if report.failed:
+                raise report.failed[0].error
+            return
+        content = normalize_line_endings(
+            self.read_local_contents(file), self.line_endings
+        )
+        self.upload_content(file.remote_path, content)
+
+    @profiler.operation("upload_files")
+    def upload_files(
+        self, files: list[File], max_in_flight: int | None = None
+    ) -> UploadReport:
+        files = self._current(files)
+        report = UploadReport()
+        contents: dict[str, str] = {}
+        for file in files:
+            result = FileResult(file)
+            report.results.append(result)
+            try:
+                contents[file.local_path] = self.read_local_contents(file)
+            except IOError as e:
+                result.error = e
+
+        start = time.monotonic()
+        # Uploads add docs without replacing any, so there is no remote to match.
+        self._preflight(report, contents, compare_remote=False)
+        self._write_bundles(report, contents, max_in_flight)
+        self._upload_batch(report, contents, max_in_flight, retries=0)
+        report.elapsed = time.monotonic() - start
+
+        self._print_report(report, "Uploaded")
+        return report
+
+    @profiler.operation("push_files")
+    def push_files(
+        self,
+        files: list[File],
+        max_in_flight: int | None = None,
+        upload_retries: int = 2,
+    ) -> UploadReport:
+        files = self._current(files)
+        report = UploadReport()
+        contents: dict[str, str] = {}
+
+        # Read every local body before touching the remote, so a file that
+        # cannot be read never has its remote copy deleted.
+        for file in files:
+            result = FileResult(file)
+            report.results.append(result)
+            try:
+                contents[file.local_path] = self.read_local_contents(file)
+            except IOError as e:
+                result.error = e
+
+        start = time.monotonic()
+        self._preflight(report, contents, compare_remote=True)
+        # Bundled files replace their bundle instead of their own doc.
+        self._write_bundles(report, contents, max_in_flight)
+        replaced = [
+            result
+            for result in report.results
+            if result.ok
+            and not (result.uploaded or result.skipped)
+            and result.file.remote_present
+        ]
+        self._upload_batch(report, contents, max_in_flight, upload_retries)
+
+        # An old doc is only removed once its replacement exists, so a failed
+        # upload leaves the remote as it was.
+        to_delete = [result for result in replaced if result.uploaded]
+        curl_results = self.session.perform_many(
+            [
+                CurlDelete(result.file.remote_uuid, self.session, *self._target())
+                for result in to_delete
+            ],
+            max_in_flight or self.max_in_flight,
+        )
+        for result, curl_result in zip(to_delete, curl_results):
+            if curl_result.ok:
+                result.deleted = True
+                current = self.state.files.get(result.file.local_path)
+                # Without a uuid in the upload response the new doc is only
+                # known after the next fetch.
+                if (
+                    current is not None
+                    and current.remote_uuid == result.file.remote_uuid
+                ):
+                    self._forget_remote(current)
+            else:
+                print(
+                    f"Warning: could not delete the previous {result.file.remote_path} "
+                    f"({result.file.remote_uuid}): {curl_result.error}"
+                )
+        report.elapsed = time.monotonic() - start
+
+        self._print_report(report, "Pushed")
+        return report
+
+    def _upload_batch(
+        self,
+        report: UploadReport,
+        contents: dict[str, str],
+        max_in_flight: int | None,
+        retries: int,
+    ) -> None:
+        pending = [
+            result
+            for result in report.results
+            if result.ok and not (result.uploaded or result.skipped)
+        ]
+        for attempt in range(retries + 1):
+            if not pending:
+                break
+            requests = [
+                CurlPost(
+                    result.file.remote_path,
+                    contents[result.file.local_path],
+                    self.session,
+                    *self._target(),
+                )
+                for result in pending
+            ]
+            curl_results = self.session.perform_many(
+                requests, max_in_flight or self.max_in_flight
+            )
+            failed: list[FileResult] = []
+            for result, curl_result in zip(pending, curl_results):
+                result.attempts += 1
+                if curl_result.ok:
+                    result.uploaded = True
+                    result.error = None
+                    content = contents[result.file.local_path]
+                    report.bytes_sent += len(content.encode("utf-8"))
+                    self._record_upload(result.file, content, curl_result.response)
+                else:
+                    result.error = Exception(
+                        f"Error uploading {result.file.remote_path}: {curl_result.error}"
+                    )
+                    failed.append(result)
+            pending = failed
+
+    def _preflight(
+        self, report: UploadReport, contents: dict[str, str], compare_remote: bool
+    ) -> None:
+        # Runs before any request: bodies are normalised once, pushes the
+        # remote already matches are dropped, and duplicates are collapsed.
+        bodies: dict[str, str] = {}
+        targets: dict[str, tuple[FileResult, str]] = {}
+        for result in report.results:
+            if not result.ok:
+                continue
+            file = result.file
+            content = normalize_line_endings(
+                contents[file.local_path], self.line_endings
+            )
+            digest = content_digest(content)
+            # Identical bodies share one string for the rest of the batch.
+            content = contents[file.local_path] = bodies.setdefault(digest, content)
+
+            # Registered before the remote check, so a later file for the same
+            # target still counts as a duplicate when this one is skipped.
+            first, first_digest = targets.setdefault(file.remote_path, (result, digest))
+            if first is result:
+                if (
+                    compare_remote
+                    and file.remote_present
+                    and self._remote_matches(file, digest)
+                ):
+                    result.skipped = True
+                    self._mark_matched(file)
+                continue
+            if first_digest == digest:
+                result.skipped = True
+            else:
+                result.error = Exception(
+                    f"Not pushing {file.local_path}: {first.file.local_path} "
+                    f"is also pushed to {file.remote_path}"
+                )
+        profiler.count("preflight_skipped", sum(r.skipped for r in report.results))
+
+    def _remote_matches(self, file: File, digest: str) -> bool:
+        if file.remote_digest == digest:
+            return True
+        if (
+            self.line_endings == "exact"
+            or file.remote_digest is None
+            or file.remote_digest not in self.store
+        ):
+            return False
+        remote = self.store.get(file.remote_digest)
+        normalized = normalize_line_endings(remote, self.line_endings)
+        return content_digest(normalized) == digest
+
+    @profiler.timed("match_line_endings")
+    def match_line_endings(self) -> None:
+        # A modified file that only differs from its remote in what the policy
+        # normalises away is in sync: pushing it would be skipped as a no-op.
+        # Each (local, remote) pair is read and compared once, then remembered.
+        if self.line_endings == "exact":
+            return
+        self.scan_cache.load()
+        checked: dict[tuple[str, str, str], bool] = {}
+        for file in self.state.files.in_status(FileStatus.MODIFIED):
+            key = (file.local_digest, file.remote_digest, self.line_endings)
+            matched = self.scan_cache.lookup_match(*key)
+            if matched is None:
+                if file.remote_digest not in self.store:
+                    continue
+                try:
+                    content = self.read_local_contents(file)
+                except IOError:
+                    continue
+                normalized = normalize_line_endings(content, self.line_endings)
+                matched = self._remote_matches(file, content_digest(normalized))
+                # A file edited since it was scanned says nothing about the pair.
+                if content_digest(content) == file.local_digest:
+                    checked[key] = matched
+            if matched:
+                self._mark_matched(file)
+        profiler.count("line_endings_checked", len(checked))
+        if checked:
+            self.scan_cache.record_matches(checked)
+
+    def _mark_matched(self, file: File) -> None:
+        # Only the indexed entry is marked, and only if it still holds the
+        # digests that were compared.
+        current = self.state.files.get(file.local_path)
+        if (
+            current is not None
+            and current.local_digest == file.local_digest
+            and current.remote_digest == file.remote_digest
+        ):
+            self.state.files.update(file.local_path, matched_digest=file.local_digest)
+
+    def overwrite_file(self, file: File) -> None:
+        report = self.push_files([file])
+        if report.failed:
+            raise report.failed[0].error
+
+    def _write_bundles(
+        self,
+        report: UploadReport,
+        contents: dict[str, str | None],
+        max_in_flight: int | None,
+    ) -> None:
+        by_target: dict[str, dict[str, FileResult]] = {}
+        for result in report.results:
+            member = split_member_path(result.file.remote_path)
+            if result.ok and not result.skipped and member is not None:
+                target = bundle_target(member[0])
+                by_target.setdefault(target, {})[result.file.local_path] = result
+        for target, results in sorted(by_target.items()):
+            with profiler.span("write_bundles"):
+                report.bytes_sent += self._write_target_bundles(
+                    target, results, contents, max_in_flight
+                )
+
+    def _write_target_bundles(
+        self,
+        target: str,
+        results: dict[str, FileResult],
+        contents: dict[str, str | None],
+        max_in_flight: int | None,
+    ) -> int:
+        rule = self.state.manifest.bundle_rule_for_target(target)
+        max_bytes = rule["max_bytes"] if rule is not None else DEFAULT_MAX_BYTES
+
+        existing: dict[str, Bundle] = {}
+        members: dict[str, tuple[str, int]] = {}
+        for file in self.state.files.values():
+            member = split_member_path(file.remote_path)
+            if (
+                member is None
+                or not file.remote_present
+                or bundle_target(member[0]) != target
+            ):
+                continue
+            bundle = existing.setdefault(member[0], Bundle(member[0], file.remote_uuid))
+            bundle.members[file.local_path] = file.remote_digest
+            members[file.local_path] = (
+                file.remote_digest,
+                self.store.size(file.remote_digest),
+            )
+        for local_path in results:
+            content = contents.get(local_path)
+            if content is None:
+                members.pop(local_path, None)
+            else:
+                size = len(content.encode("utf-8"))
+                members[local_path] = (self.store.put(content), size)
+
+        # Only bundles whose member digests differ from the remote are sent.
+        bundles = partition(members, target, max_bytes)
+        uploads = [
+            bundle
+            for bundle in bundles
+            if bundle.name not in existing
+            or existing[bundle.name].members != bundle.members
+        ]
+        kept = {bundle.name for bundle in bundles} - {b.name for b in uploads}
+        bodies = [
+            encode_bundle(
+                [
+                    (
+                        path,
+                        contents[path] if path in contents else self.store.get(digest),
+                    )
+                    for path, digest in bundle.members.items()
+                ]
+            )
+            for bundle in uploads
+        ]
+        curl_results = self.session.perform_many(
+            [
+                CurlPost(bundle.name, body, self.session, *self._target())
+                for bundle, body in zip(uploads, bodies)
+            ],
+            max_in_flight or self.max_in_flight,
+        )
+        for bundle, curl_result in zip(uploads, curl_results):
+            bundle.uuid = self._response_uuid(curl_result.response)
+        for result in results.values():
+            result.attempts += 1
+
+        failure = next((r.error for r in curl_results if not r.ok), None)
+        if failure is not None or not all(bundle.uuid for bundle in uploads):
+            # Roll back so the old bundles stay the only copy of each member.
+            self.session.perform_many(
+                [
+                    CurlDelete(b.uuid, self.session, *self._target())
+                    for b in uploads
+                    if b.uuid
+                ],
+                max_in_flight or self.max_in_flight,
+            )
+            for result in results.values():
+                result.error = Exception(
+                    f"Error writing bundles in {target or '.'}: "
+                    f"{failure or 'no uuid in response'}"
+                )
+            return 0
+
+        stale = [b for name, b in sorted(existing.items()) if name not in kept]
+        delete_results = self.session.perform_many(
+            [
+                CurlDelete(bundle.uuid, self.session, *self._target())
+                for bundle in stale
+            ],
+            max_in_flight or self.max_in_flight,
+        )
+        for bundle, curl_result in zip(stale, delete_results):
+            if not curl_result.ok:
+                print(
+                    f"Warning: could not delete replaced bundle {bundle.name}: "
+                    f"{curl_result.error}"
+                )
+
+        for bundle in uploads:
+            for path, digest in bundle.members.items():
+                file = self.state.files.get(path)
+                self.add_file(
+                    path,
+                    file.local_digest if file is not None else None,
+                    member_remote_path(bundle.name, path),
+                    digest,
+                    bundle.uuid,
+                )
+        for local_path, result in results.items():
+            if contents.get(local_path) is None:
+                result.deleted = True
+                file = self.state.files[local_path]
+                self.state.files.pop(local_path)
+                if file.local_present:
+                    remote_path = self.infer_remote_path(local_path)
+                    self.add_file(
+                        local_path, file.local_digest, remote_path, None, None
+                    )
+            else:
+                result.uploaded = True
+        return sum(len(body.encode("utf-8")) for body in bodies)
+
+    def _response_uuid(self, response: str | None) -> str | None:
+        try:
+            return json.loads(response).get("uuid") or None
+        except (TypeError, ValueError, AttributeError):
+            return None
+
+    def _record_upload(self, file: File, content: str, response: str) -> None:
+        # The new doc's uuid lets later pushes replace it instead of adding a
+        # duplicate; without it the file stays local-only until a refresh.
+        remote_uuid = self._response_uuid(response)
+        if not remote_uuid:
+            return
+        self.add_file(
+            file.local_path,
+            file.local_digest,
+            file.remote_path,
+            self.store.put(content),
+            remote_uuid,
+        )
+
+    def _print_report(self, report: UploadReport, verb: str) -> None:
+        for result in report.results:
+            if result.skipped:
+                self._log(f"Unchanged, not pushed: {result.file.remote_path}")
+            elif result.ok:
+                self._log(f"Successfully uploaded {result.file.remote_path}")
+            else:
+                self._log(result.error)
+        unchanged = f" ({len(report.skipped)} unchanged)" if report.skipped else ""
+        self._log(
+            f"{verb} {len(report.succeeded)}/{len(report.results)} files{unchanged}, "
+            f"{report.bytes_sent / 1024:.1f} KiB in {report.elapsed:.2f}s "
+            f"({report.throughput / 1024:.1f} KiB/s)"
+        )
+
+    @profiler.operation("delete_files")
+    def delete_files(
+        self, files: list[File], max_in_flight: int | None = None
+    ) -> list[FileResult]:
+        files = self._current(files)
+        report = UploadReport(
+            [
+                FileResult(file)
+                for file in files
+                if file.remote_present and split_member_path(file.remote_path)
+            ]
+        )
+        self._write_bundles(report, {}, max_in_flight)
+        for result in report.results:
+            if result.ok:
+                self._log(
+                    f"Successfully deleted: {result.file.local_path} from its bundle"
+                )
+            else:
+                self._log(result.error)
+        results = [
+            FileResult(file)
+            for file in files
+            if file.remote_present and not split_member_path(file.remote_path)
+        ]
+        curl_results = self.session.perform_many(
+            [
+                CurlDelete(result.file.remote_uuid, self.session, *self._target())
+                for result in results
+            ],
+            max_in_flight or self.max_in_flight,
+        )
+        for result, curl_result in zip(results, curl_results):
+            if curl_result.ok:
+                result.deleted = True
+                self._forget_remote(result.file)
+                self._log(
+                    f"Successfully deleted: {result.file.remote_path} ({result.file.remote_uuid})"
+                )
+            else:
+                result.error = Exception(
+                    f"Error deleting file {result.file.remote_path}: {curl_result.error}"
+                )
+                self._log(result.error)
+        return report.results + results
+
+    def upload_manifest(self) -> bool:
+        self._ensure_fresh()
+        manifest = self.state.manifest
+        existing = self.state.files.get("manifest.json")
+        if existing is not None and existing.remote_path != "manifest.json":
+            existing = None
+        if existing is not None and existing.remote_present:
+            if self._remote_manifest_digest(existing) == manifest.digest():
+                print("Remote manifest is already up to date.")
+                return False
+
+        content = manifest.serialize()
+        try:
+            response = CurlPost(
+                "manifest.json", content, self.session, *self._target()
+            ).perform_request()
+        except Exception as e:
+            raise Exception(f"Error uploading manifest.json: {e}")
+        print("Successfully uploaded manifest.json")
+        # The old doc is only removed once its replacement exists.
+        if existing is not None and existing.remote_present:
+            try:
+                CurlDelete(
+                    existing.remote_uuid, self.session, *self._target()
+                ).perform_request()
+            except Exception as e:
+                print(f"Warning: could not delete the previous manifest.json: {e}")
+        local_digest = existing.local_digest if existing is not None else None
+        uploaded = File("manifest.json", local_digest, "manifest.json", None, None)
+        self._record_upload(uploaded, content, response)
+        return True
+
+    def _remote_manifest_digest(self, file: File) -> str | None:
+        try:
+            data = json.loads(file.remote_contents)
+            return Manifest.from_dict(data).digest()
+        except (IOError, ValueError, TypeError, AttributeError, KeyError):
+            return None
+
+    def close(self) -> None:
+        self.session.close()
 
     def delete_file(self, file: File) -> None:
+        [file] = self._current([file]) or [file]
         if not file.remote_present:
             raise Exception(f"Deleting invalid remote: {file}")
+        if split_member_path(file.remote_path):
+            [result] = self.delete_files([file])
+            if not result.ok:
+                raise result.error
+            return
 
         try:
-            curl_delete = CurlDelete(file.remote_uuid)
+            curl_delete = CurlDelete(file.remote_uuid, self.session, *self._target())
             result = curl_delete.perform_request()
             print(f"Successfully deleted: {file.remote_path} ({file.remote_uuid})")
             print(f"Response: {result}")
         except Exception as e:
             raise Exception(f"Error deleting file {file.remote_path}: {e}")
 
+        self._forget_remote(file)
+
+    def _forget_remote(self, file: File) -> None:
         self.state.files.pop(file.local_path, None)
         if file.local_present:
-            self.add_file(file.local_path, file.local_contents, "", "", None)
+            remote_path = self.infer_remote_path(file.local_path)
+            self.add_file(file.local_path, file.local_digest, remote_path, None, None)
@@ -1,12 +1,57 @@
-from main_menu import MainMenu
-from sync_state import SyncManager
+import argparse
+import sys
 
+from cli import build_parser, run_command, run_multi_command
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.projects and args.command in (None, "watch"):
+        parser.error("--projects needs one of status, plan, push or prune")
+    # Everything past argument parsing is imported here, so --help stays fast.
+    from profiling import profiler
+
+    if args.profile or args.profile_output:
+        profiler.enable(capture=args.profile)
+    if args.projects:
+        return _run_projects(args)
+
+    from sync_state import SyncManager
 
-def main() -> None:
     sync_manager = SyncManager()
-    main_menu = MainMenu(sync_manager)
-    main_menu.run()
+    try:
+        if args.command is None:
+            from main_menu import MainMenu
+
+            # The last session's state makes the menu usable straight away.
+            if sync_manager.load_snapshot():
+                sync_manager.refresh_in_background()
+            main_menu = MainMenu(sync_manager)
+            main_menu.run()
+            return 0
+        return run_command(args, sync_manager)
+    finally:
+        sync_manager.save_snapshot()
+        sync_manager.close()
+        if args.profile_output:
+            profiler.dump(args.profile_output)
+
+
+def _run_projects(args: argparse.Namespace) -> int:
+    from multi_sync import MultiProjectSync
+    from profiling import profiler
+    from projects import load_projects
+
+    multi = MultiProjectSync(load_projects(args.projects))
+    try:
+        return run_multi_command(args, multi)
+    finally:
+        multi.save_snapshots()
+        multi.close()
+        if args.profile_output:
+            profiler.dump(args.profile_output)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
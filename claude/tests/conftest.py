@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch) -> None:
+    # Caches live under the working directory; keep them out of the tree.
+    monkeypatch.chdir(tmp_path)
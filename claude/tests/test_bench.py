@@ -0,0 +1,34 @@
+from bench import BenchResult, find_regressions, run_benchmarks
+
+
+def test_benchmarks_run_at_small_scale(tmp_path, monkeypatch) -> None:
+    monkeypatch.chdir(tmp_path)
+
+    results = run_benchmarks(files=30, docs=40, diffs=5)
+
+    by_name = {result.name: result for result in results}
+    assert list(by_name) == [
+        "fetch_and_compare",
+        "fetch_and_compare_warm",
+        "diff_rendering",
+        "bulk_upload",
+    ]
+    assert by_name["fetch_and_compare"].requests == 1
+    assert by_name["diff_rendering"].requests == 0
+    assert by_name["bulk_upload"].requests > 0
+    assert all(result.peak_rss_mb > 0 for result in results)
+
+
+def test_find_regressions_compares_against_baseline() -> None:
+    baseline = [
+        {"name": "fetch", "wall": 1.0, "requests": 1, "peak_rss_mb": 10},
+        {"name": "upload", "wall": 1.0, "requests": 10, "peak_rss_mb": 10},
+    ]
+    results = [BenchResult("fetch", 1.2, 1, 10), BenchResult("upload", 2.0, 12, 10)]
+
+    regressions = find_regressions(results, baseline, tolerance=1.5)
+
+    assert regressions == [
+        "upload: 2.000s vs 1.000s baseline",
+        "upload: 12 requests vs 10 baseline",
+    ]
@@ -0,0 +1,42 @@
+import pytest
+from bundles import (
+    decode_bundle,
+    encode_bundle,
+    is_bundle,
+    partition,
+    pending_remote_path,
+    split_member_path,
+)
+from content_store import content_digest
+
+
+def test_bundle_round_trips_members() -> None:
+    members = [("src/a.py", "a = 1\n"), ("src/b.py", "b = '#\\n'\n"), ("src/c.py", "")]
+
+    content = encode_bundle(members)
+
+    assert is_bundle("lib/0123.bundle", content)
+    assert not is_bundle("lib/a.py", content)
+    assert decode_bundle(content) == members
+    with pytest.raises(ValueError):
+        decode_bundle(content[:30])
+
+
+def test_member_paths() -> None:
+    assert split_member_path("lib/ab.bundle#src/a.py") == ("lib/ab.bundle", "src/a.py")
+    assert split_member_path("src/a.py") is None
+    assert pending_remote_path("lib/", "src/a.py") == "lib/*.bundle#src/a.py"
+
+
+def test_editing_one_file_reshapes_one_bundle() -> None:
+    members = {f"src/mod{i}.py": (content_digest(str(i)), 100) for i in range(1000)}
+    before = partition(members, "lib", max_bytes=4000)
+
+    members["src/mod500.py"] = (content_digest("edited"), 120)
+    members["src/mod750.py.new"] = (content_digest("new"), 100)
+    after = partition(members, "lib", max_bytes=4000)
+
+    assert all(bundle.size <= 4000 for bundle in after)
+    changed = [b for b in after if b not in before]
+    assert 1 <= len(changed) <= 4
+    assert len(after) >= 1000 * 100 // 4000
@@ -0,0 +1,77 @@
+import json
+
+from cli import build_parser, run_command
+from curl_helper import TransportStats
+from pytest_mock import MockFixture
+from sync_state import File, FileResult, SyncManager, SyncPlan, UploadReport
+
+
+def make_plan() -> SyncPlan:
+    return SyncPlan(
+        uploads=[File("new.py", "a", "new.py", None, None)],
+        replacements=[File("changed.py", "b", "changed.py", "c", "1")],
+        deletions=[File("gone.py", None, "gone.py", "d", "2")],
+        synced=3,
+    )
+
+
+def test_status_prints_counts_as_json(mocker: MockFixture, capsys) -> None:
+    sync_manager = mocker.Mock(spec=SyncManager)
+    sync_manager.session = mocker.Mock(stats=TransportStats(requests=2))
+    sync_manager.compute_plan.return_value = make_plan()
+
+    args = build_parser().parse_args(["status", "--json"])
+    exit_code = run_command(args, sync_manager)
+
+    output = json.loads(capsys.readouterr().out)
+    assert exit_code == 0
+    assert output["counts"] == {
+        "synced": 3,
+        "modified": 1,
+        "local_only": 1,
+        "remote_only": 1,
+        "too_large": 0,
+    }
+    assert set(output["timings"]) == {"fetch", "plan"}
+    assert output["transport"]["requests"] == 2
+
+
+def test_push_runs_uploads_and_replacements(mocker: MockFixture, capsys) -> None:
+    plan = make_plan()
+    sync_manager = mocker.Mock(spec=SyncManager)
+    sync_manager.session = mocker.Mock(stats=TransportStats(requests=2))
+    sync_manager.compute_plan.return_value = plan
+    sync_manager.push_files.return_value = UploadReport(
+        results=[
+            FileResult(plan.uploads[0]),
+            FileResult(plan.replacements[0], error=Exception("HTTP Error 500")),
+        ]
+    )
+
+    args = build_parser().parse_args(["push", "--json", "--max-in-flight", "4"])
+    exit_code = run_command(args, sync_manager)
+
+    output = json.loads(capsys.readouterr().out)
+    sync_manager.push_files.assert_called_once_with(plan.pushes, 4)
+    assert exit_code == 1
+    assert [result["ok"] for result in output["results"]] == [True, False]
+
+
+def test_prune_is_a_dry_run_without_yes(mocker: MockFixture, capsys) -> None:
+    plan = make_plan()
+    sync_manager = mocker.Mock(spec=SyncManager)
+    sync_manager.session = mocker.Mock(stats=TransportStats(requests=1))
+    sync_manager.compute_plan.return_value = plan
+    sync_manager.delete_files.return_value = [FileResult(plan.deletions[0])]
+
+    exit_code = run_command(build_parser().parse_args(["prune"]), sync_manager)
+
+    assert exit_code == 0
+    sync_manager.delete_files.assert_not_called()
+    assert "delete   gone.py" in capsys.readouterr().out
+
+    args = build_parser().parse_args(["prune", "--yes", "--json"])
+    run_command(args, sync_manager)
+
+    sync_manager.delete_files.assert_called_once_with(plan.deletions, None)
+    assert json.loads(capsys.readouterr().out)["results"][0]["ok"]
@@ -0,0 +1,18 @@
+from content_store import ContentStore, content_digest
+
+
+def test_put_returns_digest_and_round_trips(tmp_path) -> None:
+    store = ContentStore(str(tmp_path))
+
+    digest = store.put("line one\r\nline two\n")
+
+    assert digest == content_digest("line one\r\nline two\n")
+    assert digest in store
+    assert store.get(digest) == "line one\r\nline two\n"
+
+
+def test_put_is_idempotent(tmp_path) -> None:
+    store = ContentStore(str(tmp_path))
+
+    assert store.put("same") == store.put("same")
+    assert len(list(tmp_path.rglob("*"))) == 2
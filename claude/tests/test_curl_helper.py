@@ -0,0 +1,161 @@
+import threading
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pycurl
+import pytest
+from curl_helper import (
+    AdaptiveLimiter,
+    CurlDelete,
+    CurlPost,
+    CurlSession,
+    HttpError,
+    RetryPolicy,
+    parse_retry_after,
+)
+from pytest_mock import MockFixture
+
+
+def test_session_reuses_released_handle() -> None:
+    session = CurlSession(pool_size=2, idle_timeout=60)
+
+    first = session.acquire()
+    session.release(first)
+    second = session.acquire()
+
+    assert second is first
+    session.release(second)
+    session.close()
+
+
+def test_session_drops_handles_past_idle_timeout(mocker: MockFixture) -> None:
+    session = CurlSession(pool_size=2, idle_timeout=5)
+    clock = mocker.patch("curl_helper.time.monotonic", return_value=100.0)
+
+    first = session.acquire()
+    session.release(first)
+    clock.return_value = 200.0
+    second = session.acquire()
+
+    assert second is not first
+    session.release(second)
+    session.close()
+
+
+def test_session_caps_idle_pool_size() -> None:
+    session = CurlSession(pool_size=1, idle_timeout=60)
+
+    handles = [session.acquire() for _ in range(3)]
+    for handle in handles:
+        session.release(handle)
+
+    assert len(session._idle) == 1
+    session.close()
+
+
+def test_requests_share_the_given_session() -> None:
+    session = CurlSession()
+
+    assert CurlDelete("123", session=session).session is session
+    session.close()
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    statuses: list[int] = []
+
+    def do_DELETE(self) -> None:
+        status = self.statuses.pop(0) if self.statuses else 200
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def flaky_server(monkeypatch) -> Iterator[type[FlakyHandler]]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("DOMAIN", f"http://127.0.0.1:{server.server_port}")
+    FlakyHandler.statuses = []
+    yield FlakyHandler
+    server.shutdown()
+    server.server_close()
+
+
+def test_perform_many_retries_throttled_and_transient_errors(flaky_server) -> None:
+    flaky_server.statuses = [429, 503]
+    session = CurlSession(retry=RetryPolicy(base_delay=0.01))
+
+    results = session.perform_many(
+        [CurlDelete(str(i), session=session) for i in range(3)], max_in_flight=1
+    )
+
+    assert all(result.ok for result in results)
+    assert sum(result.attempts for result in results) == 5
+    assert session.stats.requests == 5
+    assert session.stats.retries == 2
+    assert session.stats.throttled == 2
+    session.close()
+
+
+def test_perform_request_gives_up_after_max_attempts(flaky_server) -> None:
+    flaky_server.statuses = [500, 500, 500]
+    session = CurlSession(retry=RetryPolicy(max_attempts=2, base_delay=0.01))
+
+    with pytest.raises(HttpError) as excinfo:
+        CurlDelete("1", session=session).perform_request()
+
+    assert excinfo.value.status_code == 500
+    assert session.stats.failures == 1
+    assert flaky_server.statuses == [500]
+    session.close()
+
+
+def test_retry_policy_only_retries_safe_failures_for_posts() -> None:
+    policy = RetryPolicy(max_attempts=3, max_delay=10)
+    post = CurlPost("a.py", "", session=CurlSession())
+    delete = CurlDelete("1", session=post.session)
+    timeout = pycurl.error(pycurl.E_OPERATION_TIMEDOUT, "timed out")
+
+    assert policy.should_retry(delete, HttpError(502, ""), 1)
+    assert not policy.should_retry(post, HttpError(502, ""), 1)
+    assert policy.should_retry(post, HttpError(429, ""), 1)
+    assert policy.should_retry(delete, timeout, 1)
+    assert not policy.should_retry(post, timeout, 1)
+    assert not policy.should_retry(delete, HttpError(404, ""), 1)
+    assert not policy.should_retry(delete, HttpError(503, ""), 3)
+    assert not policy.should_retry(delete, HttpError(429, "", retry_after=60), 1)
+    assert policy.delay(1, HttpError(429, "", retry_after=2.5)) == 2.5
+    assert 0 <= policy.delay(3, HttpError(503, "")) <= 4
+
+
+def test_parse_retry_after_accepts_seconds_and_dates() -> None:
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_adaptive_limiter_halves_on_throttle_and_grows_on_success(
+    mocker: MockFixture,
+) -> None:
+    clock = mocker.patch("curl_helper.time.monotonic", return_value=100.0)
+    limiter = AdaptiveLimiter(limit=8, cooldown=1.0)
+
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.limit == 4
+
+    clock.return_value = 102.0
+    limiter.on_throttle()
+    assert limiter.limit == 2
+
+    for _ in range(4):
+        limiter.on_success()
+    assert limiter.limit == 3
@@ -0,0 +1,65 @@
+import difflib
+import random
+
+from diff_engine import DiffStatsCache, diff_lines, unified_diff
+
+
+def apply_opcodes(a: list[str], b: list[str], opcodes) -> list[str]:
+    result = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        result.extend(a[i1:i2] if tag == "equal" else b[j1:j2])
+    return result
+
+
+def test_diff_is_minimal_and_reconstructs_target() -> None:
+    rng = random.Random(7)
+    for _ in range(500):
+        a = [rng.choice("abcd") for _ in range(rng.randint(0, 12))]
+        b = [rng.choice("abcd") for _ in range(rng.randint(0, 12))]
+
+        diff = diff_lines(a, b)
+
+        assert apply_opcodes(a, b, diff.opcodes) == b
+        matched = sum(
+            block.size
+            for block in difflib.SequenceMatcher(
+                None, a, b, autojunk=False
+            ).get_matching_blocks()
+        )
+        assert diff.added + diff.removed <= len(a) + len(b) - 2 * matched
+
+
+def test_budget_exhaustion_falls_back_to_coarse_replace() -> None:
+    a = [f"old {i}" for i in range(50)]
+    b = [f"new {i}" for i in range(50)]
+
+    diff = diff_lines(["same"] + a, ["same"] + b, max_edits=10)
+
+    assert not diff.complete
+    assert diff.opcodes == [("equal", 0, 1, 0, 1), ("replace", 1, 51, 1, 51)]
+    assert (diff.added, diff.removed) == (50, 50)
+
+
+def test_unified_diff_matches_difflib_format() -> None:
+    a = [f"line {i}" for i in range(20)]
+    b = list(a)
+    b[2] = "changed"
+    b.insert(15, "inserted")
+
+    ours = list(unified_diff(a, b, diff_lines(a, b), "remote", "local"))
+    theirs = list(difflib.unified_diff(a, b, "remote", "local", lineterm=""))
+
+    assert ours == theirs
+
+
+def test_stats_cache_loads_bodies_once_per_digest_pair() -> None:
+    cache = DiffStatsCache()
+    loads = []
+
+    def load() -> tuple[str, str]:
+        loads.append(1)
+        return "a\nb\n", "a\nc\nd\n"
+
+    assert cache.get("r1", "l1", load) == (2, 1)
+    assert cache.get("r1", "l1", load) == (2, 1)
+    assert len(loads) == 1
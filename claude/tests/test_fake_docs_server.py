@@ -0,0 +1,61 @@
+import json
+
+import pytest
+from curl_helper import (
+    CurlDelete,
+    CurlGet,
+    CurlPost,
+    CurlSession,
+    HttpError,
+    RetryPolicy,
+)
+from fake_docs_server import FakeDocsServer
+
+
+@pytest.fixture
+def server(monkeypatch):
+    with FakeDocsServer() as server:
+        monkeypatch.setenv("DOMAIN", server.url)
+        monkeypatch.setenv("ORGANIZATION", "org")
+        monkeypatch.setenv("PROJECT", "project")
+        yield server
+
+
+def test_fake_server_lists_creates_and_deletes_docs(server) -> None:
+    session = CurlSession()
+    server.add_doc("org", "project", "a.py", "a = 1\n")
+    server.add_doc("other", "project", "b.py", "b = 1\n")
+
+    created = json.loads(CurlPost("c.py", "c = 1\n", session).perform_request())
+    get = CurlGet(session)
+    docs: list[dict] = []
+    get.stream_request(docs.append)
+
+    assert sorted(doc["file_name"] for doc in docs) == ["a.py", "c.py"]
+    CurlDelete(created["uuid"], session).perform_request()
+    assert [doc["file_name"] for doc in server.docs("org", "project").values()] == [
+        "a.py"
+    ]
+
+    get.etag = get.response_headers["etag"]
+    get.stream_request(docs.append)
+    assert get.status_code == 200
+    get.etag = get.response_headers["etag"]
+    get.stream_request(docs.append)
+    assert get.status_code == 304
+    assert server.requests == {"GET": 3, "POST": 1, "DELETE": 1}
+    session.close()
+
+
+def test_fake_server_injects_errors(server) -> None:
+    session = CurlSession(retry=RetryPolicy(base_delay=0))
+    server.fail_next(429)
+    server.fail_next(500, count=4)
+
+    with pytest.raises(HttpError) as excinfo:
+        CurlGet(session).perform_request()
+
+    assert excinfo.value.status_code == 500
+    assert session.stats.throttled == 1
+    assert server.requests["GET"] == session.retry.max_attempts
+    session.close()
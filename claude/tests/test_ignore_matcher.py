@@ -0,0 +1,27 @@
+from ignore_matcher import IgnoreMatcher
+
+
+def test_unanchored_pattern_matches_at_any_depth() -> None:
+    matcher = IgnoreMatcher(["*.log", "node_modules/"])
+
+    assert matcher.is_ignored("debug.log")
+    assert matcher.is_ignored("src/deep/debug.log")
+    assert matcher.is_ignored("web/node_modules", is_dir=True)
+    assert not matcher.is_ignored("node_modules")
+    assert not matcher.is_ignored("my_node_modules_notes", is_dir=True)
+
+
+def test_anchored_and_double_star_patterns() -> None:
+    matcher = IgnoreMatcher(["/build", "docs/**/*.md", "# comment", ""])
+
+    assert matcher.is_ignored("build", is_dir=True)
+    assert not matcher.is_ignored("src/build", is_dir=True)
+    assert matcher.is_ignored("docs/a/b/readme.md")
+    assert matcher.is_ignored("docs/readme.md")
+
+
+def test_negated_pattern_reincludes_path() -> None:
+    matcher = IgnoreMatcher(["*.ts", "!keep.ts"])
+
+    assert matcher.is_ignored("src/drop.ts")
+    assert not matcher.is_ignored("src/keep.ts")
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+from json_stream import JsonArrayStream
+
+
+def parse_in_chunks(data: bytes, size: int) -> list:
+    stream = JsonArrayStream()
+    items = []
+    for i in range(0, len(data), size):
+        items.extend(stream.feed(data[i : i + size]))
+    stream.close()
+    return items
+
+
+def test_items_survive_any_chunk_boundary() -> None:
+    docs = [
+        {"file_name": "a.py", "content": 'print("[{,}]")\n', "uuid": "1"},
+        {"file_name": "b.py", "content": 'escaped \\" quote ü', "uuid": "2"},
+        {"nested": [1, {"x": []}], "n": 3.5},
+    ]
+    data = json.dumps(docs).encode("utf-8")
+
+    for size in (1, 2, 3, 7, len(data)):
+        assert parse_in_chunks(data, size) == docs
+
+
+def test_empty_array() -> None:
+    assert parse_in_chunks(b" [ ] ", 1) == []
+
+
+def test_truncated_array_raises() -> None:
+    stream = JsonArrayStream()
+    list(stream.feed(b'[{"a": 1}, {"b"'))
+
+    with pytest.raises(ValueError):
+        stream.close()
+
+
+def test_non_array_raises() -> None:
+    with pytest.raises(ValueError):
+        list(JsonArrayStream().feed(b'{"a": 1}'))
@@ -0,0 +1,13 @@
+import pytest
+from line_endings import normalize_line_endings
+
+
+def test_policies() -> None:
+    content = "a\r\nb\rc\n\n"
+    assert normalize_line_endings(content, "exact") == content
+    assert normalize_line_endings(content, "lf") == "a\nb\nc\n\n"
+    assert normalize_line_endings(content, "lf-final-newline") == "a\nb\nc\n"
+    assert normalize_line_endings("a", "lf-final-newline") == "a\n"
+    assert normalize_line_endings("", "lf-final-newline") == ""
+    with pytest.raises(ValueError):
+        normalize_line_endings(content, "crlf")
@@ -0,0 +1,95 @@
+import os
+import time
+
+from content_store import content_digest
+from ignore_matcher import IgnoreMatcher
+import local_scan
+from local_scan import LocalScanner
+from scan_cache import ScanCache
+
+
+def make_scanner(tmp_path, workers: int = 4) -> LocalScanner:
+    return LocalScanner(
+        str(tmp_path / "tree"),
+        IgnoreMatcher([]),
+        ScanCache(str(tmp_path / "scan.db")),
+        extensions=(".py",),
+        workers=workers,
+    )
+
+
+def test_scan_hashes_in_parallel_then_reuses_cache(tmp_path) -> None:
+    tree = tmp_path / "tree"
+    (tree / "pkg").mkdir(parents=True)
+    old = time.time_ns() - 10_000_000_000
+    for i in range(20):
+        path = tree / "pkg" / f"mod{i}.py"
+        path.write_text(f"x = {i}\n")
+        os.utime(path, ns=(old, old))
+    (tree / "notes.txt").write_text("skipped")
+
+    scanner = make_scanner(tmp_path)
+    results = dict(scanner.scan())
+
+    assert len(results) == 20
+    assert results["pkg/mod3.py"] == content_digest("x = 3\n")
+    assert scanner.stats.files == 20
+    assert scanner.stats.hashed == 20
+    assert scanner.stats.bytes_read > 0
+
+    rescanner = make_scanner(tmp_path, workers=1)
+    assert dict(rescanner.scan()) == results
+    assert rescanner.stats.hashed == 0
+
+
+def test_hashing_matches_text_reads_and_skips_large_files(
+    tmp_path, monkeypatch
+) -> None:
+    monkeypatch.setattr(local_scan, "MMAP_THRESHOLD", 64)
+    tree = tmp_path / "tree"
+    tree.mkdir()
+    (tree / "small.py").write_bytes(b"x = 1\r\n")
+    (tree / "mapped.py").write_bytes(b"y = 2\n" * 20)
+    (tree / "mapped_crlf.py").write_bytes(b"z = 3\r\n" * 20)
+    (tree / "huge.py").write_bytes(b"#" * 1000)
+
+    scanner = make_scanner(tmp_path)
+    scanner.max_file_bytes = 500
+    results = dict(scanner.scan())
+
+    assert results == {
+        "small.py": content_digest("x = 1\n"),
+        "mapped.py": content_digest("y = 2\n" * 20),
+        "mapped_crlf.py": content_digest("z = 3\n" * 20),
+    }
+    assert local_scan.hash_file(str(tree / "mapped.py"))[1] == 120
+    assert scanner.stats.too_large == ["huge.py"]
+
+
+def test_hashing_normalises_crlf_across_chunks_without_decoding(
+    tmp_path, monkeypatch
+) -> None:
+    monkeypatch.setattr(local_scan, "MMAP_THRESHOLD", 64)
+    monkeypatch.setattr(local_scan, "HASH_CHUNK", 8)
+    tree = tmp_path / "tree"
+    tree.mkdir()
+    # "\r\n" straddles the 8-byte chunk boundary; "\r\r\n" is two newlines.
+    (tree / "split.py").write_bytes(b"abcdefg\r\nxy\r\r\nz\r" + b"w\r\n" * 20)
+    (tree / "binary.py").write_bytes(b"a\r\n\xff\xfe\n")
+    (tree / "gone.py").write_text("x")
+    hash_file = local_scan.hash_file
+
+    def flaky_hash_file(path: str) -> tuple[str, int]:
+        if path.endswith("gone.py"):
+            raise FileNotFoundError(path)
+        return hash_file(path)
+
+    monkeypatch.setattr(local_scan, "hash_file", flaky_hash_file)
+    scanner = make_scanner(tmp_path)
+    results = dict(scanner.scan())
+
+    assert results == {
+        "split.py": content_digest("abcdefg\nxy\n\nz\n" + "w\n" * 20),
+        "binary.py": content_digest(b"a\n\xff\xfe\n"),
+    }
+    assert scanner.stats.unreadable == ["gone.py"]
@@ -0,0 +1,119 @@
+import json
+import os
+import stat
+
+import pytest
+from manifest import Manifest
+
+
+def test_longest_directory_match_wins() -> None:
+    manifest = Manifest([], [])
+    manifest.add_directory_match_rule("src/", "app/")
+    manifest.add_directory_match_rule("src/components/", "ui/")
+
+    assert manifest.infer_remote_path("src/components/Header.tsx") == "ui/Header.tsx"
+    assert manifest.infer_remote_path("src/index.ts") == "app/index.ts"
+    assert manifest.infer_remote_path("README.md") == "README.md"
+    assert manifest.infer_local_path("ui/Header.tsx") == "src/components/Header.tsx"
+    assert manifest.infer_local_path("app/index.ts") == "src/index.ts"
+
+
+def test_rule_changes_rebuild_the_index() -> None:
+    manifest = Manifest([], [])
+    manifest.add_directory_match_rule("src/", "app/")
+    assert manifest.infer_remote_path("src/a.py") == "app/a.py"
+
+    manifest.remove_directory_match_rule("src/", "app/")
+    assert manifest.infer_remote_path("src/a.py") == "src/a.py"
+    assert manifest.rules == []
+
+
+def test_save_excludes_compiled_index(tmp_path) -> None:
+    manifest = Manifest([], [])
+    manifest.add_directory_match_rule("src/", "app/")
+    manifest.infer_remote_path("src/a.py")
+
+    manifest.save_to_file(str(tmp_path / "manifest.json"))
+
+    data = json.loads((tmp_path / "manifest.json").read_text())
+    assert set(data) == {"files", "rules", "ignore"}
+
+
+def test_bundle_rules_take_files_under_their_source() -> None:
+    manifest = Manifest([], [])
+    manifest.add_directory_match_rule("src/", "app/")
+    manifest.add_bundle_rule("src/generated", "app/generated", max_bytes=1024)
+
+    assert manifest.bundle_rule_for("src/generated/a.py")["max_bytes"] == 1024
+    assert manifest.bundle_rule_for("src/generated2/a.py") is None
+    assert (
+        manifest.infer_remote_path("src/generated/a.py")
+        == "app/generated/*.bundle#src/generated/a.py"
+    )
+    assert manifest.infer_remote_path("src/a.py") == "app/a.py"
+    assert manifest.get_directory_match_rules() == [
+        {"type": "directory_match", "source": "src/", "target": "app/"}
+    ]
+
+    manifest.remove_bundle_rule("src/generated")
+    assert manifest.infer_remote_path("src/generated/a.py") == "app/generated/a.py"
+
+
+def test_extensions_come_from_the_manifest(tmp_path) -> None:
+    path = str(tmp_path / "manifest.json")
+    Manifest([], []).save_to_file(path)
+    assert Manifest.load_from_file(path).local_extensions == (
+        ".js",
+        ".ts",
+        ".tsx",
+        ".py",
+        ".yml",
+    )
+
+    Manifest([], [], extensions=[".md"]).save_to_file(path)
+    assert Manifest.load_from_file(path).local_extensions == (".md",)
+
+
+def test_saves_and_uploads_only_when_the_data_changes(tmp_path) -> None:
+    path = tmp_path / "manifest.json"
+    path.write_text(
+        '{"files": [{"path": "b.py", "status": "x"}, {"path": "a.py", "status": "y"}],'
+        ' "rules": [], "ignore": []}'
+    )
+    manifest = Manifest.load_from_file(str(path))
+    assert [f["path"] for f in manifest.sorted_files()] == ["a.py", "b.py"]
+    assert not manifest.dirty
+    assert not manifest.save_to_file(str(path))
+    digest = manifest.digest()
+
+    manifest.add_directory_match_rule("src/", "app/")
+    manifest.add_directory_match_rule("src/", "app/")
+    assert len(manifest.rules) == 1 and manifest.dirty
+    manifest.remove_directory_match_rule("src/", "app/")
+    # Changed and changed back: nothing to write.
+    assert manifest.digest() == digest
+    assert not manifest.save_to_file(str(path))
+    assert not manifest.dirty
+
+    os.chmod(path, 0o644)
+    with pytest.raises(TypeError):
+        manifest.files["c.py"] = {"path": "c.py", "status": "z"}
+    manifest.set_file("c.py", "z")
+    assert manifest.dirty
+    assert [f["path"] for f in manifest.sorted_files()] == ["a.py", "b.py", "c.py"]
+    assert manifest.save_to_file(str(path))
+    assert not manifest.dirty
+    assert os.listdir(tmp_path) == ["manifest.json"]
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+    manifest.add_ignore_pattern("*.log")
+    assert manifest.save_to_file(str(path))
+    manifest.set_extensions([".md"])
+    manifest.set_extensions((".md",))
+    manifest.remove_file("a.py")
+    assert manifest.save_to_file(str(path))
+    reloaded = Manifest.load_from_file(str(path))
+    assert reloaded.files["c.py"] == {"path": "c.py", "status": "z"}
+    assert reloaded.ignore == ("*.log",)
+    assert reloaded.local_extensions == (".md",)
+    assert "a.py" not in reloaded.files
+    assert reloaded.digest() == manifest.digest()
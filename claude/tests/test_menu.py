@@ -1,4 +1,4 @@
-from menu import Menu, MenuAction, MenuOption, TaskMenu
+from menu import CachedMenu, Menu, MenuAction, MenuOption, TaskMenu, filter_items
 from pytest_mock import MockFixture
 from sync_state import File, SyncManager
 from view_file_diff_menu import OverwriteRemote, ViewFileDiffMenu, ViewFileDiffOption
@@ -56,8 +56,7 @@ def test_overwrite_remote(mocker: MockFixture) -> None:
     result = overwrite_option.run()
 
     assert result == MenuAction.TASK_COMPLETE
-    sync_manager.delete_file.assert_called_once_with(file)
-    sync_manager.upload_file.assert_called_once_with(file)
+    sync_manager.overwrite_file.assert_called_once_with(file)
 
 
 def test_view_file_diff_option(mocker: MockFixture) -> None:
@@ -87,7 +86,8 @@ def test_view_file_diff_menu(mocker: MockFixture) -> None:
 
     sync_manager.state = mocker.Mock()
     sync_manager.state.files = mocker.Mock()
-    sync_manager.state.files.values.return_value = [file1, file2]
+    sync_manager.state.files.unsynced.return_value = [file1, file2]
+    sync_manager.state.files.in_status.return_value = [file1, file2]
 
     view_diff_menu = ViewFileDiffMenu(sync_manager)
 
@@ -95,7 +95,7 @@ def test_view_file_diff_menu(mocker: MockFixture) -> None:
     result = view_diff_menu.run()
 
     assert result == MenuAction.BACK
-    assert sync_manager.state.files.values.call_count == 1
+    assert sync_manager.state.files.unsynced.call_count == 1
 
 
 def test_menu_exit(mocker: MockFixture) -> None:
@@ -119,3 +119,63 @@ def test_invalid_input_handling(mocker: MockFixture) -> None:
     assert result == MenuAction.BACK
     mock_print.assert_any_call("Invalid input. Please enter a number.")
     mock_print.assert_any_call("Invalid choice. Please try again.")
+
+
+def test_menu_pages_long_option_lists(mocker: MockFixture) -> None:
+    menu = TestMenu("Long Menu")
+    options = [TestMenuOption(f"file{i}.py", MenuAction.EXIT) for i in range(45)]
+    for option in options:
+        menu.add_option(option)
+
+    mocker.patch("builtins.input", side_effect=["n", "n", "n", "45"])
+    mock_print = mocker.patch("builtins.print")
+    result = menu.run()
+
+    assert result == MenuAction.EXIT
+    printed = [call.args[0] for call in mock_print.call_args_list if call.args]
+    assert "21. file20.py" in printed
+    assert "45. file44.py" in printed
+    assert sum(1 for line in printed if line.startswith("1. ")) == 1
+
+
+def test_menu_filter_selects_from_filtered_list(mocker: MockFixture) -> None:
+    menu = TestMenu("Filtered Menu")
+    menu.add_option(TestMenuOption("src/app.py", MenuAction.CONTINUE))
+    menu.add_option(TestMenuOption("src/header.tsx", MenuAction.EXIT))
+
+    mocker.patch("builtins.input", side_effect=["/hdr", "1"])
+    mocker.patch("builtins.print")
+    result = menu.run()
+
+    assert result == MenuAction.EXIT
+
+
+def test_filter_items_ranks_substring_before_fuzzy() -> None:
+    items = ["src/hd_render.py", "src/header.tsx", "README.md"]
+
+    assert filter_items(items, "header", key=str) == ["src/header.tsx"]
+    assert filter_items(items, "hdr", key=str) == ["src/hd_render.py", "src/header.tsx"]
+    assert filter_items(items, "", key=str) == items
+
+
+def test_cached_menu_rebuilds_only_when_key_changes() -> None:
+    class CountingMenu(CachedMenu):
+        def __init__(self) -> None:
+            super().__init__("Counting Menu")
+            self.version = 0
+            self.builds = 0
+
+        def cache_key(self) -> object:
+            return self.version
+
+        def build_options(self) -> None:
+            self.builds += 1
+
+    menu = CountingMenu()
+    menu.update_options()
+    menu.update_options()
+    assert menu.builds == 1
+
+    menu.version += 1
+    menu.update_options()
+    assert menu.builds == 2
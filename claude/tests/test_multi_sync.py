@@ -0,0 +1,66 @@
+import json
+
+import pytest
+from cli import build_parser, run_multi_command
+from fake_docs_server import FakeDocsServer
+from multi_sync import MultiProjectSync
+from projects import ProjectConfig, load_projects
+
+
+def test_load_projects_rejects_bad_entries(tmp_path) -> None:
+    path = tmp_path / "projects.json"
+    path.write_text(
+        json.dumps({"projects": [{"name": "a", "project": "p1", "manifest": "a.json"}]})
+    )
+    assert load_projects(str(path)) == [ProjectConfig("a", "p1", manifest="a.json")]
+
+    path.write_text(json.dumps({"projects": [{"name": "a"}]}))
+    with pytest.raises(ValueError):
+        load_projects(str(path))
+    path.write_text(json.dumps({"projects": [{"name": "a", "project": "1"}] * 2}))
+    with pytest.raises(ValueError, match="Duplicate"):
+        load_projects(str(path))
+
+
+def test_projects_sync_concurrently_with_separate_state(
+    tmp_path, monkeypatch, capsys
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.json").write_text('{"files": [], "rules": [], "ignore": ["b.py"]}')
+    (tmp_path / "b.json").write_text('{"files": [], "rules": []}')
+    (tmp_path / "a.py").write_text("a = 1\n")
+    (tmp_path / "b.py").write_text("b = 1\n")
+
+    with FakeDocsServer(latency=0.2) as server:
+        monkeypatch.setenv("DOMAIN", server.url)
+        monkeypatch.setenv("ORGANIZATION", "org")
+        server.add_doc("org", "first", "a.py", "a = 1\n")
+        server.add_doc("other-org", "second", "remote.py", "r = 1\n")
+        multi = MultiProjectSync(
+            [
+                ProjectConfig("first", "first", manifest="a.json"),
+                ProjectConfig("second", "second", "other-org", "b.json"),
+            ]
+        )
+
+        args = build_parser().parse_args(["--projects", "x", "status", "--json"])
+        exit_code = run_multi_command(args, multi)
+        multi.save_snapshots()
+        multi.close()
+
+    output = json.loads(capsys.readouterr().out)
+    assert exit_code == 0
+    first, second = output["projects"]
+    assert first["counts"] == {
+        "synced": 1,
+        "modified": 0,
+        "local_only": 0,
+        "remote_only": 0,
+        "too_large": 0,
+    }
+    assert second["counts"]["remote_only"] == 1
+    assert second["counts"]["local_only"] == 2
+    # Both listings were fetched at the same time, not one after the other.
+    assert output["elapsed"] < first["elapsed"] + second["elapsed"]
+    assert multi.managers[0].session is multi.managers[1].session
+    assert (tmp_path / ".syncer-cache" / "projects" / "second" / "state.json").exists()
@@ -0,0 +1,83 @@
+import json
+import threading
+
+from profiling import Profiler
+
+
+def test_disabled_profiler_records_nothing() -> None:
+    profiler = Profiler()
+
+    with profiler.operation("fetch"), profiler.span("walk"):
+        profiler.count("files", 3)
+
+    assert profiler.operations == []
+
+
+def test_operation_records_nested_spans_and_counters(tmp_path, capsys) -> None:
+    profiler = Profiler()
+    profiler.enable(capture=True)
+
+    @profiler.timed("infer_path")
+    def infer_path(path: str) -> str:
+        return path.upper()
+
+    @profiler.operation("fetch_and_compare")
+    def fetch_and_compare() -> None:
+        with profiler.span("fetch_remote_files"):
+            for path in ("a", "b", "c"):
+                infer_path(path)
+                profiler.count("remote_docs")
+        with profiler.operation("nested"):
+            profiler.count("local_files", 2)
+
+    fetch_and_compare()
+
+    [record] = profiler.operations
+    spans = {span["path"]: span["count"] for span in record["spans"]}
+    assert spans == {
+        "fetch_and_compare": 1,
+        "fetch_and_compare/fetch_remote_files": 1,
+        "fetch_and_compare/fetch_remote_files/infer_path": 3,
+        "fetch_and_compare/nested": 1,
+    }
+    assert record["counters"] == {"remote_docs": 3, "local_files": 2}
+    assert record["memory"]["peak_bytes"] > 0
+    assert "Profile: fetch_and_compare" in capsys.readouterr().out
+
+    profiler.dump(str(tmp_path / "profile.json"))
+    dumped = json.loads((tmp_path / "profile.json").read_text())
+    assert dumped["operations"][0]["operation"] == "fetch_and_compare"
+
+
+def test_operations_on_other_threads_keep_their_own_spans(capsys) -> None:
+    profiler = Profiler()
+    profiler.enable(capture=False)
+    started = threading.Event()
+    release = threading.Event()
+
+    def background() -> None:
+        with profiler.operation("background_refresh"):
+            with profiler.span("fetch_remote_files"):
+                profiler.count("remote_docs", 5)
+                started.set()
+                release.wait()
+
+    thread = threading.Thread(target=background)
+    thread.start()
+    started.wait()
+    with profiler.operation("push_files"), profiler.span("http batch"):
+        profiler.count("uploads")
+    release.set()
+    thread.join()
+
+    records = {record["operation"]: record for record in profiler.operations}
+    assert [span["path"] for span in records["push_files"]["spans"]] == [
+        "push_files",
+        "push_files/http batch",
+    ]
+    assert records["push_files"]["counters"] == {"uploads": 1}
+    assert [span["path"] for span in records["background_refresh"]["spans"]] == [
+        "background_refresh",
+        "background_refresh/fetch_remote_files",
+    ]
+    assert records["background_refresh"]["counters"] == {"remote_docs": 5}
@@ -0,0 +1,51 @@
+import os
+import time
+
+from scan_cache import ScanCache
+
+
+def test_lookup_reuses_digest_for_unchanged_file(tmp_path) -> None:
+    path = tmp_path / "file.py"
+    path.write_text("print('hi')")
+    old = time.time_ns() - 10_000_000_000
+    os.utime(path, ns=(old, old))
+
+    cache = ScanCache(str(tmp_path / "scan.db"))
+    cache.load()
+    cache.record("file.py", os.stat(path), "abc")
+    cache.save({"file.py"})
+
+    reloaded = ScanCache(str(tmp_path / "scan.db"))
+    reloaded.load()
+    assert reloaded.lookup("file.py", os.stat(path)) == "abc"
+
+    path.write_text("print('changed')")
+    assert reloaded.lookup("file.py", os.stat(path)) is None
+
+
+def test_recently_modified_file_is_not_cached(tmp_path) -> None:
+    path = tmp_path / "file.py"
+    path.write_text("print('hi')")
+
+    cache = ScanCache(str(tmp_path / "scan.db"))
+    cache.load()
+    cache.record("file.py", os.stat(path), "abc")
+
+    assert cache.lookup("file.py", os.stat(path)) is None
+
+
+def test_save_drops_paths_not_seen(tmp_path) -> None:
+    path = tmp_path / "file.py"
+    path.write_text("print('hi')")
+    old = time.time_ns() - 10_000_000_000
+    os.utime(path, ns=(old, old))
+
+    cache = ScanCache(str(tmp_path / "scan.db"))
+    cache.load()
+    cache.record("file.py", os.stat(path), "abc")
+    cache.save({"file.py"})
+    cache.save(set())
+
+    reloaded = ScanCache(str(tmp_path / "scan.db"))
+    reloaded.load()
+    assert reloaded.entries == {}
@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+
+# Generous enough for a cold CI runner, far below what eager imports cost.
+STARTUP_BUDGET = 1.0
+SYNCER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import builtins, json, sys, time
+start = time.perf_counter()
+builtins.input = lambda prompt="": "0"
+import syncer
+{call}
+print(json.dumps({{
+    "elapsed": time.perf_counter() - start,
+    "modules": sorted(name for name in ("pycurl", "dotenv", "file_list_menu",
+        "diff_engine", "watcher", "cProfile", "sync_state") if name in sys.modules),
+}}))
+"""
+
+
+def run_probe(call: str, cwd) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(call=call)],
+        cwd=cwd,
+        env={**os.environ, "PYTHONPATH": SYNCER_DIR},
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def test_help_does_not_import_the_sync_machinery(tmp_path) -> None:
+    result = run_probe(
+        "try:\n    syncer.main(['--help'])\nexcept SystemExit:\n    pass", tmp_path
+    )
+
+    assert result["modules"] == []
+    assert result["elapsed"] < STARTUP_BUDGET
+
+
+def test_first_menu_renders_without_transport_or_manifest(tmp_path) -> None:
+    # No manifest.json and no snapshot: the first screen must still render.
+    result = run_probe("syncer.main([])", tmp_path)
+
+    assert result["modules"] == ["dotenv", "sync_state"]
+    assert result["elapsed"] < STARTUP_BUDGET
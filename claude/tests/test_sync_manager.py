@@ -1,35 +1,48 @@
+import json
+
+from curl_helper import CurlResult
+from fake_docs_server import FakeDocsServer
 from manifest import Manifest
 from pytest_mock import MockFixture
-from sync_state import File, SyncManager, SyncState
+from sync_state import File, FileIndex, FileStatus, SyncManager, SyncState
 
 
-def test_get_local_files(mocker: MockFixture) -> None:
+def test_get_local_files(mocker: MockFixture, tmp_path, monkeypatch) -> None:
     mock_manifest = mocker.Mock(spec=Manifest)
     mock_manifest.files = []
     mock_manifest.rules = []
+    mock_manifest.ignore = ["*.generated.ts"]
+    mock_manifest.local_extensions = (".js", ".ts", ".tsx", ".py", ".yml")
     mocker.patch("manifest.Manifest.load_from_file", return_value=mock_manifest)
 
     mock_state = mocker.Mock(spec=SyncState)
     mock_state.manifest = mock_manifest
     mock_state.files = {}
+    mock_state.stale = False
     mocker.patch("sync_state.SyncState", return_value=mock_state)
 
-    sync_manager = SyncManager()
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "file1.py").write_text("file content")
+    (tmp_path / "file2.js").write_text("file content")
+    (tmp_path / "subdir").mkdir()
+    (tmp_path / "subdir" / "file3.ts").write_text("file content")
+    (tmp_path / "subdir" / "api.generated.ts").write_text("file content")
+    (tmp_path / "node_modules" / "pkg").mkdir(parents=True)
+    (tmp_path / "node_modules" / "pkg" / "index.js").write_text("file content")
+    (tmp_path / "rebuild").mkdir()
+    (tmp_path / "rebuild" / "file4.py").write_text("file content")
+    (tmp_path / "dist").mkdir()
+    (tmp_path / "dist" / "bundle.js").write_text("file content")
+    (tmp_path / ".gitignore").write_text("dist/\n")
 
-    mocker.patch(
-        "os.walk",
-        return_value=[
-            (".", [], ["file1.py", "file2.js"]),
-            ("./subdir", [], ["file3.ts"]),
-        ],
-    )
-    mocker.patch("builtins.open", mocker.mock_open(read_data="file content"))
+    sync_manager = SyncManager()
 
     sync_manager.get_local_files()
 
-    assert len(sync_manager.state.files) == 3
+    assert len(sync_manager.state.files) == 4
     assert "file1.py" in sync_manager.state.files
     assert "subdir/file3.ts" in sync_manager.state.files
+    assert "rebuild/file4.py" in sync_manager.state.files
 
 
 def test_fetch_remote_files(mocker: MockFixture) -> None:
@@ -41,6 +54,7 @@ def test_fetch_remote_files(mocker: MockFixture) -> None:
     mock_state = mocker.Mock(spec=SyncState)
     mock_state.manifest = mock_manifest
     mock_state.files = {}
+    mock_state.stale = False
     mocker.patch("sync_state.SyncState", return_value=mock_state)
 
     sync_manager = SyncManager()
@@ -66,6 +80,7 @@ def test_upload_file(mocker: MockFixture) -> None:
     mock_state = mocker.Mock(spec=SyncState)
     mock_state.manifest = mock_manifest
     mock_state.files = {}
+    mock_state.stale = False
     mocker.patch("sync_state.SyncState", return_value=mock_state)
 
     sync_manager = SyncManager()
@@ -94,6 +109,7 @@ def test_remove_file(mocker: MockFixture) -> None:
     mock_state = mocker.Mock(spec=SyncState)
     mock_state.manifest = mock_manifest
     mock_state.files = {}
+    mock_state.stale = False
     mocker.patch("sync_state.SyncState", return_value=mock_state)
 
     sync_manager = SyncManager()
@@ -163,3 +179,571 @@ def test_sync_files(mocker: MockFixture) -> None:
 
     sync_manager.upload_file.assert_called_once()
     sync_manager.delete_file.assert_called_once()
+
+
+def test_upload_files(mocker: MockFixture) -> None:
+    mock_manifest = mocker.Mock(spec=Manifest)
+    mock_manifest.files = []
+    mock_manifest.rules = []
+    mocker.patch("manifest.Manifest.load_from_file", return_value=mock_manifest)
+
+    mock_state = mocker.Mock(spec=SyncState)
+    mock_state.manifest = mock_manifest
+    mock_state.files = {}
+    mock_state.stale = False
+    mocker.patch("sync_state.SyncState", return_value=mock_state)
+
+    sync_manager = SyncManager()
+
+    file1 = mocker.Mock(spec=File)
+    file1.local_path = "file1.py"
+    file1.remote_path = "file1.py"
+    file2 = mocker.Mock(spec=File)
+    file2.local_path = "file2.py"
+    file2.remote_path = "file2.py"
+
+    mocker.patch("builtins.open", mocker.mock_open(read_data="content"))
+    mock_curl_post = mocker.patch("sync_state.CurlPost")
+    mock_perform_many = mocker.patch.object(
+        sync_manager.session,
+        "perform_many",
+        return_value=[
+            CurlResult(mocker.Mock()),
+            CurlResult(mocker.Mock(), error=Exception("HTTP Error 500")),
+        ],
+    )
+
+    report = sync_manager.upload_files([file1, file2], max_in_flight=4)
+
+    assert mock_curl_post.call_count == 2
+    assert mock_perform_many.call_args.args[1] == 4
+    assert [result.file for result in report.succeeded] == [file1]
+    assert [result.file for result in report.failed] == [file2]
+    assert report.bytes_sent == len("content")
+
+
+def test_push_files_retries_upload_before_delete(mocker: MockFixture) -> None:
+    mock_manifest = mocker.Mock(spec=Manifest)
+    mock_manifest.files = []
+    mock_manifest.rules = []
+    mocker.patch("manifest.Manifest.load_from_file", return_value=mock_manifest)
+
+    mock_state = mocker.Mock(spec=SyncState)
+    mock_state.manifest = mock_manifest
+    mock_state.files = {}
+    mock_state.stale = False
+    mocker.patch("sync_state.SyncState", return_value=mock_state)
+
+    sync_manager = SyncManager()
+
+    file = File("file1.py", "local-digest", "file1.py", "remote-digest", "123")
+    mock_state.files["file1.py"] = file
+
+    mocker.patch("builtins.open", mocker.mock_open(read_data="local"))
+    mocker.patch("sync_state.CurlDelete")
+    mocker.patch("sync_state.CurlPost")
+    mock_perform_many = mocker.patch.object(
+        sync_manager.session,
+        "perform_many",
+        side_effect=[
+            [CurlResult(mocker.Mock(), error=Exception("HTTP Error 503"))],
+            [CurlResult(mocker.Mock())],
+            [CurlResult(mocker.Mock())],
+        ],
+    )
+
+    report = sync_manager.push_files([file], upload_retries=2)
+
+    assert mock_perform_many.call_count == 3
+    assert report.failed == []
+    result = report.results[0]
+    assert result.deleted and result.uploaded
+    assert result.attempts == 2
+    assert sync_manager.state.files["file1.py"].remote_uuid is None
+
+
+def test_fetch_remote_files_uses_etag_cache(
+    mocker: MockFixture, tmp_path, monkeypatch
+) -> None:
+    manifest = Manifest([], [])
+    mocker.patch("manifest.Manifest.load_from_file", return_value=manifest)
+
+    mock_state = mocker.Mock(spec=SyncState)
+    mock_state.manifest = manifest
+    mock_state.files = {}
+    mock_state.stale = False
+    mocker.patch("sync_state.SyncState", return_value=mock_state)
+
+    monkeypatch.chdir(tmp_path)
+    sync_manager = SyncManager()
+    curl_get = mocker.patch.object(sync_manager, "curl_get")
+    curl_get._get_base_url.return_value = "https://example.com/docs"
+    curl_get.status_code = 200
+    curl_get.response_headers = {"etag": '"v1"'}
+    curl_get.stream_request.side_effect = lambda on_doc: on_doc(
+        {"file_name": "remote_file.py", "content": "remote content", "uuid": "123"}
+    )
+
+    first = sync_manager.fetch_remote_files()
+
+    assert sync_manager.state.files["remote_file.py"].remote_uuid == "123"
+
+    curl_get.status_code = 304
+    curl_get.stream_request.side_effect = None
+    second = sync_manager.fetch_remote_files()
+
+    assert curl_get.etag == '"v1"'
+    assert second == first
+    assert sync_manager.store.get(first[0]["digest"]) == "remote content"
+
+
+def test_file_index_version_tracks_mutations() -> None:
+    files = FileIndex()
+    file = File("a.py", "digest", "a.py", None, None)
+
+    files["a.py"] = file
+    files.pop("missing", None)
+    assert files.version == 1
+
+    files.pop("a.py")
+    files.update({"a.py": file})
+    files.clear()
+    assert files.version == 4
+
+
+def test_file_index_update_changes_a_file_and_reindexes_it() -> None:
+    files = FileIndex()
+    files["a.py"] = File("a.py", "x", "a.py", None, None)
+    file = files["a.py"]
+    version = files.version
+
+    files.update("a.py", remote_digest="x", remote_uuid="1")
+
+    assert files["a.py"] is file and file.remote_uuid == "1"
+    assert files.in_status(FileStatus.SYNCED) == [file]
+    assert files.in_status(FileStatus.LOCAL_ONLY) == []
+    assert files.version > version
+
+
+def test_file_index_keeps_status_buckets_and_sorted_view() -> None:
+    files = FileIndex()
+    files["b.py"] = File("b.py", "same", "b.py", "same", "1")
+    files["a.py"] = File("a.py", "local", "a.py", None, None)
+    files["c.py"] = File("c.py", None, "c.py", "remote", "2")
+
+    assert [file.local_path for file in files.sorted_files()] == [
+        "a.py",
+        "b.py",
+        "c.py",
+    ]
+    assert [file.local_path for file in files.unsynced()] == ["a.py", "c.py"]
+
+    moved = files["b.py"]
+    moved.local_digest = "edited"
+    files["b.py"] = moved
+    files.pop("c.py")
+
+    assert files.counts() == {
+        FileStatus.SYNCED: 0,
+        FileStatus.MODIFIED: 1,
+        FileStatus.LOCAL_ONLY: 1,
+        FileStatus.REMOTE_ONLY: 0,
+        FileStatus.TOO_LARGE: 0,
+    }
+    assert [file.local_path for file in files.sorted_files()] == ["a.py", "b.py"]
+
+
+def test_sync_paths_pushes_changed_files_and_records_uuid(
+    mocker: MockFixture, tmp_path, monkeypatch
+) -> None:
+    manifest = Manifest([], [])
+    mocker.patch("manifest.Manifest.load_from_file", return_value=manifest)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "file1.py").write_text("edited")
+    (tmp_path / "notes.txt").write_text("ignored")
+
+    sync_manager = SyncManager()
+    sync_manager.add_file("file1.py", "old-digest", "file1.py", "old-digest", "123")
+
+    mocker.patch("sync_state.CurlDelete")
+    mocker.patch("sync_state.CurlPost")
+    mocker.patch.object(
+        sync_manager.session,
+        "perform_many",
+        side_effect=[
+            [CurlResult(mocker.Mock(), response='{"uuid": "456"}')],
+            [CurlResult(mocker.Mock())],
+        ],
+    )
+
+    report = sync_manager._sync_paths({"file1.py", "notes.txt", "gone.py"})
+
+    assert [result.file.local_path for result in report.results] == ["file1.py"]
+    file = sync_manager.state.files["file1.py"]
+    assert file.remote_uuid == "456"
+    assert file.status == FileStatus.SYNCED
+    assert file.remote_contents == "edited"
+    assert sync_manager._sync_paths({"file1.py"}) is None
+
+
+def test_snapshot_gives_stale_state_until_background_refresh(
+    tmp_path, monkeypatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "manifest.json").write_text('{"files": [], "rules": []}')
+    (tmp_path / "a.py").write_text("local")
+
+    with FakeDocsServer() as server:
+        monkeypatch.setenv("DOMAIN", server.url)
+        monkeypatch.setenv("ORGANIZATION", "org")
+        monkeypatch.setenv("PROJECT", "project")
+        server.add_doc("org", "project", "a.py", "remote")
+
+        first = SyncManager()
+        first.fetch_and_compare()
+        first.save_snapshot()
+        server.add_doc("org", "project", "b.py", "new")
+
+        second = SyncManager()
+        assert second.snapshot.load("http://elsewhere") is None
+        assert second.load_snapshot()
+        version = second.state.version
+        assert second.state.stale and second.state.marker == " [stale]"
+        assert second.state.files["a.py"].status == FileStatus.MODIFIED
+        assert "b.py" not in second.state.files
+        scan_cache, remote_cache = second.scan_cache, second.remote_cache
+
+        second.refresh_in_background().join()
+
+    assert not second.state.stale and second.state.marker == ""
+    # The refresh worked on caches of its own and handed them over afterwards.
+    assert second.scan_cache is not scan_cache
+    assert len(second.remote_cache.docs) == 2 and remote_cache.docs == []
+    assert second.state.files["b.py"].status == FileStatus.REMOTE_ONLY
+    assert second.state.version > version
+
+
+def test_bundle_rule_uploads_only_changed_bundles(tmp_path, monkeypatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    manifest = Manifest([], [])
+    manifest.add_bundle_rule("src", "lib", max_bytes=8000)
+    manifest.save_to_file()
+    (tmp_path / "src").mkdir()
+    for i in range(200):
+        (tmp_path / "src" / f"mod{i}.py").write_text(f"value = {i}\n" * 5)
+    (tmp_path / "main.py").write_text("main = 1\n")
+
+    with FakeDocsServer() as server:
+        monkeypatch.setenv("DOMAIN", server.url)
+        monkeypatch.setenv("ORGANIZATION", "org")
+        monkeypatch.setenv("PROJECT", "project")
+
+        sync_manager = SyncManager()
+        sync_manager.fetch_and_compare()
+        report = sync_manager.push_files(sync_manager.compute_plan().pushes)
+        assert not report.failed
+        # main.py and manifest.json stay plain docs.
+        bundles = len(server.docs("org", "project")) - 2
+        assert 2 <= bundles < 20
+        assert server.requests["POST"] == bundles + 2
+        assert not sync_manager.state.files.unsynced()
+
+        (tmp_path / "src" / "mod7.py").write_text("edited = True\n")
+        sync_manager.fetch_and_compare()
+        [changed] = sync_manager.compute_plan().pushes
+        report = sync_manager.push_files([changed])
+        assert not report.failed
+        assert server.requests["POST"] == bundles + 3
+        assert server.requests["DELETE"] == 1
+        assert len(server.docs("org", "project")) == bundles + 2
+
+        sync_manager.delete_files([sync_manager.state.files["src/mod8.py"]])
+        assert sync_manager.state.files["src/mod8.py"].status == FileStatus.LOCAL_ONLY
+
+        fresh = SyncManager()
+        fresh.remote_cache.path = str(tmp_path / "other-cache.json")
+        fresh.fetch_and_compare()
+        assert fresh.state.files["src/mod7.py"].status == FileStatus.SYNCED
+        assert [f.local_path for f in fresh.state.files.unsynced()] == ["src/mod8.py"]
+        fresh.close()
+    sync_manager.close()
+
+
+def test_push_preflight_skips_no_ops_and_duplicate_targets(
+    tmp_path, monkeypatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    manifest = Manifest([], [])
+    manifest.add_directory_match_rule("src/", "app/")
+    manifest.add_directory_match_rule("lib/", "app/")
+    manifest.add_directory_match_rule("vendor/", "app/")
+    manifest.save_to_file()
+    for directory in ("src", "lib", "vendor"):
+        (tmp_path / directory).mkdir()
+    (tmp_path / "crlf.py").write_text("x = 1\n")
+    (tmp_path / "eol.py").write_text("y = 2\n")
+    (tmp_path / "src" / "same.py").write_text("same = 1\n")
+    (tmp_path / "lib" / "same.py").write_text("same = 1\n")
+    (tmp_path / "src" / "clash.py").write_text("clash = 1\n")
+    (tmp_path / "lib" / "clash.py").write_text("clash = 2\n")
+    (tmp_path / "src" / "dup.py").write_text("dup = 1\n")
+    (tmp_path / "vendor" / "dup.py").write_text("dup = 2\n")
+
+    with FakeDocsServer() as server:
+        monkeypatch.setenv("DOMAIN", server.url)
+        monkeypatch.setenv("ORGANIZATION", "org")
+        monkeypatch.setenv("PROJECT", "project")
+        monkeypatch.setenv("SYNC_LINE_ENDINGS", "lf-final-newline")
+        server.add_doc("org", "project", "crlf.py", "x = 1\r\n")
+        server.add_doc("org", "project", "eol.py", "y = 2")
+        server.add_doc("org", "project", "app/dup.py", "dup = 1\n")
+        manifest_json = (tmp_path / "manifest.json").read_text()
+        server.add_doc("org", "project", "manifest.json", manifest_json)
+
+        sync_manager = SyncManager()
+        sync_manager.fetch_and_compare()
+        files = sync_manager.state.files
+        pushes = [files[path] for path in sorted(files) if path != "manifest.json"]
+        report = sync_manager.push_files(pushes)
+
+        sync_manager.fetch_and_compare()
+        replanned = {file.local_path for file in sync_manager.compute_plan().pushes}
+        sync_manager.close()
+
+    by_path = {result.file.local_path: result for result in report.results}
+    assert by_path["crlf.py"].skipped and by_path["eol.py"].skipped
+    assert not {"crlf.py", "eol.py"} & replanned
+    assert files["crlf.py"].status == FileStatus.SYNCED
+    # src/dup.py matches the remote, which must not let vendor/dup.py through.
+    assert by_path["src/dup.py"].skipped
+    assert "also pushed to app/dup.py" in str(by_path["vendor/dup.py"].error)
+    assert by_path["lib/same.py"].uploaded and by_path["src/same.py"].skipped
+    assert by_path["lib/clash.py"].uploaded
+    assert "also pushed to app/clash.py" in str(by_path["src/clash.py"].error)
+    assert server.requests["POST"] == 2
+    assert server.requests["DELETE"] == 0
+
+
+def test_line_ending_matches_are_checked_once_per_digest_pair(
+    mocker: MockFixture, tmp_path, monkeypatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    Manifest([], []).save_to_file()
+    (tmp_path / "crlf.py").write_text("x = 1\n")
+    (tmp_path / "edited.py").write_text("y = 2\n")
+
+    with FakeDocsServer() as server:
+        monkeypatch.setenv("DOMAIN", server.url)
+        monkeypatch.setenv("ORGANIZATION", "org")
+        monkeypatch.setenv("PROJECT", "project")
+        monkeypatch.setenv("SYNC_LINE_ENDINGS", "lf")
+        server.add_doc("org", "project", "crlf.py", "x = 1\r\n")
+        server.add_doc("org", "project", "edited.py", "y = 1\r\n")
+
+        sync_manager = SyncManager()
+        sync_manager.fetch_and_compare()
+        files = sync_manager.state.files
+        assert files["crlf.py"].status == FileStatus.SYNCED
+        assert files["edited.py"].status == FileStatus.MODIFIED
+        sync_manager.close()
+
+        reads = mocker.patch.object(
+            SyncManager,
+            "read_local_contents",
+            side_effect=AssertionError("read an already checked pair"),
+        )
+        sync_manager = SyncManager()
+        sync_manager.fetch_and_compare()
+        sync_manager.fetch_and_compare()
+        files = sync_manager.state.files
+        sync_manager.close()
+
+    assert files["crlf.py"].status == FileStatus.SYNCED
+    assert files["edited.py"].status == FileStatus.MODIFIED
+    reads.assert_not_called()
+
+
+def test_upload_manifest_replaces_the_remote_only_when_changed(
+    tmp_path, monkeypatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    Manifest([], [], ["*.log"]).save_to_file()
+
+    with FakeDocsServer() as server:
+        monkeypatch.setenv("DOMAIN", server.url)
+        monkeypatch.setenv("ORGANIZATION", "org")
+        monkeypatch.setenv("PROJECT", "project")
+        # Same data, different formatting.
+        server.add_doc(
+            "org", "project", "manifest.json", '{"ignore":["*.log"],"rules":[]}'
+        )
+
+        sync_manager = SyncManager()
+        sync_manager.fetch_and_compare()
+        assert not sync_manager.upload_manifest()
+
+        sync_manager.add_directory_match_rule("src/", "app/")
+        assert sync_manager.upload_manifest()
+        assert not sync_manager.upload_manifest()
+        sync_manager.close()
+
+    [doc] = server.docs("org", "project").values()
+    assert json.loads(doc["content"])["rules"][0]["target"] == "app/"
+    assert server.requests["POST"] == 1 and server.requests["DELETE"] == 1
+
+
+def test_deleted_remote_keeps_the_inferred_remote_path(tmp_path, monkeypatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    manifest = Manifest([], [])
+    manifest.add_directory_match_rule("src/", "app/")
+    manifest.save_to_file()
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.py").write_text("a = 1\n")
+
+    with FakeDocsServer() as server:
+        monkeypatch.setenv("DOMAIN", server.url)
+        monkeypatch.setenv("ORGANIZATION", "org")
+        monkeypatch.setenv("PROJECT", "project")
+        server.add_doc("org", "project", "app/a.py", "a = 0\n")
+
+        sync_manager = SyncManager()
+        sync_manager.fetch_and_compare()
+        sync_manager.delete_files([sync_manager.state.files["src/a.py"]])
+        file = sync_manager.state.files["src/a.py"]
+        assert file.status == FileStatus.LOCAL_ONLY
+        assert file.remote_path == "app/a.py"
+
+        sync_manager.upload_files([file])
+        sync_manager.close()
+
+    [doc] = server.docs("org", "project").values()
+    assert doc["file_name"] == "app/a.py"
+
+
+def test_plan_only_deletes_remote_docs_whose_local_file_is_gone(
+    tmp_path, monkeypatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    Manifest([], [], ["generated/"]).save_to_file()
+    (tmp_path / "README.md").write_text("readme")
+    (tmp_path / "generated").mkdir()
+
+    sync_manager = SyncManager()
+    for path in ("README.md", "notes.txt", "generated/api.py", "gone.py"):
+        sync_manager.add_file(path, None, path, "digest", path)
+
+    plan = sync_manager.compute_plan()
+
+    assert [file.local_path for file in plan.deletions] == ["gone.py"]
+    assert [file.local_path for file in plan.kept] == [
+        "README.md",
+        "generated/api.py",
+        "notes.txt",
+    ]
+    sync_manager.close()
+
+
+def test_file_over_the_size_cap_is_too_large_not_remote_only(
+    tmp_path, monkeypatch, capsys
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    Manifest([], []).save_to_file()
+    (tmp_path / "big.py").write_text("x = 1\n")
+
+    with FakeDocsServer() as server:
+        monkeypatch.setenv("DOMAIN", server.url)
+        monkeypatch.setenv("ORGANIZATION", "org")
+        monkeypatch.setenv("PROJECT", "project")
+        monkeypatch.setenv("SYNC_MAX_FILE_BYTES", "100")
+        server.add_doc("org", "project", "big.py", "x = 1\n")
+
+        sync_manager = SyncManager()
+        sync_manager.fetch_and_compare()
+        assert sync_manager.state.files["big.py"].status == FileStatus.SYNCED
+
+        (tmp_path / "big.py").write_text("x = 1\n" * 50)
+        sync_manager.quiet = True
+        sync_manager.fetch_and_compare()
+        file = sync_manager.state.files["big.py"]
+        assert file.status == FileStatus.TOO_LARGE
+        plan = sync_manager.compute_plan()
+        assert not plan.deletions and not plan.kept
+        assert file not in plan.pushes
+        assert plan.too_large == 1
+        assert "Warning: skipping big.py" not in capsys.readouterr().out
+
+        (tmp_path / "big.py").write_text("x = 2\n")
+        sync_manager.fetch_and_compare()
+        assert sync_manager.state.files["big.py"].status == FileStatus.MODIFIED
+        sync_manager.close()
+
+
+def test_push_keeps_the_old_doc_when_its_replacement_fails(
+    tmp_path, monkeypatch
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    Manifest([], []).save_to_file()
+    (tmp_path / "a.py").write_text("a = 2\n")
+
+    with FakeDocsServer() as server:
+        monkeypatch.setenv("DOMAIN", server.url)
+        monkeypatch.setenv("ORGANIZATION", "org")
+        monkeypatch.setenv("PROJECT", "project")
+        old_uuid = server.add_doc("org", "project", "a.py", "a = 1\n")
+
+        sync_manager = SyncManager()
+        sync_manager.fetch_and_compare()
+        file = sync_manager.state.files["a.py"]
+        server.fail_next(400, count=3)
+        report = sync_manager.push_files([file], upload_retries=2)
+        assert report.failed and not report.results[0].deleted
+        assert server.requests["DELETE"] == 0
+        assert sync_manager.state.files["a.py"].remote_uuid == old_uuid
+
+        report = sync_manager.push_files([sync_manager.state.files["a.py"]])
+        sync_manager.close()
+
+    assert not report.failed
+    [doc] = server.docs("org", "project").values()
+    assert doc["content"] == "a = 2\n" and doc["uuid"] != old_uuid
+
+
+def test_failed_refresh_fetches_again_before_changing_the_remote(
+    tmp_path, monkeypatch
+) -> None:
+    Manifest([], []).save_to_file()
+    (tmp_path / "a.py").write_text("local")
+    (tmp_path / "big.py").write_text("x = 1\n" * 50)
+
+    with FakeDocsServer() as server:
+        monkeypatch.setenv("DOMAIN", server.url)
+        monkeypatch.setenv("ORGANIZATION", "org")
+        monkeypatch.setenv("PROJECT", "project")
+        monkeypatch.setenv("SYNC_MAX_FILE_BYTES", "100")
+        old_uuid = server.add_doc("org", "project", "a.py", "remote")
+
+        first = SyncManager()
+        first.quiet = True
+        first.fetch_and_compare()
+        first.save_snapshot()
+        # Someone else replaces the doc after the snapshot was taken.
+        server.docs("org", "project").pop(old_uuid)
+        new_uuid = server.add_doc("org", "project", "a.py", "newer")
+
+        second = SyncManager()
+        second.quiet = True
+        assert second.load_snapshot()
+        assert second.state.files["big.py"].status == FileStatus.TOO_LARGE
+        server.fail_next(400)
+        second.refresh_in_background().join()
+        assert second.state.stale and second.state.refresh_error is not None
+        assert second.state.files["a.py"].remote_uuid == old_uuid
+
+        report = second.push_files([second.state.files["a.py"]])
+        first.close()
+        second.close()
+
+    assert not report.failed and not second.state.stale
+    assert report.results[0].file.remote_uuid == new_uuid
+    [doc] = server.docs("org", "project").values()
+    assert doc["content"] == "local"
@@ -0,0 +1,75 @@
+import ctypes
+import errno
+import os
+
+import pytest
+from ignore_matcher import IgnoreMatcher
+from watcher import InotifyWatcher, PollingWatcher, create_watcher
+
+
+def test_polling_watcher_reports_changed_paths(tmp_path) -> None:
+    (tmp_path / "keep.py").write_text("same")
+    (tmp_path / "edit.py").write_text("before")
+    (tmp_path / "gone.py").write_text("bye")
+    watcher = PollingWatcher(str(tmp_path), IgnoreMatcher(["*.log"]), interval=0)
+
+    (tmp_path / "edit.py").write_text("after, and longer")
+    (tmp_path / "gone.py").unlink()
+    (tmp_path / "new.py").write_text("hello")
+    (tmp_path / "debug.log").write_text("ignored")
+
+    assert watcher.poll(0) == {"edit.py", "gone.py", "new.py"}
+    assert watcher.poll(0) == set()
+
+
+def test_inotify_watcher_follows_new_directories(tmp_path) -> None:
+    try:
+        watcher = InotifyWatcher(str(tmp_path), IgnoreMatcher(["build/"]))
+    except (AttributeError, OSError):
+        pytest.skip("inotify is not available")
+
+    try:
+        (tmp_path / "a.py").write_text("a")
+        os.makedirs(tmp_path / "pkg")
+        (tmp_path / "pkg" / "b.py").write_text("b")
+        (tmp_path / "build").mkdir()
+        (tmp_path / "build" / "out.py").write_text("ignored")
+
+        changed: set[str] = set()
+        for _ in range(5):
+            changed |= watcher.poll(0.1)
+        (tmp_path / "pkg" / "c.py").write_text("c")
+        for _ in range(5):
+            changed |= watcher.poll(0.1)
+
+        assert changed == {"a.py", "pkg/b.py", "pkg/c.py"}
+    finally:
+        watcher.close()
+
+
+def test_failed_inotify_watch_falls_back_to_polling(tmp_path, monkeypatch) -> None:
+    opened: list[int] = []
+
+    class OutOfWatchesLibc:
+        def __init__(self, *args, **kwargs) -> None:
+            self.inotify_add_watch = self.add_watch
+
+        def inotify_init1(self, flags: int) -> int:
+            opened.append(os.open(os.devnull, os.O_RDONLY))
+            return opened[-1]
+
+        @staticmethod
+        def add_watch(fd: int, path: bytes, mask: int) -> int:
+            ctypes.set_errno(errno.ENOSPC)
+            return -1
+
+    monkeypatch.setattr(ctypes, "CDLL", OutOfWatchesLibc)
+    matcher = IgnoreMatcher([])
+
+    with pytest.raises(OSError) as error:
+        InotifyWatcher(str(tmp_path), matcher)
+    assert error.value.errno == errno.ENOSPC
+    assert isinstance(create_watcher(str(tmp_path), matcher), PollingWatcher)
+    for fd in opened:
+        with pytest.raises(OSError):
+            os.fstat(fd)
@@ -1,22 +1,37 @@
-from menu import Menu, MenuAction
-from sync_state import File, SyncManager
+from menu import CachedMenu, Menu, MenuAction, MenuOption
+from sync_state import File, FileStatus, SyncManager
 
 
-class UploadFileMenu(Menu):
+class UploadFileMenu(CachedMenu):
     def __init__(self, sync_manager: SyncManager) -> None:
         super().__init__("Upload File")
         self.sync_manager = sync_manager
 
-    def update_options(self) -> None:
-        self.options.clear()
-        local_only_files = [
-            file
-            for file in self.sync_manager.state.files.values()
-            if file.local_present and not file.remote_present
-        ]
+    def cache_key(self) -> object:
+        return self.sync_manager.state.version
+
+    def build_options(self) -> None:
+        local_only_files = self.sync_manager.state.files.in_status(
+            FileStatus.LOCAL_ONLY
+        )
 
         for file in local_only_files:
             self.add_option(UploadFileOption(file, self.sync_manager))
+        if local_only_files:
+            self.add_option(UploadAllFilesOption(local_only_files, self.sync_manager))
+
+
+class UploadAllFilesOption(MenuOption):
+    def __init__(self, files: list[File], sync_manager: SyncManager) -> None:
+        super().__init__(f"Upload all {len(files)} local-only files")
+        self.files = files
+        self.sync_manager = sync_manager
+
+    def run(self) -> MenuAction:
+        report = self.sync_manager.upload_files(self.files)
+        if report.failed:
+            print(f"{len(report.failed)} uploads failed.")
+        return MenuAction.CONTINUE
 
 
 class UploadFileOption(Menu):
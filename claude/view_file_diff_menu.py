@@ -1,23 +1,25 @@
-import difflib
+from collections.abc import Iterable
 
-from menu import Menu, MenuAction, MenuOption, TaskMenu
-from sync_state import File, SyncManager
+from diff_engine import diff_lines, diff_stats_cache, unified_diff
+from menu import CachedMenu, Menu, MenuAction, MenuOption, TaskMenu
+from sync_state import File, FileStatus, SyncManager
 
 
-class ViewFileDiffMenu(Menu):
+class ViewFileDiffMenu(CachedMenu):
     def __init__(self, sync_manager: SyncManager) -> None:
         super().__init__("View File Diff")
         self.sync_manager = sync_manager
 
-    def update_options(self) -> None:
-        self.options.clear()
-        unsynced_files = [
-            file
-            for file in self.sync_manager.state.files.values()
-            if not file.is_fully_synced
-        ]
-        for file in unsynced_files:
+    def cache_key(self) -> object:
+        return self.sync_manager.state.version
+
+    def build_options(self) -> None:
+        files = self.sync_manager.state.files
+        for file in files.unsynced():
             self.add_option(ViewFileDiffOption(file, self.sync_manager))
+        modified_files = files.in_status(FileStatus.MODIFIED, FileStatus.LOCAL_ONLY)
+        if modified_files:
+            self.add_option(PushAllModifiedOption(modified_files, self.sync_manager))
 
     def run(self) -> MenuAction:
         while True:
@@ -33,6 +35,26 @@ class ViewFileDiffMenu(Menu):
                 return MenuAction.BACK
 
 
+class PushAllModifiedOption(MenuOption):
+    def __init__(self, files: list[File], sync_manager: SyncManager) -> None:
+        super().__init__(f"Push all {len(files)} modified files")
+        self.files = files
+        self.sync_manager = sync_manager
+
+    def run(self) -> MenuAction:
+        confirm = input(
+            f"Are you sure you want to overwrite {len(self.files)} remote files? (y/n): "
+        )
+        if confirm.lower() != "y":
+            print("Push cancelled.")
+            return MenuAction.CONTINUE
+
+        report = self.sync_manager.push_files(self.files)
+        if report.failed:
+            print(f"{len(report.failed)} files could not be pushed.")
+        return MenuAction.TASK_COMPLETE
+
+
 class ViewFileDiffOption(TaskMenu):
     def __init__(self, file: File, sync_manager: SyncManager) -> None:
         super().__init__(file.local_path)
@@ -45,6 +67,15 @@ class ViewFileDiffOption(TaskMenu):
         self.add_option(OverwriteRemote(self.file, self.sync_manager))
 
 
+def page_lines(lines: Iterable[str], page_size: int = 40) -> None:
+    for count, line in enumerate(lines, 1):
+        print(line)
+        if count % page_size == 0:
+            more = input("-- More (Enter to continue, q to stop) -- ")
+            if more.lower() == "q":
+                return
+
+
 class DisplayDiff(Menu):
     def __init__(self, file: File) -> None:
         super().__init__("Display Diff")
@@ -53,25 +84,29 @@ class DisplayDiff(Menu):
     def run(self) -> MenuAction:
         if not self.file.local_present:
             print(f"\nFile only exists remotely: {self.file.remote_path}")
-            return
+            return MenuAction.CONTINUE
 
         if not self.file.remote_present:
             print(f"\nFile only exists locally: {self.file.local_path}")
-            return
-
-        local_lines = self.file.local_contents.splitlines(keepends=True)
-        remote_lines = self.file.remote_contents.splitlines(keepends=True)
-
-        diff = difflib.unified_diff(
-            remote_lines,
-            local_lines,
-            fromfile=f"{self.file.remote_path} (remote)",
-            tofile=f"{self.file.local_path} (local)",
-            lineterm="",
+            return MenuAction.CONTINUE
+
+        remote_lines = self.file.remote_contents.splitlines()
+        local_lines = self.file.local_contents.splitlines()
+        diff = diff_lines(remote_lines, local_lines)
+        diff_stats_cache.record(self.file.remote_digest, self.file.local_digest, diff)
+
+        print(f"\nFile diff (+{diff.added} -{diff.removed}):")
+        if not diff.complete:
+            print("Diff too large to align; showing the changed region as a whole.")
+        page_lines(
+            unified_diff(
+                remote_lines,
+                local_lines,
+                diff,
+                fromfile=f"{self.file.remote_path} (remote)",
+                tofile=f"{self.file.local_path} (local)",
+            )
         )
-
-        print("\nFile diff:")
-        print("".join(diff))
         return MenuAction.CONTINUE
 
 
@@ -87,10 +122,7 @@ class OverwriteRemote(MenuOption):
         )
         if confirm.lower() == "y":
             try:
-                self.sync_manager.delete_file(self.file)
-                print(f"Removed file '{self.file.remote_path}' from remotes.")
-                self.sync_manager.upload_file(self.file)
-                print(f"Uploaded new version of file '{self.file.remote_path}'.")
+                self.sync_manager.overwrite_file(self.file)
                 return MenuAction.TASK_COMPLETE
             except Exception as e:
                 print(f"Error overwriting remote file: {e}")
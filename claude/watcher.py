@@ -0,0 +1,150 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+
+from ignore_matcher import IgnoreMatcher
+from local_scan import scan_tree
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_ISDIR = 0x40000000
+IN_IGNORED = 0x00008000
+IN_Q_OVERFLOW = 0x00004000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+)
+_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    def __init__(self, directory: str, matcher: IgnoreMatcher) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directory = directory
+        self.matcher = matcher
+        self._paths: dict[int, str] = {}
+        try:
+            self._watch_tree(directory, "")
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _watch_tree(self, path: str, prefix: str) -> None:
+        wd = self._add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOENT:
+                # Removed before the watch could be added; nothing to follow.
+                return
+            # Out of watches (ENOSPC) or similar: an unwatched subtree would
+            # miss edits silently, so the caller has to poll instead.
+            raise OSError(error, f"inotify_add_watch failed for {path}")
+        self._paths[wd] = prefix
+        with os.scandir(path) as entries:
+            for entry in entries:
+                local_path = prefix + entry.name
+                if entry.is_dir(follow_symlinks=False) and not self.matcher.is_ignored(
+                    local_path, is_dir=True
+                ):
+                    self._watch_tree(entry.path, local_path + "/")
+
+    def poll(self, timeout: float) -> set[str] | None:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed: set[str] = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size : offset + _EVENT.size + length]
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped, so the caller has to rescan everything.
+                return None
+            if mask & IN_IGNORED:
+                self._paths.pop(wd, None)
+                continue
+            prefix = self._paths.get(wd)
+            if prefix is None:
+                continue
+            local_path = prefix + os.fsdecode(name.rstrip(b"\0"))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not self.matcher.is_ignored(
+                    local_path, is_dir=True
+                ):
+                    full_path = os.path.join(self.directory, local_path)
+                    self._watch_tree(full_path, local_path + "/")
+                    # Files written before the watch existed must not be missed.
+                    for file_path, _ in scan_tree(full_path, self.matcher):
+                        changed.add(f"{local_path}/{file_path}")
+                continue
+            if not self.matcher.is_ignored(local_path):
+                changed.add(local_path)
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    def __init__(
+        self, directory: str, matcher: IgnoreMatcher, interval: float = 0.5
+    ) -> None:
+        self.directory = directory
+        self.matcher = matcher
+        self.interval = interval
+        self._snapshot = self._take_snapshot()
+
+    def _take_snapshot(self) -> dict[str, tuple[int, int]]:
+        snapshot = {}
+        for local_path, entry in scan_tree(self.directory, self.matcher):
+            stat_result = entry.stat()
+            snapshot[local_path] = (stat_result.st_mtime_ns, stat_result.st_size)
+        return snapshot
+
+    def poll(self, timeout: float) -> set[str] | None:
+        time.sleep(min(timeout, self.interval))
+        snapshot = self._take_snapshot()
+        changed = {
+            path
+            for path in snapshot.keys() | self._snapshot.keys()
+            if snapshot.get(path) != self._snapshot.get(path)
+        }
+        self._snapshot = snapshot
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+def create_watcher(
+    directory: str, matcher: IgnoreMatcher
+) -> InotifyWatcher | PollingWatcher:
+    try:
+        return InotifyWatcher(directory, matcher)
+    except (AttributeError, OSError):
+        # Not Linux, or inotify is unavailable or out of watches.
+        return PollingWatcher(directory, matcher)